@@ -0,0 +1,152 @@
+import os
+import json
+import sqlite3
+import hashlib
+
+
+# Name of the index database kept in the destination folder by the incremental mode
+INDEX_FILE_NAME = "archive_index.sqlite"
+# Member of every delta archive listing the unchanged files and the archive holding their content
+MANIFEST_NAME = ".incremental_manifest.jsonl"
+# Size of the blocks read while hashing a file (1 MiB)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(filepath):
+    """
+    Compute the SHA-256 of a file, reading it in fixed-size chunks.
+
+    Parameters:
+    - filepath: path of the file to hash.
+
+    Returns:
+    - digest: hex string of the SHA-256 of the file content.
+    """
+    sha256 = hashlib.sha256()
+    with open(filepath, 'rb') as source:
+        while True:
+            chunk = source.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ArchiveIndex:
+    """
+    Persistent state of the files archived by previous incremental runs, kept in SQLite.
+
+    A run first classifies every file (unchanged files are only marked as seen), then writes
+    the changed files and finally commits, so a cancelled run leaves the index as it was.
+    """
+
+    def __init__(self, index_path, archive_name):
+        """
+        Parameters:
+        - index_path: path of the SQLite index file (created if missing).
+        - archive_name: file name of the delta archive written by this run.
+        """
+        self.archive_name = archive_name
+        self.connection = sqlite3.connect(str(index_path))
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(files)")]
+        if columns and ("path" not in columns or "member" not in columns):
+            # older indexes mixed up sources sharing a name, start over
+            self.connection.execute("DROP TABLE files")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                arcname TEXT NOT NULL,
+                member TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                archive TEXT NOT NULL,
+                pending INTEGER NOT NULL DEFAULT 0
+            )""")
+        self.connection.commit()
+        # unchanged files seen by this run, they are the ones listed in the manifest
+        self.connection.execute("CREATE TEMP TABLE seen (path TEXT PRIMARY KEY)")
+
+    def classify(self, filepath, arcname, size):
+        """
+        Decide if a file has to be written into this run's delta archive.
+
+        A file whose size and modification time match the index is unchanged without being
+        read; otherwise it is hashed, and only a different hash makes it a changed file.
+
+        Parameters:
+        - filepath: path of the file on disk.
+        - arcname: member name of the file in the archive.
+        - size: size of the file in bytes.
+
+        Returns:
+        - changed: True if the file is new or its content changed.
+        """
+        path = os.path.abspath(filepath)
+        mtime_ns = os.stat(filepath).st_mtime_ns
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == size and row[1] == mtime_ns:
+            # the name can change with the selection, `member` keeps the one used in `archive`
+            self.connection.execute("UPDATE files SET arcname = ? WHERE path = ?", (arcname, path))
+            self.connection.execute("INSERT OR IGNORE INTO seen VALUES (?)", (path,))
+            return False
+
+        sha256 = hash_file(filepath)
+        if row is not None and row[0] == size and row[2] == sha256:
+            # only touched, keep the content where it is but remember the new time
+            self.connection.execute(
+                "UPDATE files SET mtime_ns = ?, arcname = ? WHERE path = ?", (mtime_ns, arcname, path))
+            self.connection.execute("INSERT OR IGNORE INTO seen VALUES (?)", (path,))
+            return False
+
+        # new or changed: the row points at this run's archive but stays pending until it is complete
+        self.connection.execute(
+            "DELETE FROM files WHERE path = ?", (path,))
+        self.connection.execute(
+            "INSERT INTO files (path, arcname, member, size, mtime_ns, sha256, archive, pending)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, 1)",
+            (path, arcname, arcname, size, mtime_ns, sha256, self.archive_name))
+        return True
+
+    def is_changed(self, filepath):
+        """
+        Tell if classify() selected this file for the current delta archive.
+        """
+        row = self.connection.execute(
+            "SELECT pending FROM files WHERE path = ?", (os.path.abspath(filepath),)).fetchone()
+        return row is not None and row[0] == 1
+
+    def write_manifest(self, zipf):
+        """
+        Write the manifest member listing the unchanged files and where their content lives.
+
+        Every line gives the file's name in this delta ("path") and the member of the older
+        archive holding its content ("member"), which differ when the selection changed.
+
+        Parameters:
+        - zipf: the open zipfile.ZipFile of the delta archive.
+        """
+        with zipf.open(MANIFEST_NAME, 'w') as manifest:
+            rows = self.connection.execute(
+                "SELECT arcname, member, archive, sha256 FROM files JOIN seen ON files.path = seen.path"
+                " ORDER BY arcname")
+            for arcname, member, archive, sha256 in rows:
+                line = json.dumps({"path": arcname, "member": member, "archive": archive, "sha256": sha256})
+                manifest.write(line.encode('utf-8') + b"\n")
+
+    def has_changes(self):
+        """
+        Tell if classify() found any new or changed file in this run.
+        """
+        return self.connection.execute("SELECT 1 FROM files WHERE pending = 1 LIMIT 1").fetchone() is not None
+
+    def commit(self):
+        # the delta archive is complete, its members become the reference for the next runs
+        self.connection.execute("UPDATE files SET pending = 0 WHERE pending = 1")
+        self.connection.commit()
+        self.connection.close()
+
+    def rollback(self):
+        self.connection.rollback()
+        self.connection.close()
@@ -0,0 +1,594 @@
+import os
+import json
+import zlib
+import zipfile
+import itertools
+import multiprocessing
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from archive_index import ArchiveIndex, hash_file
+import _paths  # noqa: F401
+import instrumentation
+
+
+# Size of the blocks streamed from each source file into the archive (1 MiB)
+CHUNK_SIZE = 1024 * 1024
+# Size of the blocks handed to each worker process by the parallel engine (4 MiB),
+# files bigger than this are split and their blocks are deflated in parallel
+BLOCK_SIZE = 4 * 1024 * 1024
+# Deflate window size, the tail of the previous block used to prime the next one
+DEFLATE_WINDOW = 32 * 1024
+# Amount of data read from the start of each file to estimate how compressible it is (256 KiB)
+SAMPLE_SIZE = 256 * 1024
+# Files whose sample does not shrink below this ratio are stored as is in auto mode
+INCOMPRESSIBLE_RATIO = 0.9
+
+# Compression methods offered to the user, Zstandard only exists in zipfile from Python 3.14
+COMPRESSION_METHODS = {
+    "Stored": zipfile.ZIP_STORED,
+    "Deflate": zipfile.ZIP_DEFLATED,
+    "BZIP2": zipfile.ZIP_BZIP2,
+    "LZMA": zipfile.ZIP_LZMA,
+}
+if hasattr(zipfile, "ZIP_ZSTANDARD"):
+    COMPRESSION_METHODS["Zstandard"] = zipfile.ZIP_ZSTANDARD
+
+# (minimum, maximum, default) compression level of the methods that accept one
+COMPRESSION_LEVELS = {
+    zipfile.ZIP_DEFLATED: (0, 9, 6),
+    zipfile.ZIP_BZIP2: (1, 9, 9),
+}
+if hasattr(zipfile, "ZIP_ZSTANDARD"):
+    COMPRESSION_LEVELS[zipfile.ZIP_ZSTANDARD] = (1, 22, 3)
+
+# Member listing the files stored only once by the deduplication, read back by the Archive Extractor
+DEDUP_MANIFEST_NAME = ".dedup_manifest.jsonl"
+# Number of files handed to the hashing threads at a time
+HASH_BATCH_SIZE = 256
+
+# Extensions of formats that are already compressed, deflating them again only burns CPU
+COMPRESSED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".aac", ".ogg", ".flac", ".mp4", ".mkv", ".mov", ".avi", ".webm",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".jar", ".apk",
+    ".docx", ".xlsx", ".pptx", ".odt", ".pdf",
+}
+
+
+class ArchiveCancelled(Exception):
+    """
+    Raised when archiving is cancelled before the archive is complete.
+    """
+
+
+class NothingChanged(Exception):
+    """
+    Raised in incremental mode when no file changed since the previous runs, no archive is written.
+    """
+
+
+def check_cancelled(cancel_event):
+    """
+    Raise ArchiveCancelled if the given cancel event has been set.
+
+    Parameters:
+    - cancel_event: threading.Event (or any object with is_set()) or None.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise ArchiveCancelled("Archiving was cancelled.")
+
+
+def estimate_compression_ratio(filepath):
+    """
+    Estimate how well a file compresses by deflating a sample taken from its start.
+
+    Parameters:
+    - filepath: path of the file to sample.
+
+    Returns:
+    - ratio: compressed size / original size of the sample (1.0 for empty files).
+    """
+    with open(filepath, 'rb') as source:
+        sample = source.read(SAMPLE_SIZE)
+    if not sample:
+        return 1.0
+    # the fastest level is enough to tell text from already compressed data
+    return len(zlib.compress(sample, 1)) / len(sample)
+
+
+def choose_compression(filepath, compression):
+    """
+    Pick the compression method of one member in auto mode.
+
+    Parameters:
+    - filepath: path of the file to archive.
+    - compression: method used for files that are worth compressing.
+
+    Returns:
+    - compression: ZIP_STORED for already compressed files, otherwise the given method.
+    """
+    if Path(filepath).suffix.lower() in COMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    if estimate_compression_ratio(filepath) > INCOMPRESSIBLE_RATIO:
+        return zipfile.ZIP_STORED
+    return compression
+
+
+def find_duplicates(iter_selected_files, cancel_event=None):
+    """
+    Find the files whose content is identical to an earlier file of the selection.
+
+    Only files sharing their size with another file can be duplicates, so only those are
+    hashed, in a thread pool (hashlib releases the GIL while hashing big buffers).
+
+    Parameters:
+    - iter_selected_files: callable returning a fresh iterator of (filepath, arcname, size).
+    - cancel_event: optional threading.Event, checked between batches of files.
+
+    Returns:
+    - duplicates: dict {arcname of the duplicate: arcname of the first file with the same content}.
+    """
+    size_counts = Counter(size for _, _, size in iter_selected_files())
+    candidates = ((filepath, arcname) for filepath, arcname, size in iter_selected_files()
+                  if size > 0 and size_counts[size] > 1)
+
+    first_arcname_by_hash = {}
+    duplicates = {}
+    with ThreadPoolExecutor() as executor:
+        while True:
+            check_cancelled(cancel_event)
+            batch = list(itertools.islice(candidates, HASH_BATCH_SIZE))
+            if not batch:
+                break
+            digests = executor.map(hash_file, [filepath for filepath, _ in batch])
+            for (_, arcname), digest in zip(batch, digests):
+                if digest in first_arcname_by_hash:
+                    duplicates[arcname] = first_arcname_by_hash[digest]
+                else:
+                    first_arcname_by_hash[digest] = arcname
+    return duplicates
+
+
+def write_dedup_manifest(zipf, duplicates):
+    """
+    Write the manifest member telling the extractor which member to copy for every duplicate.
+
+    Parameters:
+    - zipf: the open zipfile.ZipFile being written.
+    - duplicates: dict returned by find_duplicates().
+    """
+    with zipf.open(DEDUP_MANIFEST_NAME, 'w') as manifest:
+        for arcname, source_arcname in duplicates.items():
+            line = json.dumps({"path": arcname, "source": source_arcname})
+            manifest.write(line.encode('utf-8') + b"\n")
+
+
+def _gf2_matrix_times(matrix, vector):
+    total = 0
+    row = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[row]
+        vector >>= 1
+        row += 1
+    return total
+
+
+def _gf2_matrix_square(matrix):
+    return [_gf2_matrix_times(matrix, matrix[row]) for row in range(32)]
+
+
+def crc32_combine(crc1, crc2, length2):
+    """
+    Combine two CRC-32 values as if their data had been checksummed in one go (port of zlib's crc32_combine).
+
+    Parameters:
+    - crc1: CRC-32 of the first block.
+    - crc2: CRC-32 of the second block.
+    - length2: length in bytes of the second block.
+
+    Returns:
+    - crc: CRC-32 of the first block followed by the second one.
+    """
+    if length2 == 0:
+        return crc1
+    # operator for one zero bit, then squared into two and four zero bits
+    odd = [0xEDB88320] + [1 << row for row in range(31)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+    # apply length2 zero bytes to crc1
+    while True:
+        even = _gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+    return crc1 ^ crc2
+
+
+def compress_block(filepath, offset, length, compression, compresslevel, final):
+    """
+    Read one block of a file and deflate it as part of a raw deflate stream (runs in a worker process).
+
+    Non-final blocks end with a full flush so they stay byte aligned and can simply be
+    concatenated, and every block but the first is primed with the previous 32 KiB of the
+    file so splitting a file barely costs any compression ratio.
+
+    Parameters:
+    - filepath: path of the source file.
+    - offset: position of the block in the file.
+    - length: number of bytes in the block.
+    - compression: ZIP_DEFLATED, or ZIP_STORED to return the block unchanged.
+    - compresslevel: zlib compression level (None for the default).
+    - final: True if this is the last block of the file.
+
+    Returns:
+    - (compressed_data, crc, length): the deflated bytes, CRC-32 of the raw block and its size.
+    """
+    if compression == zipfile.ZIP_STORED:
+        with open(filepath, 'rb') as source:
+            source.seek(offset)
+            data = source.read(length)
+        return data, zlib.crc32(data), len(data)
+
+    with open(filepath, 'rb') as source:
+        dictionary_start = max(0, offset - DEFLATE_WINDOW)
+        source.seek(dictionary_start)
+        dictionary = source.read(offset - dictionary_start)
+        data = source.read(length)
+
+    level = zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed_data = compressor.compress(data)
+    compressed_data += compressor.flush(zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+    return compressed_data, zlib.crc32(data), len(data)
+
+
+class RawMemberWriter:
+    """
+    Write an already compressed member into an open ZipFile.
+
+    zipfile only knows how to compress data itself, so this mirrors what ZipFile.open(..., 'w')
+    does around the data: write the local header, let the caller append the compressed bytes,
+    then seek back to fill in the sizes and CRC and register the member for the central directory.
+    """
+
+    def __init__(self, zipf, zip_info):
+        self.zipf = zipf
+        self.zip_info = zip_info
+        # Compressed size can be larger than uncompressed size
+        self.zip64 = zip_info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        self.crc = 0
+        self.compress_size = 0
+        self.written_size = 0
+
+        zip_info.compress_size = 0
+        zip_info.CRC = 0
+        zip_info.flag_bits = 0x00
+        if not zip_info.external_attr:
+            zip_info.external_attr = 0o600 << 16
+
+        zipf.fp.seek(zipf.start_dir)
+        zip_info.header_offset = zipf.fp.tell()
+        zipf._writecheck(zip_info)
+        zipf._didModify = True
+        zipf.fp.write(zip_info.FileHeader(self.zip64))
+
+    def write(self, compressed_data, crc, length):
+        self.zipf.fp.write(compressed_data)
+        self.crc = crc32_combine(self.crc, crc, length)
+        self.compress_size += len(compressed_data)
+        self.written_size += length
+
+    def close(self):
+        zip_info = self.zip_info
+        zip_info.compress_size = self.compress_size
+        zip_info.CRC = self.crc
+        zip_info.file_size = self.written_size
+        if not self.zip64 and zip_info.compress_size > zipfile.ZIP64_LIMIT:
+            raise RuntimeError("Compressed size too large for a non ZIP64 member")
+
+        # Seek backwards and write the file header with the real sizes and CRC
+        self.zipf.start_dir = self.zipf.fp.tell()
+        self.zipf.fp.seek(zip_info.header_offset)
+        self.zipf.fp.write(zip_info.FileHeader(self.zip64))
+        self.zipf.fp.seek(self.zipf.start_dir)
+
+        self.zipf.filelist.append(zip_info)
+        self.zipf.NameToInfo[zip_info.filename] = zip_info
+
+
+def supports_raw_members(zipf):
+    """
+    Tell if RawMemberWriter can write into this ZipFile.
+
+    It relies on zipfile internals (fp, start_dir, _writecheck, _didModify) that are not part of
+    the public API and could change in a future Python; without them archiving stays serial.
+    """
+    return all(hasattr(zipf, name) for name in ("fp", "start_dir", "_writecheck", "_didModify",
+                                                "filelist", "NameToInfo"))
+
+
+def _set_compresslevel(zip_info, compresslevel):
+    # zipf.open() takes the level from the ZipInfo when it is given one instead of a name,
+    # the attribute is public as compress_level from Python 3.13 and private before
+    if hasattr(zip_info, "compress_level"):
+        zip_info.compress_level = compresslevel
+    else:
+        zip_info._compresslevel = compresslevel
+
+
+def _split_missing_paths(paths_to_archive):
+    # Split the selection into files/folders that can be archived and paths that are gone
+    existing_paths = []
+    missing_paths = []
+    for path in paths_to_archive:
+        if Path(path).exists():
+            existing_paths.append(path)
+        else:
+            missing_paths.append(path)
+    return existing_paths, missing_paths
+
+
+def next_free_path(path):
+    """
+    Return the given path, or the first 'name_2.ext', 'name_3.ext'... that does not exist yet.
+
+    Parameters:
+    - path: the preferred path (str or Path).
+
+    Returns:
+    - path: Path that can be created without overwriting anything.
+    """
+    path = Path(path)
+    candidate = path
+    number = 2
+    while candidate.exists():
+        candidate = path.with_name(f"{path.stem}_{number}{path.suffix}")
+        number += 1
+    return candidate
+
+
+def _unique_name(path, used_names):
+    # Member name of a selected file or folder, numbered like next_free_path() when already taken
+    name = path.name
+    number = 2
+    while name in used_names:
+        name = f"{path.stem}_{number}{path.suffix}" if path.is_file() else f"{path.name}_{number}"
+        number += 1
+    used_names.add(name)
+    return name
+
+
+def iter_files(paths_to_archive):
+    """
+    Lazily walk the selected files and folders, one directory listing at a time.
+
+    Selected files are stored under their own name and selected folders under their
+    folder name, so the archive does not depend on where the sources live on disk.
+    Selections sharing a name get 'name_2.ext', 'name_3.ext'... so no member overwrites another.
+    Symlinked folders are not followed to avoid walking the same tree twice (or forever).
+
+    Parameters:
+    - paths_to_archive: list of file and folder paths (str or Path).
+
+    Yields:
+    - (filepath, arcname, size): path on disk, member name in the archive and file size.
+    """
+    used_names = set()
+    for path in paths_to_archive:
+        path = Path(path)
+        top_name = _unique_name(path, used_names)
+        if path.is_file():
+            yield str(path), top_name, path.stat().st_size
+        elif path.is_dir():
+            # explicit stack instead of recursion so very deep trees can't hit the recursion limit
+            folders_to_walk = [(str(path), top_name)]
+            while folders_to_walk:
+                folder, arc_folder = folders_to_walk.pop()
+                subfolders = []
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append((entry.path, f"{arc_folder}/{entry.name}"))
+                        elif entry.is_file():
+                            yield entry.path, f"{arc_folder}/{entry.name}", entry.stat().st_size
+                # walk subfolders in name order once this listing is closed
+                folders_to_walk.extend(sorted(subfolders, reverse=True))
+
+
+def _write_serial(zipf, files, compression, compresslevel, auto, report, cancel_event):
+    for files_done, (filepath, arcname, _) in enumerate(files, start=1):
+        check_cancelled(cancel_event)
+        # ZipInfo.from_file() keeps the timestamp and permissions of the source file
+        zip_info = zipfile.ZipInfo.from_file(filepath, arcname)
+        zip_info.compress_type = choose_compression(filepath, compression) if auto else compression
+        _set_compresslevel(zip_info, compresslevel)
+        with open(filepath, 'rb') as source, zipf.open(zip_info, 'w') as target:
+            while True:
+                check_cancelled(cancel_event)
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                target.write(chunk)
+                report(files_done, len(chunk), filepath)
+        # Report empty files too, they never go through the chunk loop
+        report(files_done, 0, filepath)
+
+
+def _iter_blocks(files, auto):
+    # Yield (file index, filepath, arcname, compression, offset, length, first, final) for every block of every file
+    for file_index, (filepath, arcname, file_size) in enumerate(files):
+        compression = choose_compression(filepath, zipfile.ZIP_DEFLATED) if auto else zipfile.ZIP_DEFLATED
+        offset = 0
+        while True:
+            length = min(BLOCK_SIZE, file_size - offset)
+            final = offset + length >= file_size
+            yield file_index, filepath, arcname, compression, offset, length, offset == 0, final
+            if final:
+                break
+            offset += length
+
+
+def _write_parallel(zipf, files, compresslevel, auto, workers, report, cancel_event):
+    # 'spawn' avoids forking a process that is running Qt threads
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    # Keep a bounded number of blocks in flight so memory stays flat on huge inputs
+    pending = deque()
+    member_writer = None
+
+    def write_next_result():
+        nonlocal member_writer
+        file_index, filepath, arcname, compression, first, final, future = pending.popleft()
+        compressed_data, crc, length = future.result()
+        if first:
+            zip_info = zipfile.ZipInfo.from_file(filepath, arcname)
+            zip_info.compress_type = compression
+            member_writer = RawMemberWriter(zipf, zip_info)
+        member_writer.write(compressed_data, crc, length)
+        if final:
+            member_writer.close()
+            member_writer = None
+        report(file_index + 1, length, filepath)
+
+    try:
+        for file_index, filepath, arcname, compression, offset, length, first, final in _iter_blocks(files, auto):
+            check_cancelled(cancel_event)
+            future = executor.submit(compress_block, filepath, offset, length, compression, compresslevel, final)
+            pending.append((file_index, filepath, arcname, compression, first, final, future))
+            # The single writer drains results in submission order, which keeps every member contiguous
+            if len(pending) >= workers * 2:
+                write_next_result()
+        while pending:
+            check_cancelled(cancel_event)
+            write_next_result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def archive_files(files_to_archive, archive_file_path, progress_callback=None, cancel_event=None,
+                  compression=zipfile.ZIP_STORED, compresslevel=None, auto=False, workers=1,
+                  index_path=None, deduplicate=False):
+    """
+    Write the given files and folders into a zip archive, streaming each file in fixed-size chunks.
+
+    Folders are walked lazily and every file goes through bounded buffers, so memory use
+    does not grow with the size of the files (ZIP64 is used automatically for big members).
+
+    The archive is first written to a temporary '.part' file next to the target and only
+    renamed to its final name once it is complete, so a cancelled or failed run never
+    leaves a corrupt zip behind.
+
+    With ZIP_DEFLATED and more than one worker, files are cut into blocks that are deflated
+    in a process pool (big files are split into several blocks) while this process stays the
+    single writer assembling the compressed blocks into the archive.
+
+    In auto mode every file is checked first (extension, then a deflated sample of its first
+    blocks) and files that are already compressed are stored instead of compressed again.
+
+    Parameters:
+    - files_to_archive: list of file and folder paths (str or Path).
+    - archive_file_path: path of the zip file to create.
+    - progress_callback: optional callable(files_done, files_total, bytes_done, bytes_total, current_file)
+      called after every chunk written.
+    - cancel_event: optional threading.Event, checked between chunks to stop early.
+    - compression: zipfile compression constant (ZIP_STORED, ZIP_DEFLATED, ...).
+    - compresslevel: optional compression level passed to the compressor.
+    - auto: if True, store incompressible files and only compress the others with `compression`.
+    - workers: number of worker processes used for ZIP_DEFLATED (1 keeps everything in this process).
+    - index_path: optional path of an ArchiveIndex database. When given, the archive is a delta:
+      only files that are new or changed since the previous runs are written, and the unchanged
+      ones are listed in a manifest member pointing at the archive that holds them. If nothing
+      changed, NothingChanged is raised and no archive is written.
+    - deduplicate: if True, files with identical content are written (and compressed) only once,
+      the other copies are listed in a manifest member restored by the Archive Extractor.
+
+    Returns:
+    - missing_files: list of the paths that did not exist and were skipped.
+    """
+    archive_file_path = Path(archive_file_path)
+    partial_file_path = archive_file_path.with_name(archive_file_path.name + '.part')
+
+    existing_paths, missing_files = _split_missing_paths(files_to_archive)
+    index = ArchiveIndex(index_path, archive_file_path.name) if index_path is not None else None
+
+    def selected_files():
+        # in incremental mode only the files that changed since the previous runs
+        for filepath, arcname, size in iter_files(existing_paths):
+            if index is None or index.is_changed(filepath):
+                yield filepath, arcname, size
+
+    duplicates = {}
+
+    def files_to_write():
+        for filepath, arcname, size in selected_files():
+            if arcname not in duplicates:
+                yield filepath, arcname, size
+
+    files_total = 0
+    bytes_total = 0
+    bytes_done = 0
+
+    def report(files_done, length, filepath):
+        nonlocal bytes_done
+        bytes_done += length
+        if progress_callback is not None:
+            progress_callback(files_done, files_total, bytes_done, bytes_total, str(filepath))
+
+    with instrumentation.span("archive", archive=archive_file_path.name) as span:
+        try:
+            # In incremental mode a first lazy walk sorts out which files changed
+            if index is not None:
+                for filepath, arcname, size in iter_files(existing_paths):
+                    check_cancelled(cancel_event)
+                    index.classify(filepath, arcname, size)
+                if not index.has_changes():
+                    raise NothingChanged("Nothing changed since the previous archive.")
+            if deduplicate:
+                duplicates.update(find_duplicates(selected_files, cancel_event))
+            # Count files and bytes for the progress report
+            for _, _, size in files_to_write():
+                files_total += 1
+                bytes_total += size
+
+            with zipfile.ZipFile(partial_file_path, 'w', allowZip64=True) as zipf:
+                if compression == zipfile.ZIP_DEFLATED and workers > 1 and supports_raw_members(zipf):
+                    _write_parallel(zipf, files_to_write(), compresslevel, auto, workers, report, cancel_event)
+                else:
+                    _write_serial(zipf, files_to_write(), compression, compresslevel, auto, report, cancel_event)
+                if index is not None:
+                    index.write_manifest(zipf)
+                if duplicates:
+                    write_dedup_manifest(zipf, duplicates)
+            # Only now replace (or create) the real archive in one atomic step
+            os.replace(partial_file_path, archive_file_path)
+        except NothingChanged:
+            # the new times of files that were only touched are still worth keeping
+            index.commit()
+            raise
+        except BaseException:
+            # Remove the half-written archive whatever went wrong (cancel, I/O error, ...)
+            partial_file_path.unlink(missing_ok=True)
+            if index is not None:
+                index.rollback()
+            raise
+
+        if index is not None:
+            index.commit()
+        archive_size = archive_file_path.stat().st_size
+        span.set(files=files_total, bytes_in=bytes_done, bytes_out=archive_size)
+    instrumentation.record_operation("archive", span.seconds, files_total, bytes_done, archive_size, compressed="out")
+    instrumentation.count("archive_missing_files_total", len(missing_files))
+
+    return missing_files
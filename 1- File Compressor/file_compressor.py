@@ -1,10 +1,81 @@
+import os
 import sys
+import zipfile
+import threading
+import multiprocessing
+from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QLineEdit, QPushButton,
-                             QSizePolicy, QMessageBox, QFileDialog)
-import zipfile
+                             QSizePolicy, QMessageBox, QFileDialog, QProgressBar,
+                             QComboBox, QSpinBox, QCheckBox)
 from pathlib import Path
 from datetime import datetime 
+import compression_engine
+from compression_engine import ArchiveCancelled, NothingChanged
+from archive_index import INDEX_FILE_NAME
+import _paths  # noqa: F401
+import instrumentation
+
+
+# Skipped files listed by name when an archive is written without some of them
+MISSING_FILES_SHOWN = 10
+
+
+class ArchiveWorker(QThread):
+    """
+    Run compression_engine.archive_files() off the GUI thread and report progress through signals.
+    """
+    # files done, files total, current file name
+    file_progress = pyqtSignal(int, int, str)
+    # bytes done, bytes total (object because they can exceed a 32-bit int)
+    byte_progress = pyqtSignal(object, object)
+    # list of missing files that were skipped
+    succeeded = pyqtSignal(list)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    # incremental mode found nothing new to archive
+    unchanged = pyqtSignal()
+
+    def __init__(self, files_to_archive, archive_file_path, compression, compresslevel, auto, index_path,
+                 deduplicate):
+        super().__init__()
+        self.files_to_archive = files_to_archive
+        self.archive_file_path = archive_file_path
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.auto = auto
+        self.index_path = index_path
+        self.deduplicate = deduplicate
+        self.cancel_event = threading.Event()
+        self._last_files_done = 0
+
+    def run(self):
+        try:
+            # deflate is spread over every available core, other methods run in this thread
+            missing_files = compression_engine.archive_files(
+                self.files_to_archive, self.archive_file_path,
+                progress_callback=self.report_progress, cancel_event=self.cancel_event,
+                compression=self.compression, compresslevel=self.compresslevel,
+                auto=self.auto, workers=os.cpu_count() or 1, index_path=self.index_path,
+                deduplicate=self.deduplicate)
+        except ArchiveCancelled:
+            self.cancelled.emit()
+        except NothingChanged:
+            self.unchanged.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(missing_files)
+
+    def report_progress(self, files_done, files_total, bytes_done, bytes_total, current_file):
+        # only emit the per-file signal when moving on to the next file
+        if files_done != self._last_files_done:
+            self._last_files_done = files_done
+            self.file_progress.emit(files_done, files_total, Path(current_file).name)
+        self.byte_progress.emit(bytes_done, bytes_total)
+
+    def cancel(self):
+        self.cancel_event.set()
 
 
 class MainWindow(QMainWindow):
@@ -13,7 +84,7 @@ class MainWindow(QMainWindow):
 
         self.setWindowTitle("File Compressor")
         # Set fixed window size
-        self.setFixedSize(600, 200)
+        self.setFixedSize(600, 320)
 
         # Set theme (custom style sheet)
         self.setStyleSheet("""
@@ -27,6 +98,8 @@ class MainWindow(QMainWindow):
         self.files_list = []
         self.filenames_str = " No file(s) selected yet"
         self.destination_path = " No destination folder selected yet"
+        # background thread doing the actual compression (None when idle)
+        self.archive_worker = None
 
         # First layout
         files_label = QLabel("Select file(s): ")
@@ -40,11 +113,17 @@ class MainWindow(QMainWindow):
         files_browse_button.setStyleSheet(
             "background-color: #365486;")
         files_browse_button.clicked.connect(self.browse_files)
+        folder_select_button = QPushButton("Folder")
+        folder_select_button.setStyleSheet(
+            "background-color: #365486;")
+        # archive a whole folder (with all its subfolders) instead of single files
+        folder_select_button.clicked.connect(self.browse_folder_to_archive)
 
         files_layout = QHBoxLayout()
         files_layout.addWidget(files_label)
         files_layout.addWidget(self.files_input)
         files_layout.addWidget(files_browse_button)
+        files_layout.addWidget(folder_select_button)
 
         # Second layout
         destination_label = QLabel("Select destination: ")
@@ -63,12 +142,40 @@ class MainWindow(QMainWindow):
         destination_layout.addWidget(self.destination_input)
         destination_layout.addWidget(folder_browse_button)
 
+        # Compression method layout
+        method_label = QLabel("Method: ")
+        self.method_combo = QComboBox()
+        # "Auto" deflates what is worth it and stores already compressed files (jpg, png, zip, mp4...)
+        self.method_combo.addItem("Auto")
+        self.method_combo.addItems(compression_engine.COMPRESSION_METHODS.keys())
+        self.method_combo.currentTextChanged.connect(self.on_method_changed)
+        level_label = QLabel("Level: ")
+        self.level_spin = QSpinBox()
+
+        method_layout = QHBoxLayout()
+        method_layout.addWidget(method_label)
+        method_layout.addWidget(self.method_combo)
+        method_layout.addWidget(level_label)
+        method_layout.addWidget(self.level_spin)
+        # set the level range of the default method
+        self.on_method_changed(self.method_combo.currentText())
+
+        # Options layout
+        # only archive what changed since the previous incremental run into this destination
+        self.incremental_checkbox = QCheckBox("Incremental")
+        # store files with identical content only once
+        self.deduplicate_checkbox = QCheckBox("Deduplicate")
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(self.incremental_checkbox)
+        options_layout.addWidget(self.deduplicate_checkbox)
+
         # Third layout
-        compress_button = QPushButton("Compress")
-        compress_button.setStyleSheet(
+        self.compress_button = QPushButton("Compress")
+        self.compress_button.setStyleSheet(
             "background-color: #365486;")
         # Connect compress_button clicked signal to a function
-        compress_button.clicked.connect(self.on_compress_button_clicked)
+        self.compress_button.clicked.connect(self.on_compress_button_clicked)
         clear_button = QPushButton("Clear")
         clear_button.setStyleSheet(
             "background-color: #365486;")
@@ -80,15 +187,34 @@ class MainWindow(QMainWindow):
             QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
 
         third_layout = QHBoxLayout()
-        third_layout.addWidget(compress_button)
+        third_layout.addWidget(self.compress_button)
         third_layout.addWidget(clear_button)
         third_layout.addWidget(self.result_label)
 
+        # Fourth layout
+        self.progress_bar = QProgressBar()
+        # progress is tracked in per mille so huge archives don't overflow the bar's int range
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet(
+            "background-color: #365486;")
+        self.cancel_button.setEnabled(False)
+        # Connect cancel_button clicked signal to a function
+        self.cancel_button.clicked.connect(self.cancel_archiving)
+
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+
         # Main layout
         main_layout = QVBoxLayout()
         main_layout.addLayout(files_layout)
         main_layout.addLayout(destination_layout)
+        main_layout.addLayout(method_layout)
+        main_layout.addLayout(options_layout)
         main_layout.addLayout(third_layout)
+        main_layout.addLayout(progress_layout)
 
         # Add padding to main layout
         main_layout.setContentsMargins(
@@ -109,14 +235,42 @@ class MainWindow(QMainWindow):
             # call the archive_files() function with the list of files (path) to create archived zip file
             self.archive_files(self.files_list, self.destination_path)
 
+    def selected_compression(self):
+        # return (compression, compresslevel, auto) as chosen in the method and level fields
+        method_name = self.method_combo.currentText()
+        if method_name == "Auto":
+            compression, auto = zipfile.ZIP_DEFLATED, True
+        else:
+            compression, auto = compression_engine.COMPRESSION_METHODS[method_name], False
+        compresslevel = self.level_spin.value() if compression in compression_engine.COMPRESSION_LEVELS else None
+        return compression, compresslevel, auto
+
+    def on_method_changed(self, method_name):
+        compression = zipfile.ZIP_DEFLATED if method_name == "Auto" else compression_engine.COMPRESSION_METHODS[method_name]
+        if compression in compression_engine.COMPRESSION_LEVELS:
+            minimum, maximum, default = compression_engine.COMPRESSION_LEVELS[compression]
+            self.level_spin.setRange(minimum, maximum)
+            self.level_spin.setValue(default)
+            self.level_spin.setEnabled(True)
+        else:
+            # stored and LZMA members have no level to choose
+            self.level_spin.setEnabled(False)
+
     def browse_files(self):
         self.files_list, _ = QFileDialog.getOpenFileNames(
             self, "Select Files", "", "All Files (*);;Text Files (*.txt)")
         if self.files_list:
-            # convert list of file paths to a list of file names
-            self.files_list = [file.split('/')[-1] for file in self.files_list]
-            # convert this list of file names to a str separated by ', ' to display it in the input
-            self.filenames_str = ", ".join(self.files_list)
+            # keep the full paths to archive but only display the file names, separated by ', '
+            self.filenames_str = ", ".join(Path(file).name for file in self.files_list)
+            self.files_input.setText(self.filenames_str)
+
+    def browse_folder_to_archive(self):
+        folder_path = QFileDialog.getExistingDirectory(
+            self, "Select Folder To Archive")
+        if folder_path:
+            # the folder is walked lazily when archiving, so even huge trees are cheap to select
+            self.files_list = [folder_path]
+            self.filenames_str = f"{Path(folder_path).name}/"
             self.files_input.setText(self.filenames_str)
 
     def browse_destination_folder(self):
@@ -133,6 +287,7 @@ class MainWindow(QMainWindow):
         self.files_input.clear()
         self.destination_input.clear()
         self.result_label.clear()
+        self.progress_bar.setValue(0)
 
     def archive_files(self, files_to_archive, destination_path):
         # Create a Path object for the destination path
@@ -143,32 +298,93 @@ class MainWindow(QMainWindow):
         # Format the current datetime object as a string
         current_date = datetime.now().strftime("%d-%m-%Y")
         # add to this path object the name 'archive' wth the current date then extension '.zip' to rename it
-        archive_file_path = destination_path_object / f'archive_[{current_date}].zip'
+        # (with a '_2', '_3'... suffix instead of overwriting an earlier archive of the same day)
+        archive_file_path = compression_engine.next_free_path(
+            destination_path_object / f'archive_[{current_date}].zip')
+        # the incremental index lives next to the archives it refers to
+        index_path = destination_path_object / INDEX_FILE_NAME if self.incremental_checkbox.isChecked() else None
 
-        try:
-            # Create a new zip file
-            with zipfile.ZipFile(archive_file_path, 'w') as zipf:
-                # Add each file to the zip archive
-                for filepath in files_to_archive:
-                    # Convert path string to Path object to check if exists
-                    if Path(filepath).exists():
-                        # this function accepts only string
-                        zipf.write(filepath)
-                    else:
-                        print(f"File not found: {filepath}")
-            # add success message to the result label
-            # self.result_label.setText(" Files archived successfully.")
+        # Run the compression in a background thread so the window keeps responding
+        compression, compresslevel, auto = self.selected_compression()
+        self.archive_worker = ArchiveWorker(
+            files_to_archive, archive_file_path, compression, compresslevel, auto, index_path,
+            self.deduplicate_checkbox.isChecked())
+        self.archive_worker.file_progress.connect(self.on_file_progress)
+        self.archive_worker.byte_progress.connect(self.on_byte_progress)
+        self.archive_worker.succeeded.connect(self.on_archive_succeeded)
+        self.archive_worker.failed.connect(self.on_archive_failed)
+        self.archive_worker.cancelled.connect(self.on_archive_cancelled)
+        self.archive_worker.unchanged.connect(self.on_archive_unchanged)
+        self.archive_worker.finished.connect(self.on_archive_finished)
+
+        self.progress_bar.setValue(0)
+        self.compress_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.result_label.setText(" Compressing...")
+        self.archive_worker.start()
+
+    def cancel_archiving(self):
+        if self.archive_worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.result_label.setText(" Cancelling...")
+            self.archive_worker.cancel()
+
+    def on_file_progress(self, files_done, files_total, current_file):
+        self.result_label.setText(f" {files_done}/{files_total}: {current_file}")
+
+    def on_byte_progress(self, bytes_done, bytes_total):
+        if bytes_total:
+            self.progress_bar.setValue(int(bytes_done * 1000 / bytes_total))
+
+    def on_archive_succeeded(self, missing_files):
+        self.progress_bar.setValue(1000)
+        if missing_files:
+            # the archive was written without them, list the first few
+            skipped = "\n".join(str(filepath) for filepath in missing_files[:MISSING_FILES_SHOWN])
+            if len(missing_files) > MISSING_FILES_SHOWN:
+                skipped += f"\n... and {len(missing_files) - MISSING_FILES_SHOWN} more"
+            QMessageBox.warning(
+                self, "Archived with missing files",
+                f"Files archived, but {len(missing_files)} could not be found and were skipped:\n{skipped}")
+        else:
             # display success message
             QMessageBox.information(
                 self, "Success", "Files archived successfully.")
-            self.clear_fields()
+        self.clear_fields()
 
-        except Exception as e:
-            QMessageBox.warning(
-                self, "Warning", f"Error archiving files: {e}")
+    def on_archive_failed(self, error_message):
+        self.result_label.clear()
+        QMessageBox.warning(
+            self, "Warning", f"Error archiving files: {error_message}")
+
+    def on_archive_cancelled(self):
+        self.progress_bar.setValue(0)
+        self.result_label.setText(" Archiving cancelled.")
+
+    def on_archive_unchanged(self):
+        self.progress_bar.setValue(0)
+        self.result_label.clear()
+        QMessageBox.information(
+            self, "Up to date", "Nothing changed since the previous archive, no new archive was written.")
+
+    def on_archive_finished(self):
+        self.archive_worker = None
+        self.compress_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+
+    def closeEvent(self, event):
+        # Stop a running compression cleanly (the partial archive gets removed) before closing
+        if self.archive_worker is not None:
+            self.archive_worker.cancel()
+            self.archive_worker.wait()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
+    # needed by the compression worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    # Prometheus metrics and trace of the archives, when METRICS_PORT or METRICS_DIR is set
+    instrumentation.export_from_environment()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
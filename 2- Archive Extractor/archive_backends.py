@@ -0,0 +1,309 @@
+import tarfile
+import threading
+import importlib.util
+from pathlib import Path
+import extraction_engine
+from extraction_engine import DEFAULT_LIMITS, ArchiveListing, ZipArchiveListing, check_cancelled, safe_destination
+import _paths  # noqa: F401
+import instrumentation
+
+
+# Optional backends, only registered when their package is installed; the packages are imported
+# by _load_optional_backends() when the first archive is opened
+zstandard = None
+py7zr = None
+SEVEN_ZIP_INSTALLED = importlib.util.find_spec("py7zr") is not None
+_optional_backends_loaded = False
+_optional_backends_lock = threading.Lock()
+
+
+def _load_optional_backends():
+    # Import the installed optional packages once, before any extraction thread uses them
+    global zstandard, py7zr, _optional_backends_loaded
+    with _optional_backends_lock:
+        if _optional_backends_loaded:
+            return
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+        try:
+            import py7zr
+        except ImportError:
+            py7zr = None
+        _optional_backends_loaded = True
+
+
+# Number of bytes read from the start of a file to recognize its format
+HEADER_SIZE = 512
+# File dialog filter listing the extensions of every supported format
+ARCHIVE_FILE_FILTER = ("Archives (*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tbz2 *.tar.xz *.txz"
+                       " *.tar.zst *.tzst *.7z);;All Files (*)")
+
+
+class UnsupportedArchive(Exception):
+    """
+    Raised when no registered backend recognizes an archive.
+    """
+
+
+class ArchiveBackend:
+    """
+    Base of the archive format backends.
+
+    A backend recognizes its format from the first bytes of a file (never from the extension),
+    extracts it and lists its contents for the archive browser.
+    """
+    name = ""
+
+    def matches(self, header):
+        """
+        Tell if the given first bytes of a file belong to this format.
+        """
+        raise NotImplementedError
+
+    def extract(self, filepath, extracted_files_path, progress_callback=None, cancel_event=None, workers=1,
+                member_names=None, executor=None, limits=None):
+        """
+        Extract the archive, same parameters and return value as extraction_engine.extract_archive().
+
+        Backends that cannot split the work (streams, external libraries) ignore workers and executor.
+        """
+        raise NotImplementedError
+
+    def open_listing(self, filepath):
+        """
+        Return an ArchiveListing of the archive contents.
+        """
+        raise NotImplementedError
+
+
+class ZipBackend(ArchiveBackend):
+    name = "zip"
+
+    def matches(self, header):
+        # local file header, or end of central directory for an empty archive
+        return header[:4] in (b'PK\x03\x04', b'PK\x05\x06')
+
+    def extract(self, filepath, extracted_files_path, progress_callback=None, cancel_event=None, workers=1,
+                member_names=None, executor=None, limits=None):
+        return extraction_engine.extract_archive(filepath, extracted_files_path, progress_callback, cancel_event,
+                                                 workers, member_names, executor, limits)
+
+    def open_listing(self, filepath):
+        return ZipArchiveListing(filepath)
+
+
+class TarArchiveListing(ArchiveListing):
+    """
+    Contents of a (possibly compressed) tar archive.
+
+    Tar has no central directory, so the whole stream is decoded once, skipping the file data.
+    """
+
+    def __init__(self, filepath, backend):
+        super().__init__(filepath)
+        with backend.open_stream(self.filepath) as (tar, _):
+            for member in tar:
+                if member.isdir():
+                    self.add(member.name.rstrip('/') + '/', 0)
+                elif member.isfile():
+                    self.add(member.name, member.size)
+
+
+class TarBackend(ArchiveBackend):
+    """
+    Tar archives, plain or compressed, decoded in a single forward pass without temporary files.
+    """
+
+    def __init__(self, name, magic, stream_mode):
+        """
+        Parameters:
+        - name: name of the format.
+        - magic: first bytes of the files of this format (None for plain tar).
+        - stream_mode: tarfile stream mode used to read it ('r|', 'r|gz', ...).
+        """
+        self.name = name
+        self.magic = magic
+        self.stream_mode = stream_mode
+
+    def matches(self, header):
+        if self.magic is None:
+            # POSIX and GNU tar headers carry 'ustar' at offset 257
+            return header[257:262] == b'ustar'
+        return header.startswith(self.magic)
+
+    def open_stream(self, filepath):
+        return _TarStream(filepath, self.stream_mode)
+
+    def extract(self, filepath, extracted_files_path, progress_callback=None, cancel_event=None, workers=1,
+                member_names=None, executor=None, limits=None):
+        # progress is measured on the compressed input since the number of members is unknown up front
+        bytes_total = Path(filepath).stat().st_size
+        limits = limits or DEFAULT_LIMITS
+        members_done = 0
+        size_done = 0
+        # the 'data' filter (when this Python has it) also strips dangerous permissions
+        extract_options = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+        with self.open_stream(filepath) as (tar, raw_file):
+            for member in tar:
+                check_cancelled(cancel_event)
+                if member_names is not None and member.name not in member_names:
+                    continue
+                # links and special files are skipped, they could point outside the destination
+                if not (member.isfile() or member.isdir()):
+                    continue
+                safe_destination(extracted_files_path, member.name)
+                # tar has no directory to check up front, the limits are applied as the stream goes
+                members_done += 1
+                size_done += member.size
+                limits.check_files(members_done)
+                limits.check_size(size_done)
+                tar.extract(member, extracted_files_path, **extract_options)
+                # only now has the member's compressed data been read, not just its header
+                limits.check_ratio(size_done, raw_file.tell())
+                if progress_callback is not None:
+                    progress_callback(members_done, 0, raw_file.tell(), bytes_total)
+        return members_done, size_done
+
+    def open_listing(self, filepath):
+        return TarArchiveListing(filepath, self)
+
+
+class ZstandardTarBackend(TarBackend):
+    """
+    Zstandard compressed tar, read through tarfile on Python 3.14+ or the zstandard package otherwise.
+    """
+
+    def open_stream(self, filepath):
+        if "zst" in tarfile.TarFile.OPEN_METH:
+            return _TarStream(filepath, "r|zst")
+        if zstandard is None:
+            raise UnsupportedArchive("Zstandard archives need Python 3.14+ or the 'zstandard' package.")
+        return _TarStream(filepath, "r|", zstandard.ZstdDecompressor().stream_reader)
+
+
+class _TarStream:
+    # Context manager opening a tar stream, returns (tarfile, raw file) to follow the progress
+    def __init__(self, filepath, stream_mode, decoder=None):
+        self.filepath = filepath
+        self.stream_mode = stream_mode
+        self.decoder = decoder
+
+    def __enter__(self):
+        self.raw_file = open(self.filepath, 'rb')
+        fileobj = self.decoder(self.raw_file) if self.decoder is not None else self.raw_file
+        self.tar = tarfile.open(fileobj=fileobj, mode=self.stream_mode)
+        return self.tar, self.raw_file
+
+    def __exit__(self, *exc_info):
+        self.tar.close()
+        self.raw_file.close()
+
+
+class SevenZipListing(ArchiveListing):
+    """
+    Contents of a 7z archive, read from its header.
+    """
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        with py7zr.SevenZipFile(self.filepath, 'r') as archive:
+            for entry in archive.list():
+                self.add(entry.filename + '/' if entry.is_directory else entry.filename,
+                         entry.uncompressed or 0)
+
+
+class SevenZipBackend(ArchiveBackend):
+    name = "7z"
+
+    def matches(self, header):
+        return header.startswith(b"7z\xbc\xaf\x27\x1c")
+
+    def extract(self, filepath, extracted_files_path, progress_callback=None, cancel_event=None, workers=1,
+                member_names=None, executor=None, limits=None):
+        check_cancelled(cancel_event)
+        limits = limits or DEFAULT_LIMITS
+        with py7zr.SevenZipFile(filepath, 'r') as archive:
+            names = archive.getnames() if member_names is None else sorted(member_names)
+            for name in names:
+                safe_destination(extracted_files_path, name)
+            wanted_names = set(names)
+            sizes = [entry.uncompressed or 0 for entry in archive.list() if entry.filename in wanted_names]
+            limits.check_files(len(names))
+            limits.check_size(sum(sizes))
+            limits.check_ratio(sum(sizes), Path(filepath).stat().st_size)
+            archive.extract(path=extracted_files_path, targets=names)
+        if progress_callback is not None:
+            progress_callback(len(names), len(names), 1, 1)
+        return len(names), sum(sizes)
+
+    def open_listing(self, filepath):
+        return SevenZipListing(filepath)
+
+
+# Registered backends, tried in order on the first bytes of the archive
+ARCHIVE_BACKENDS = []
+
+
+def register_backend(backend):
+    """
+    Add a backend to the registry (later registrations are tried last).
+    """
+    ARCHIVE_BACKENDS.append(backend)
+
+
+register_backend(ZipBackend())
+register_backend(TarBackend("tar.gz", b"\x1f\x8b", "r|gz"))
+register_backend(TarBackend("tar.bz2", b"BZh", "r|bz2"))
+register_backend(TarBackend("tar.xz", b"\xfd7zXZ\x00", "r|xz"))
+register_backend(ZstandardTarBackend("tar.zst", b"\x28\xb5\x2f\xfd", None))
+register_backend(TarBackend("tar", None, "r|"))
+if SEVEN_ZIP_INSTALLED:
+    register_backend(SevenZipBackend())
+
+
+def detect_backend(filepath):
+    """
+    Find the backend able to read an archive from its first bytes.
+
+    Parameters:
+    - filepath: path of the archive.
+
+    Returns:
+    - backend: the matching ArchiveBackend.
+    """
+    if not _optional_backends_loaded:
+        _load_optional_backends()
+    with open(filepath, 'rb') as archive_file:
+        header = archive_file.read(HEADER_SIZE)
+    for backend in ARCHIVE_BACKENDS:
+        if backend.matches(header):
+            return backend
+    raise UnsupportedArchive(f'Unsupported archive format: "{Path(filepath).name}"')
+
+
+def extract(filepath, extracted_files_path, progress_callback=None, cancel_event=None, workers=1,
+            member_names=None, executor=None, limits=None):
+    """
+    Extract an archive of any registered format, same parameters as extraction_engine.extract_archive().
+
+    Returns:
+    - members_done: number of members extracted.
+    - bytes_written: uncompressed size of the extracted members.
+    """
+    backend = detect_backend(filepath)
+    with instrumentation.span("extract", archive=Path(filepath).name, format=backend.name) as span:
+        members_done, bytes_written = backend.extract(filepath, extracted_files_path, progress_callback,
+                                                      cancel_event, workers, member_names, executor, limits)
+        span.set(members=members_done, bytes_out=bytes_written)
+    instrumentation.record_operation("extract", span.seconds, members_done, Path(filepath).stat().st_size,
+                                     bytes_written, compressed="in")
+    return members_done, bytes_written
+
+
+def open_listing(filepath):
+    """
+    Return an ArchiveListing of an archive of any registered format.
+    """
+    return detect_backend(filepath).open_listing(filepath)
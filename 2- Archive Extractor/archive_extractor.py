@@ -1,10 +1,308 @@
+import os
 import sys
+import threading
+import multiprocessing
+from PyQt6.QtCore import Qt, QThread, QTimer, QFileSystemWatcher, pyqtSignal
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QLineEdit, QPushButton,
-                             QSizePolicy, QMessageBox, QFileDialog)
-import zipfile
+                             QSizePolicy, QMessageBox, QFileDialog, QProgressBar,
+                             QDialog, QTreeWidget, QTreeWidgetItem, QAbstractItemView,
+                             QTableWidget, QTableWidgetItem, QHeaderView)
 from pathlib import Path
 from datetime import datetime
+import archive_backends
+from archive_backends import UnsupportedArchive
+from extraction_engine import ExtractionCancelled
+from batch_extraction import BatchScheduler, ExtractionJob, archive_folder_name
+import _paths  # noqa: F401
+import instrumentation
+
+
+class ExtractWorker(QThread):
+    """
+    Run archive_backends.extract() off the GUI thread and report progress through signals.
+    """
+    # members done, members total, bytes done, bytes total (object because bytes can exceed a 32-bit int)
+    progress = pyqtSignal(object, object, object, object)
+    succeeded = pyqtSignal()
+    # error message, and True if the archive itself was not found
+    failed = pyqtSignal(str, bool)
+    cancelled = pyqtSignal()
+
+    def __init__(self, filepath, extracted_files_path, member_names=None):
+        super().__init__()
+        self.filepath = filepath
+        self.extracted_files_path = extracted_files_path
+        self.member_names = member_names
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            # zip members are spread over every available core, tar streams are decoded in one pass
+            archive_backends.extract(
+                self.filepath, self.extracted_files_path,
+                progress_callback=self.progress.emit, cancel_event=self.cancel_event,
+                workers=os.cpu_count() or 1, member_names=self.member_names)
+        except ExtractionCancelled:
+            self.cancelled.emit()
+        except FileNotFoundError as e:
+            self.failed.emit(str(e), Path(e.filename or "") == Path(self.filepath))
+        except Exception as e:
+            self.failed.emit(str(e), False)
+        else:
+            self.succeeded.emit()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class ArchiveBrowserDialog(QDialog):
+    """
+    Browse the contents of an archive without extracting it and pick what to extract.
+
+    Only the central directory is read, and each folder of the tree is filled in the first
+    time it is expanded, so even archives with huge numbers of members open instantly.
+    """
+
+    def __init__(self, parent, archive_path):
+        super().__init__(parent)
+
+        self.setWindowTitle(f"Contents of {Path(archive_path).name}")
+        self.resize(600, 500)
+
+        self.listing = archive_backends.open_listing(archive_path)
+        # member names chosen by the user, filled when the dialog is accepted
+        self.selected_members = []
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Name", "Size"])
+        self.tree.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tree.setColumnWidth(0, 400)
+        # fill a folder only when it gets expanded
+        self.tree.itemExpanded.connect(self.on_item_expanded)
+        self.add_folder_items(self.tree.invisibleRootItem(), "")
+
+        patterns_label = QLabel("Patterns: ")
+        self.patterns_input = QLineEdit()
+        self.patterns_input.setPlaceholderText(" e.g. *.txt, docs/*")
+
+        patterns_layout = QHBoxLayout()
+        patterns_layout.addWidget(patterns_label)
+        patterns_layout.addWidget(self.patterns_input)
+
+        extract_selected_button = QPushButton("Extract selected")
+        extract_selected_button.setStyleSheet(
+            "background-color: #365486;")
+        extract_selected_button.clicked.connect(self.on_extract_selected_clicked)
+        cancel_button = QPushButton("Cancel")
+        cancel_button.setStyleSheet(
+            "background-color: #365486;")
+        cancel_button.clicked.connect(self.reject)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(extract_selected_button)
+        buttons_layout.addWidget(cancel_button)
+
+        main_layout = QVBoxLayout()
+        main_layout.addWidget(self.tree)
+        main_layout.addLayout(patterns_layout)
+        main_layout.addLayout(buttons_layout)
+        self.setLayout(main_layout)
+
+    def add_folder_items(self, parent_item, folder):
+        for name, is_folder, size in self.listing.list_folder(folder):
+            item = QTreeWidgetItem(parent_item, [name.split('/')[-1], "" if is_folder else f"{size:,}"])
+            # remember the full path and the kind of entry on the item itself
+            item.setData(0, Qt.ItemDataRole.UserRole, (name, is_folder))
+            if is_folder:
+                # show the expand arrow without loading the folder yet
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+
+    def on_item_expanded(self, item):
+        name, is_folder = item.data(0, Qt.ItemDataRole.UserRole)
+        if is_folder and item.childCount() == 0:
+            self.add_folder_items(item, name)
+
+    def on_extract_selected_clicked(self):
+        selected_members = set()
+        for item in self.tree.selectedItems():
+            name, is_folder = item.data(0, Qt.ItemDataRole.UserRole)
+            if is_folder:
+                selected_members.update(self.listing.members_under(name))
+            else:
+                selected_members.add(name)
+        patterns = [pattern.strip() for pattern in self.patterns_input.text().split(',') if pattern.strip()]
+        if patterns:
+            selected_members.update(self.listing.match(patterns))
+
+        if not selected_members:
+            QMessageBox.warning(
+                self, "Warning", "Please select at least one file or folder, or enter a pattern matching some files.")
+        else:
+            self.selected_members = sorted(selected_members)
+            self.accept()
+
+    def done(self, result):
+        # release the archive whichever way the dialog is closed
+        self.listing.close()
+        super().done(result)
+
+
+class BatchDialog(QDialog):
+    """
+    Queue many archives (added, dropped on the window or appearing in a watched folder)
+    and extract them concurrently, with per-job status, speed and an overall ETA.
+    """
+    # emitted from the job threads, delivered on the GUI thread
+    job_updated = pyqtSignal(object)
+
+    def __init__(self, parent, destination_path):
+        super().__init__(parent)
+
+        self.setWindowTitle("Batch Extraction")
+        self.resize(700, 450)
+        # archives can be dropped straight on the dialog
+        self.setAcceptDrops(True)
+
+        # every archive gets its own folder inside the usual dated folder
+        current_date = datetime.now().strftime("%d-%m-%Y")
+        self.extracted_files_path = Path(destination_path) / f'extracted_files_[{current_date}]'
+        self.used_folder_names = set()
+        self.job_rows = {}
+        # watched folder files seen on the last scan with their size, to wait until they are fully written
+        self.watched_sizes = {}
+
+        self.job_updated.connect(self.on_job_updated)
+        self.scheduler = BatchScheduler(on_update=self.job_updated.emit)
+
+        self.jobs_table = QTableWidget(0, 4)
+        self.jobs_table.setHorizontalHeaderLabels(["Archive", "Status", "Progress", "MB/s"])
+        self.jobs_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.jobs_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        add_button = QPushButton("Add archives")
+        add_button.setStyleSheet(
+            "background-color: #365486;")
+        add_button.clicked.connect(self.browse_archives)
+        watch_button = QPushButton("Watch folder")
+        watch_button.setStyleSheet(
+            "background-color: #365486;")
+        watch_button.clicked.connect(self.browse_watched_folder)
+        cancel_all_button = QPushButton("Cancel all")
+        cancel_all_button.setStyleSheet(
+            "background-color: #365486;")
+        cancel_all_button.clicked.connect(self.scheduler.cancel_all)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(add_button)
+        buttons_layout.addWidget(watch_button)
+        buttons_layout.addWidget(cancel_all_button)
+
+        self.status_label = QLabel(" Drop archives here or add them.")
+
+        main_layout = QVBoxLayout()
+        main_layout.addWidget(self.jobs_table)
+        main_layout.addLayout(buttons_layout)
+        main_layout.addWidget(self.status_label)
+        self.setLayout(main_layout)
+
+        self.folder_watcher = QFileSystemWatcher(self)
+        self.folder_watcher.directoryChanged.connect(self.scan_watched_folder)
+        # refresh speeds and ETA, and rescan the watched folder for files still being written
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.on_refresh_timer)
+        self.refresh_timer.start(1000)
+
+    def add_archive(self, archive_path):
+        try:
+            archive_backends.detect_backend(archive_path)
+        except (UnsupportedArchive, OSError):
+            self.status_label.setText(f" Skipped (not a supported archive): {Path(archive_path).name}")
+            return
+        # two archives with the same name don't end up in the same folder
+        folder_name = archive_folder_name(archive_path)
+        number = 2
+        unique_name = folder_name
+        while unique_name in self.used_folder_names:
+            unique_name = f"{folder_name}_{number}"
+            number += 1
+        self.used_folder_names.add(unique_name)
+
+        job = ExtractionJob(archive_path, self.extracted_files_path / unique_name)
+        row = self.jobs_table.rowCount()
+        self.jobs_table.insertRow(row)
+        self.jobs_table.setItem(row, 0, QTableWidgetItem(Path(archive_path).name))
+        for column in range(1, 4):
+            self.jobs_table.setItem(row, column, QTableWidgetItem(""))
+        self.job_rows[job] = row
+        self.scheduler.add(job)
+
+    def browse_archives(self):
+        archive_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Select Archives", "", archive_backends.ARCHIVE_FILE_FILTER)
+        for archive_path in archive_paths:
+            self.add_archive(archive_path)
+
+    def browse_watched_folder(self):
+        folder_path = QFileDialog.getExistingDirectory(
+            self, "Select Folder To Watch")
+        if folder_path:
+            if self.folder_watcher.directories():
+                self.folder_watcher.removePaths(self.folder_watcher.directories())
+            self.folder_watcher.addPath(folder_path)
+            self.watched_sizes = {}
+            self.status_label.setText(f" Watching {folder_path}")
+            self.scan_watched_folder()
+
+    def scan_watched_folder(self):
+        for folder_path in self.folder_watcher.directories():
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if not entry.is_file() or self.watched_sizes.get(entry.path) == -1:
+                        continue
+                    size = entry.stat().st_size
+                    # queue a file once its size stopped changing between two scans
+                    if self.watched_sizes.get(entry.path) == size:
+                        self.watched_sizes[entry.path] = -1
+                        self.add_archive(entry.path)
+                    else:
+                        self.watched_sizes[entry.path] = size
+
+    def on_job_updated(self, job):
+        row = self.job_rows.get(job)
+        if row is None:
+            return
+        status = job.status if job.error is None else f"Failed: {job.error}"
+        self.jobs_table.item(row, 1).setText(status)
+        self.jobs_table.item(row, 2).setText(f"{job.fraction_done * 100:.0f} %")
+        self.jobs_table.item(row, 3).setText(f"{job.throughput():.1f}")
+
+    def on_refresh_timer(self):
+        for job in self.job_rows:
+            if job.status == "Running":
+                self.on_job_updated(job)
+        if self.folder_watcher.directories():
+            self.scan_watched_folder()
+        if self.scheduler.is_busy():
+            eta = self.scheduler.eta()
+            self.status_label.setText(" Estimating time left..." if eta is None else f" About {eta:.0f} s left")
+        elif self.job_rows:
+            self.status_label.setText(" All jobs finished.")
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        for url in event.mimeData().urls():
+            if url.isLocalFile() and Path(url.toLocalFile()).is_file():
+                self.add_archive(url.toLocalFile())
+
+    def done(self, result):
+        # stop the jobs and the shared worker processes whichever way the dialog is closed
+        self.refresh_timer.stop()
+        self.scheduler.shutdown()
+        super().done(result)
 
 
 class MainWindow(QMainWindow):
@@ -14,7 +312,7 @@ class MainWindow(QMainWindow):
 
         self.setWindowTitle("Archive Extractor")
         # Set fixed window size
-        self.setFixedSize(600, 200)
+        self.setFixedSize(600, 240)
 
         # Set theme (custom style sheet)
         self.setStyleSheet("""
@@ -27,6 +325,8 @@ class MainWindow(QMainWindow):
         # set the values of the respected archive file and destination paths
         self.archive_path = " No archive file selected yet"
         self.destination_path = " No destination folder selected yet"
+        # background thread doing the actual extraction (None when idle)
+        self.extract_worker = None
 
         # First layout
         archive_label = QLabel("Select archive file: ")
@@ -40,11 +340,17 @@ class MainWindow(QMainWindow):
         file_browse_button.setStyleSheet(
             "background-color: #365486;")
         file_browse_button.clicked.connect(self.browse_archive_file)
+        contents_button = QPushButton("Contents")
+        contents_button.setStyleSheet(
+            "background-color: #365486;")
+        # look inside the archive and extract only part of it
+        contents_button.clicked.connect(self.on_contents_button_clicked)
 
         archive_layout = QHBoxLayout()
         archive_layout.addWidget(archive_label)
         archive_layout.addWidget(self.archive_input)
         archive_layout.addWidget(file_browse_button)
+        archive_layout.addWidget(contents_button)
 
         # Second layout
         destination_label = QLabel("Select destination: ")
@@ -64,31 +370,54 @@ class MainWindow(QMainWindow):
         destination_layout.addWidget(folder_browse_button)
 
         # Third layout
-        extract_button = QPushButton("Extract")
-        extract_button.setStyleSheet(
+        self.extract_button = QPushButton("Extract")
+        self.extract_button.setStyleSheet(
             "background-color: #365486;")
         # Connect extract_button clicked signal to a function
-        extract_button.clicked.connect(self.on_extract_button_clicked)
+        self.extract_button.clicked.connect(self.on_extract_button_clicked)
         clear_button = QPushButton("Clear")
         clear_button.setStyleSheet(
             "background-color: #365486;")
         # Connect compress_button clicked signal to a function
         clear_button.clicked.connect(self.clear_fields)
+        batch_button = QPushButton("Batch")
+        batch_button.setStyleSheet(
+            "background-color: #365486;")
+        # extract many archives at once
+        batch_button.clicked.connect(self.on_batch_button_clicked)
         self.result_label = QLabel("")
         # make result_label take up auto space
         self.result_label.setSizePolicy(
             QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
 
         third_layout = QHBoxLayout()
-        third_layout.addWidget(extract_button)
+        third_layout.addWidget(self.extract_button)
         third_layout.addWidget(clear_button)
+        third_layout.addWidget(batch_button)
         third_layout.addWidget(self.result_label)
 
+        # Fourth layout
+        self.progress_bar = QProgressBar()
+        # progress is tracked in per mille so huge archives don't overflow the bar's int range
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet(
+            "background-color: #365486;")
+        self.cancel_button.setEnabled(False)
+        # Connect cancel_button clicked signal to a function
+        self.cancel_button.clicked.connect(self.cancel_extraction)
+
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
+
         # Main layout
         main_layout = QVBoxLayout()
         main_layout.addLayout(archive_layout)
         main_layout.addLayout(destination_layout)
         main_layout.addLayout(third_layout)
+        main_layout.addLayout(progress_layout)
 
         # Add padding to main layout
         main_layout.setContentsMargins(
@@ -109,12 +438,36 @@ class MainWindow(QMainWindow):
             # skip this function and continue if input fields are not empty
             self.extract_file(self.archive_path, self.destination_path)
 
+    def on_contents_button_clicked(self):
+        # Check if input fields are empty means nothing was selected
+        if self.archive_input.text().strip() == "" or self.destination_input.text().strip() == "":
+            QMessageBox.warning(
+                self, "Warning", "Please make sure to select both an archive file and a destination directory.")
+            return
+        try:
+            browser_dialog = ArchiveBrowserDialog(self, self.archive_path)
+        except Exception as e:
+            QMessageBox.warning(
+                self, "Warning", f"Error reading archive: {e}")
+            return
+        if browser_dialog.exec() == QDialog.DialogCode.Accepted:
+            # extract only the chosen members
+            self.extract_file(self.archive_path, self.destination_path, browser_dialog.selected_members)
+
+    def on_batch_button_clicked(self):
+        if self.destination_input.text().strip() == "":
+            QMessageBox.warning(
+                self, "Warning", "Please make sure to select a destination directory.")
+        else:
+            batch_dialog = BatchDialog(self, self.destination_path)
+            batch_dialog.exec()
+
     def browse_archive_file(self):
         file_dialog = QFileDialog(self)
         file_dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
-        # Filter only ZIP files to be selected
+        # Filter archive files (the format itself is recognized from the file content)
         self.archive_path, _ = file_dialog.getOpenFileName(
-            self, "Select Archive", "", "ZIP Files (*.zip)")
+            self, "Select Archive", "", archive_backends.ARCHIVE_FILE_FILTER)
         if self.archive_path:
             # set the path in the respective input text
             self.archive_input.setText(self.archive_path)
@@ -132,8 +485,9 @@ class MainWindow(QMainWindow):
         self.archive_input.clear()
         self.destination_input.clear()
         self.result_label.clear()
+        self.progress_bar.setValue(0)
 
-    def extract_file(self, filepath, destination_path):
+    def extract_file(self, filepath, destination_path, member_names=None):
         # Convert file path string to Path object
         filepath_object = Path(filepath)
 
@@ -143,27 +497,72 @@ class MainWindow(QMainWindow):
         extracted_files_path = Path(
             destination_path) / f'extracted_files_[{current_date}]'
 
-        try:
-            # Open an existing zip file
-            with zipfile.ZipFile(filepath_object, 'r') as zipf:
-                # Extract all files from the zip archive
-                zipf.extractall(extracted_files_path)
-            # add success message to the result label
-            # self.result_label.setText(" Files extracted successfully.")
-            # display success message
-            QMessageBox.information(
-                self, "Success", "Files extracted successfully.")
-            self.clear_fields()
-
-        except FileNotFoundError:
+        # Run the extraction in a background thread so the window keeps responding
+        self.extract_worker = ExtractWorker(filepath_object, extracted_files_path, member_names)
+        self.extract_worker.progress.connect(self.on_extract_progress)
+        self.extract_worker.succeeded.connect(self.on_extract_succeeded)
+        self.extract_worker.failed.connect(self.on_extract_failed)
+        self.extract_worker.cancelled.connect(self.on_extract_cancelled)
+        self.extract_worker.finished.connect(self.on_extract_finished)
+
+        self.progress_bar.setValue(0)
+        self.extract_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.result_label.setText(" Extracting...")
+        self.extract_worker.start()
+
+    def cancel_extraction(self):
+        if self.extract_worker is not None:
+            self.cancel_button.setEnabled(False)
+            self.result_label.setText(" Cancelling...")
+            self.extract_worker.cancel()
+
+    def on_extract_progress(self, members_done, members_total, bytes_done, bytes_total):
+        # tar streams don't know their number of members in advance
+        if members_total:
+            self.result_label.setText(f" {members_done}/{members_total} files")
+        else:
+            self.result_label.setText(f" {members_done} files")
+        if bytes_total:
+            self.progress_bar.setValue(int(bytes_done * 1000 / bytes_total))
+
+    def on_extract_succeeded(self):
+        self.progress_bar.setValue(1000)
+        # display success message
+        QMessageBox.information(
+            self, "Success", "Files extracted successfully.")
+        self.clear_fields()
+
+    def on_extract_failed(self, error_message, archive_not_found):
+        self.result_label.clear()
+        if archive_not_found:
             QMessageBox.warning(
-                self, "Warning", f'File not found:  "{filepath}"')
-        except Exception as e:
+                self, "Warning", f'File not found:  "{self.extract_worker.filepath}"')
+        else:
             QMessageBox.warning(
-                self, "Warning", f"Error archiving files: {e}")
+                self, "Warning", f"Error extracting files: {error_message}")
+
+    def on_extract_cancelled(self):
+        self.progress_bar.setValue(0)
+        self.result_label.setText(" Extraction cancelled.")
+
+    def on_extract_finished(self):
+        self.extract_worker = None
+        self.extract_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
 
+    def closeEvent(self, event):
+        # Stop a running extraction before closing
+        if self.extract_worker is not None:
+            self.extract_worker.cancel()
+            self.extract_worker.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    # needed by the extraction worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    # Prometheus metrics and trace of the extractions, when METRICS_PORT or METRICS_DIR is set
+    instrumentation.export_from_environment()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -0,0 +1,206 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import archive_backends
+from extraction_engine import ExtractionCancelled
+
+
+# Jobs reading from the same disk at once, more than this mostly adds seeks on spinning disks
+MAX_JOBS_PER_DEVICE = 2
+# Jobs running at once over all disks
+MAX_JOBS = max(1, min(8, os.cpu_count() or 1))
+
+
+# Extensions dropped from an archive name to name the folder it is extracted into
+ARCHIVE_SUFFIXES = {".zip", ".tar", ".gz", ".tgz", ".bz2", ".tbz2", ".xz", ".txz", ".zst", ".tzst", ".7z"}
+
+
+def archive_folder_name(archive_path):
+    """
+    Name of the folder an archive of a batch is extracted into ('logs.tar.gz' -> 'logs').
+    """
+    name = Path(archive_path).name
+    while Path(name).suffix.lower() in ARCHIVE_SUFFIXES:
+        name = Path(name).stem
+    return name or Path(archive_path).name
+
+
+class ExtractionJob:
+    """
+    One archive of a batch with its status and progress.
+
+    Progress is kept as the fraction of the archive done, which lets jobs of every format be
+    compared in bytes of archive read (tar streams only know how far they are in the input).
+    """
+
+    def __init__(self, archive_path, extracted_files_path):
+        """
+        Parameters:
+        - archive_path: path of the archive to extract.
+        - extracted_files_path: Path of the folder to extract it into.
+        """
+        self.archive_path = str(archive_path)
+        self.extracted_files_path = extracted_files_path
+        self.archive_size = Path(archive_path).stat().st_size
+        # device of the archive, jobs on the same disk share its MAX_JOBS_PER_DEVICE slots
+        self.device = Path(archive_path).stat().st_dev
+        # Queued, Running, Done, Failed or Cancelled
+        self.status = "Queued"
+        self.error = None
+        self.fraction_done = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def bytes_done(self):
+        return self.archive_size * self.fraction_done
+
+    def throughput(self):
+        """
+        Return the speed of the job in MB of archive per second (0 before it starts).
+        """
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.bytes_done() / 1e6 / elapsed if elapsed > 0 else 0.0
+
+
+class BatchScheduler:
+    """
+    Run extraction jobs with a bounded number of jobs per disk and overall.
+
+    Each running job gets its own thread, and zip jobs split their members over one process
+    pool shared by the whole batch, so adding jobs never multiplies the number of processes.
+    """
+
+    def __init__(self, on_update=None, max_jobs=MAX_JOBS, max_jobs_per_device=MAX_JOBS_PER_DEVICE, workers=None):
+        """
+        Parameters:
+        - on_update: optional callable(job) called (from the job threads) whenever a job changes.
+        - max_jobs: number of jobs running at once.
+        - max_jobs_per_device: number of jobs running at once on the same disk.
+        - workers: size of the shared process pool (defaults to the number of CPUs).
+        """
+        self.on_update = on_update
+        self.max_jobs = max_jobs
+        self.max_jobs_per_device = max_jobs_per_device
+        self.workers = workers or os.cpu_count() or 1
+        self.jobs = []
+        self.started_at = None
+        self._executor = None
+        self._lock = threading.Lock()
+        # notified whenever a job stops running
+        self._job_finished = threading.Condition(self._lock)
+
+    def add(self, job):
+        with self._lock:
+            self.jobs.append(job)
+        self._notify(job)
+        self._dispatch()
+
+    def _notify(self, job):
+        if self.on_update is not None:
+            self.on_update(job)
+
+    def _dispatch(self):
+        # Start queued jobs in order, skipping those whose disk is already busy
+        with self._lock:
+            running = [job for job in self.jobs if job.status == "Running"]
+            for job in self.jobs:
+                if len(running) >= self.max_jobs:
+                    break
+                if job.status != "Queued":
+                    continue
+                if sum(1 for other in running if other.device == job.device) >= self.max_jobs_per_device:
+                    continue
+                if self._executor is None:
+                    # 'spawn' avoids forking a process that is running Qt threads
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                if self.started_at is None:
+                    self.started_at = time.monotonic()
+                job.status = "Running"
+                job.started_at = time.monotonic()
+                running.append(job)
+                threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        def report(members_done, members_total, bytes_done, bytes_total):
+            job.fraction_done = bytes_done / bytes_total if bytes_total else 0.0
+            self._notify(job)
+
+        self._notify(job)
+        try:
+            archive_backends.extract(job.archive_path, job.extracted_files_path, progress_callback=report,
+                                     cancel_event=job.cancel_event, executor=self._executor)
+        except ExtractionCancelled:
+            status, error = "Cancelled", None
+        except Exception as e:
+            status, error = "Failed", str(e)
+        else:
+            status, error = "Done", None
+        with self._lock:
+            job.status = status
+            job.error = error
+            if status == "Done":
+                job.fraction_done = 1.0
+            job.finished_at = time.monotonic()
+            self._job_finished.notify_all()
+        self._notify(job)
+        self._dispatch()
+
+    def eta(self):
+        """
+        Estimate the seconds left for the whole batch from the speed of the batch so far.
+
+        Returns:
+        - seconds: estimated remaining time, or None while it cannot be estimated yet.
+        """
+        with self._lock:
+            active_jobs = [job for job in self.jobs if job.status in ("Queued", "Running", "Done")]
+        bytes_done = sum(job.bytes_done() for job in active_jobs)
+        bytes_left = sum(job.archive_size - job.bytes_done() for job in active_jobs)
+        if self.started_at is None or bytes_done == 0:
+            return None
+        speed = bytes_done / (time.monotonic() - self.started_at)
+        return bytes_left / speed
+
+    def is_busy(self):
+        with self._lock:
+            return any(job.status in ("Queued", "Running") for job in self.jobs)
+
+    def cancel_all(self):
+        with self._lock:
+            for job in self.jobs:
+                if job.status == "Queued":
+                    job.status = "Cancelled"
+                job.cancel_event.set()
+        for job in list(self.jobs):
+            self._notify(job)
+
+    def shutdown(self):
+        """
+        Cancel everything left and stop the shared process pool once the running jobs stopped.
+
+        Returns at once: 7z archives and big tar members can't be interrupted mid-member, so
+        the jobs are waited for, and the pool stopped, from a background thread.
+
+        Returns:
+        - thread: the threading.Thread doing the waiting.
+        """
+        self.cancel_all()
+        # whoever asked for the shutdown doesn't want the last updates anymore
+        self.on_update = None
+        thread = threading.Thread(target=self._stop_when_idle, daemon=True)
+        thread.start()
+        return thread
+
+    def _stop_when_idle(self):
+        with self._job_finished:
+            self._job_finished.wait_for(lambda: not any(job.status == "Running" for job in self.jobs))
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
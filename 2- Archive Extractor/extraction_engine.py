@@ -0,0 +1,491 @@
+import os
+import json
+import mmap
+import shutil
+import fnmatch
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from pathlib import Path
+
+
+# Member written by the File Compressor's deduplication, must match compression_engine.DEDUP_MANIFEST_NAME
+DEDUP_MANIFEST_NAME = ".dedup_manifest.jsonl"
+# A batch handed to a worker process holds at most this many members...
+BATCH_MEMBERS = 64
+# ...or this many uncompressed bytes (32 MiB), whichever comes first
+BATCH_BYTES = 32 * 1024 * 1024
+
+# Archives bigger than this (64 MiB) are memory-mapped when browsed instead of read through a file object
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Size of the buffer each member is streamed through (1 MiB), reused for every member
+BUFFER_SIZE = 1024 * 1024
+# Runs of zeros of at least this size (64 KiB) are skipped with a seek instead of written, leaving a hole
+SPARSE_BLOCK_SIZE = 64 * 1024
+# Holes are only created where they are cheap and reliable (NTFS needs files flagged sparse first)
+SPARSE_WRITES = os.name != 'nt'
+_ZERO_BLOCK = bytes(SPARSE_BLOCK_SIZE)
+
+# ZipFile handles opened by a worker process, reused across the batches of an archive:
+# path -> ((modification time, size), ZipFile), the least recently used first
+_worker_archives = {}
+# Handles a worker process keeps open, the least recently used is closed past this
+WORKER_ARCHIVES_MAX = 4
+
+
+class ExtractionCancelled(Exception):
+    """
+    Raised when extraction is cancelled before every member has been extracted.
+    """
+
+
+class UnsafeArchive(ValueError):
+    """
+    Raised when an archive breaks the extraction limits or tries to write outside the destination.
+    """
+
+
+class ExtractionLimits:
+    """
+    Limits protecting the extraction of untrusted archives (zip bombs, endless member lists).
+
+    The declared sizes are checked before anything is written, and the data actually
+    decompressed is counted while streaming, so lying headers are caught as well.
+    """
+
+    def __init__(self, max_total_size=64 * 1024 ** 3, max_files=1_000_000, max_ratio=1100,
+                 ratio_min_size=1024 ** 3):
+        """
+        Parameters:
+        - max_total_size: maximum number of bytes extracted from one archive (64 GiB).
+        - max_files: maximum number of members extracted from one archive.
+        - max_ratio: maximum expansion ratio of the whole archive (bytes extracted / archive size).
+          Deflate can't go past about 1032x, even on zeros; zips of overlapping members go far beyond.
+        - ratio_min_size: the ratio is only enforced past this many bytes (1 GiB), disk images and
+          sparse files legitimately compress a lot with bzip2, LZMA or xz.
+        """
+        self.max_total_size = max_total_size
+        self.max_files = max_files
+        self.max_ratio = max_ratio
+        self.ratio_min_size = ratio_min_size
+
+    def check_files(self, files_count):
+        if files_count > self.max_files:
+            raise UnsafeArchive(f"Archive has more than {self.max_files:,} files.")
+
+    def check_size(self, total_size):
+        if total_size > self.max_total_size:
+            raise UnsafeArchive(f"Archive expands to more than {self.max_total_size:,} bytes.")
+
+    def check_ratio(self, uncompressed_size, compressed_size):
+        if uncompressed_size > self.ratio_min_size and uncompressed_size > self.max_ratio * max(compressed_size, 1):
+            raise UnsafeArchive(f"Archive expands more than {self.max_ratio}x, it looks like a zip bomb.")
+
+    def check_members(self, members, archive_size, copies=()):
+        """
+        Check the declared sizes of zip members, and of the copies restored from them, against
+        the archive size before extracting anything.
+        """
+        total_size = sum(member.file_size for member in members) + sum(size for _, _, size in copies)
+        self.check_files(len(members) + len(copies))
+        self.check_size(total_size)
+        self.check_ratio(total_size, archive_size)
+
+
+DEFAULT_LIMITS = ExtractionLimits()
+
+
+def check_cancelled(cancel_event):
+    """
+    Raise ExtractionCancelled if the given cancel event has been set.
+
+    Parameters:
+    - cancel_event: threading.Event (or any object with is_set()) or None.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise ExtractionCancelled("Extraction was cancelled.")
+
+
+def safe_destination(extracted_files_path, member_name):
+    """
+    Resolve where a member would be written, refusing names that escape the destination folder.
+
+    Parameters:
+    - extracted_files_path: Path of the destination folder.
+    - member_name: name of the member inside the archive.
+
+    Returns:
+    - target: resolved Path inside the destination folder.
+    """
+    root = Path(extracted_files_path).resolve()
+    target = (root / member_name).resolve()
+    if target != root and root not in target.parents:
+        raise UnsafeArchive(f'Unsafe member path in archive: "{member_name}"')
+    return target
+
+
+def read_duplicates(zipf, extracted_files_path, member_names=None):
+    """
+    Read the files stored only once by the File Compressor's deduplication, without copying them.
+
+    Parameters:
+    - zipf: the open zipfile.ZipFile.
+    - extracted_files_path: Path of the folder the archive is extracted into.
+    - member_names: optional set of the paths to restore (all of them if None).
+
+    Returns:
+    - copies: list of (source member name, copy path, size) tuples, for the limits and restore_duplicates().
+    """
+    if DEDUP_MANIFEST_NAME not in zipf.NameToInfo:
+        return []
+    copies = []
+    with zipf.open(DEDUP_MANIFEST_NAME) as manifest:
+        for line in manifest:
+            entry = json.loads(line)
+            if member_names is not None and entry["path"] not in member_names:
+                continue
+            source = zipf.NameToInfo.get(entry["source"])
+            if source is None:
+                raise UnsafeArchive(f'Duplicate of a missing member in archive: "{entry["source"]}"')
+            safe_destination(extracted_files_path, entry["path"])
+            copies.append((entry["source"], entry["path"], source.file_size))
+    return copies
+
+
+def restore_duplicates(copies, extracted_files_path):
+    """
+    Recreate the files stored only once by the File Compressor's deduplication.
+
+    Parameters:
+    - copies: the list returned by read_duplicates(), checked against the limits beforehand.
+    - extracted_files_path: Path of the folder the archive was extracted into.
+
+    Returns:
+    - restored_count: number of duplicate files copied.
+    - restored_bytes: size of the copies.
+    """
+    restored_bytes = 0
+    for source_name, path, size in copies:
+        source = safe_destination(extracted_files_path, source_name)
+        target = safe_destination(extracted_files_path, path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+        restored_bytes += size
+    return len(copies), restored_bytes
+
+
+class MappedFile(mmap.mmap):
+    """
+    Read-only memory map that zipfile accepts as an archive file object.
+    """
+
+    def seekable(self):
+        return True
+
+
+class ArchiveListing:
+    """
+    Contents of an archive grouped by folder, used to browse it without extracting it.
+
+    Subclasses read the member names and sizes of one archive format and pass them to add().
+    """
+
+    def __init__(self, filepath):
+        """
+        Parameters:
+        - filepath: path of the archive.
+        """
+        self.filepath = str(filepath)
+        # size of every file member by name
+        self.sizes = {}
+        # folder name ('' for the root) -> names of the files and subfolders directly inside it
+        self.folder_contents = {"": set()}
+
+    def add(self, name, size):
+        """
+        Register one member (a name ending with '/' is a folder) and all its parent folders.
+        """
+        parts = name.rstrip('/').split('/')
+        if not name.endswith('/'):
+            self.sizes[name] = size
+        # register the member and every parent folder, even those without an entry of their own
+        for depth in range(len(parts)):
+            folder = '/'.join(parts[:depth])
+            child = '/'.join(parts[:depth + 1])
+            is_folder = depth < len(parts) - 1 or name.endswith('/')
+            self.folder_contents.setdefault(folder, set()).add(child + '/' if is_folder else child)
+            if is_folder:
+                self.folder_contents.setdefault(child, set())
+
+    def list_folder(self, folder=""):
+        """
+        List what is directly inside a folder of the archive, folders first.
+
+        Parameters:
+        - folder: folder name without trailing '/' ('' for the root of the archive).
+
+        Returns:
+        - entries: list of (name, is_folder, size), name being the full path inside the archive.
+        """
+        entries = []
+        for child in self.folder_contents.get(folder, ()):
+            if child.endswith('/'):
+                entries.append((child.rstrip('/'), True, 0))
+            else:
+                entries.append((child, False, self.sizes[child]))
+        return sorted(entries, key=lambda entry: (not entry[1], entry[0].lower()))
+
+    def members_under(self, folder):
+        """
+        Return the names of all files inside a folder of the archive, at any depth.
+        """
+        prefix = folder.rstrip('/') + '/'
+        return [name for name in self.sizes if name.startswith(prefix)]
+
+    def match(self, patterns):
+        """
+        Return the names of the files matching any of the given glob patterns (e.g. '*.txt', 'docs/*').
+        """
+        return [name for name in self.sizes if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+
+    def close(self):
+        pass
+
+
+class ZipArchiveListing(ArchiveListing):
+    """
+    Contents of a zip archive, read from its central directory only.
+
+    Opening an archive this way never touches the member data, so browsing a huge archive
+    only costs the size of its central directory. Big archives are memory-mapped so the
+    central directory is read straight from the page cache.
+    """
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self._file = open(self.filepath, 'rb')
+        self._mapped_file = None
+        if Path(self.filepath).stat().st_size > MMAP_THRESHOLD:
+            self._mapped_file = MappedFile(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.zipf = zipfile.ZipFile(self._mapped_file or self._file, 'r')
+
+        for member in self.zipf.infolist():
+            if member.filename != DEDUP_MANIFEST_NAME:
+                self.add(member.filename, member.file_size)
+        # copies stored only once by the File Compressor show up like any other file
+        for path, source in self.duplicates().items():
+            self.add(path, self.sizes.get(source, 0))
+
+    def duplicates(self):
+        """
+        Return {path of a deduplicated copy: name of the member holding its content}.
+        """
+        if DEDUP_MANIFEST_NAME not in self.zipf.NameToInfo:
+            return {}
+        with self.zipf.open(DEDUP_MANIFEST_NAME) as manifest:
+            return {entry["path"]: entry["source"] for entry in map(json.loads, manifest)}
+
+    def close(self):
+        self.zipf.close()
+        if self._mapped_file is not None:
+            self._mapped_file.close()
+        self._file.close()
+
+
+def _write_sparse(target_file, data):
+    # Write data, seeking over whole blocks of zeros instead of writing them
+    for start in range(0, len(data), SPARSE_BLOCK_SIZE):
+        block = data[start:start + SPARSE_BLOCK_SIZE]
+        if len(block) == SPARSE_BLOCK_SIZE and block == _ZERO_BLOCK:
+            target_file.seek(SPARSE_BLOCK_SIZE, os.SEEK_CUR)
+        else:
+            target_file.write(block)
+
+
+def extract_member(zipf, member, extracted_files_path, buffer=None):
+    """
+    Stream one member to disk through a reusable buffer, verifying it on the way.
+
+    zipfile checks the CRC-32 as the last bytes are read, so a corrupt member fails here
+    without a second read, and its partial file is removed. The member can never produce
+    more bytes than its declared size, which the limits already accepted.
+
+    Parameters:
+    - zipf: the open zipfile.ZipFile.
+    - member: zipfile.ZipInfo of the member.
+    - extracted_files_path: Path of the folder to extract into.
+    - buffer: optional bytearray reused between members (BUFFER_SIZE bytes by default).
+
+    Returns:
+    - size: number of bytes written.
+    """
+    target = safe_destination(extracted_files_path, member.filename)
+    if member.is_dir():
+        target.mkdir(parents=True, exist_ok=True)
+        return 0
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if buffer is None:
+        buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    size = 0
+    try:
+        with zipf.open(member) as source, open(target, 'wb') as target_file:
+            while True:
+                length = source.readinto(view)
+                if not length:
+                    break
+                size += length
+                if size > member.file_size:
+                    raise UnsafeArchive(f'Member "{member.filename}" is bigger than its declared size.')
+                if SPARSE_WRITES:
+                    _write_sparse(target_file, view[:length])
+                else:
+                    target_file.write(view[:length])
+            # give the file its real size when it ends with a hole
+            target_file.truncate(size)
+    except BaseException:
+        target.unlink(missing_ok=True)
+        raise
+    return size
+
+
+def _worker_archive(filepath):
+    # This worker's ZipFile of an archive, reopened if the file was replaced since it was opened
+    stat = os.stat(filepath)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _worker_archives.pop(filepath, None)
+    if cached is not None and cached[0] != stamp:
+        cached[1].close()
+        cached = None
+    if cached is None:
+        cached = (stamp, zipfile.ZipFile(filepath, 'r'))
+    # reinserted last, as the most recently used
+    _worker_archives[filepath] = cached
+    while len(_worker_archives) > WORKER_ARCHIVES_MAX:
+        oldest_path = next(iter(_worker_archives))
+        _worker_archives.pop(oldest_path)[1].close()
+    return cached[1]
+
+
+def extract_batch(filepath, member_names, extracted_files_path):
+    """
+    Extract a batch of members with this worker process' own ZipFile handle (runs in a worker process).
+
+    Parameters:
+    - filepath: path of the zip archive.
+    - member_names: list of member names to extract.
+    - extracted_files_path: Path of the folder to extract into.
+
+    Returns:
+    - (members_done, bytes_done): number of members and uncompressed bytes extracted.
+    """
+    zipf = _worker_archive(filepath)
+    buffer = bytearray(BUFFER_SIZE)
+    bytes_done = 0
+    for member_name in member_names:
+        bytes_done += extract_member(zipf, zipf.getinfo(member_name), extracted_files_path, buffer)
+    return len(member_names), bytes_done
+
+
+def _make_batches(members):
+    # Group members into batches bounded by count and size so workers stay evenly loaded
+    batch = []
+    batch_bytes = 0
+    for member in members:
+        if batch and (len(batch) >= BATCH_MEMBERS or batch_bytes + member.file_size > BATCH_BYTES):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(member.filename)
+        batch_bytes += member.file_size
+    if batch:
+        yield batch
+
+
+def extract_archive(filepath, extracted_files_path, progress_callback=None, cancel_event=None, workers=1,
+                    member_names=None, executor=None, limits=None):
+    """
+    Extract the members of a zip archive, then restore the deduplicated copies.
+
+    Every member is streamed and CRC-checked by extract_member(), after the whole central
+    directory passed the extraction limits.
+
+    With more than one worker, the central directory is split into batches that are extracted
+    by a process pool, each worker process reading the archive through its own ZipFile handle.
+
+    Parameters:
+    - filepath: path of the zip archive.
+    - extracted_files_path: Path of the folder to extract into.
+    - progress_callback: optional callable(members_done, members_total, bytes_done, bytes_total)
+      called as members (or batches of members) are extracted.
+    - cancel_event: optional threading.Event, checked between members/batches to stop early.
+    - workers: number of worker processes (1 extracts everything in this process).
+    - member_names: optional collection of the member names to extract (everything if None),
+      as returned by ZipArchiveListing.members_under() or ZipArchiveListing.match().
+    - executor: optional ProcessPoolExecutor shared with other extractions, used instead of
+      creating a pool of `workers` processes for this archive.
+    - limits: optional ExtractionLimits (DEFAULT_LIMITS if None).
+
+    Returns:
+    - members_done: number of files written, the deduplicated copies included.
+    - bytes_done: size of the files written.
+    """
+    limits = limits or DEFAULT_LIMITS
+    filepath = str(filepath)
+    with zipfile.ZipFile(filepath, 'r') as zipf:
+        members = [member for member in zipf.infolist() if member.filename != DEDUP_MANIFEST_NAME]
+        if member_names is not None:
+            member_names = set(member_names)
+            wanted_names = set(member_names)
+            # a selected deduplicated copy needs the member holding its content
+            if DEDUP_MANIFEST_NAME in zipf.NameToInfo:
+                with zipf.open(DEDUP_MANIFEST_NAME) as manifest:
+                    for entry in map(json.loads, manifest):
+                        if entry["path"] in member_names:
+                            wanted_names.add(entry["source"])
+            members = [member for member in members if member.filename in wanted_names]
+        # refuse bombs and escaping paths before writing a single byte, the copies count as well
+        copies = read_duplicates(zipf, extracted_files_path, member_names)
+        limits.check_members(members, Path(filepath).stat().st_size, copies)
+        for member in members:
+            safe_destination(extracted_files_path, member.filename)
+        members_total = len(members)
+        bytes_total = sum(member.file_size for member in members)
+        members_done = 0
+        bytes_done = 0
+
+        def report(members_count, bytes_count):
+            nonlocal members_done, bytes_done
+            members_done += members_count
+            bytes_done += bytes_count
+            if progress_callback is not None:
+                progress_callback(members_done, members_total, bytes_done, bytes_total)
+
+        if (workers > 1 or executor is not None) and members_total > BATCH_MEMBERS:
+            own_executor = executor is None
+            if own_executor:
+                # 'spawn' avoids forking a process that is running Qt threads
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            futures = [executor.submit(extract_batch, filepath, batch, extracted_files_path)
+                       for batch in _make_batches(members)]
+            try:
+                for future in as_completed(futures):
+                    check_cancelled(cancel_event)
+                    report(*future.result())
+            finally:
+                # drop the batches not started yet and let the running ones finish before returning
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                if own_executor:
+                    executor.shutdown(wait=True)
+        else:
+            buffer = bytearray(BUFFER_SIZE)
+            for member in members:
+                check_cancelled(cancel_event)
+                report(1, extract_member(zipf, member, extracted_files_path, buffer))
+
+        restored_count, restored_bytes = restore_duplicates(copies, extracted_files_path)
+    return members_done + restored_count, bytes_done + restored_bytes
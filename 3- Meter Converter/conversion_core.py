@@ -0,0 +1,234 @@
+"""
+Length conversion core of the Meter Converter, shared by the window and the command line.
+
+Usage:
+    python conversion_core.py survey.csv survey_meters.csv [--feet-column feet] [--inches-column inches]
+    python conversion_core.py survey.parquet survey_meters.parquet
+
+The input is streamed in chunks, every chunk is converted as whole NumPy arrays and written
+out with a new meters column, so memory stays flat however many rows the file has.
+"""
+import csv
+import sys
+import time
+import argparse
+from fractions import Fraction
+from functools import lru_cache
+from pathlib import Path
+from unit_registry import REGISTRY
+import _paths  # noqa: F401
+import instrumentation
+
+
+# Imported by _load_numpy() once something is converted as arrays, the window opens and parses without it
+np = None
+# Optional, only needed by the batch mode (CSV and Parquet files), imported by _load_pyarrow()
+pyarrow = None
+
+
+# Length of one foot and one inch in meters, from the precomputed table of the unit registry
+FOOT_IN_METERS = REGISTRY.factor("ft", "m")
+INCH_IN_METERS = REGISTRY.factor("in", "m")
+# Bytes of CSV parsed at once (16 MiB, roughly 500k rows of a typical survey file)
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+# Distinct field texts remembered by parse_length(), enough for a long data-entry session
+PARSE_CACHE_SIZE = 1024
+# Rows of a Parquet file converted at once
+PARQUET_BATCH_ROWS = 1_000_000
+# Formats of the batch mode, chosen from the file extension
+BATCH_FORMATS = {".csv": "csv", ".txt": "csv", ".parquet": "parquet", ".pq": "parquet"}
+
+
+def feet_inches_to_meters(feet, inches=0.0, out=None):
+    """
+    Convert feet and inches to meters, for single values or whole arrays.
+
+    Parameters:
+    - feet: number or array-like of feet.
+    - inches: number or array-like of inches (broadcast against feet).
+    - out: optional float64 array receiving the result, avoids allocating one per chunk.
+
+    Returns:
+    - meters: float for scalar inputs, numpy.ndarray of float64 otherwise.
+    """
+    if np is None:
+        _load_numpy()
+    feet = np.asarray(feet, dtype=np.float64)
+    inches = np.asarray(inches, dtype=np.float64)
+    meters = np.multiply(feet, FOOT_IN_METERS, out=out)
+    # in place: one temporary for the inches, none for the sum
+    meters += inches * INCH_IN_METERS
+    return meters if meters.ndim else float(meters)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_length(text, default_unit="m"):
+    """
+    Parse a typed length ("5", "5.5", "5 ft 3 in"...) into an exact number of meters.
+
+    Results are memoized, retyping a value already seen costs a dictionary lookup.
+
+    Parameters:
+    - text: the length as typed, an empty text is zero.
+    - default_unit: unit of a number typed without unit.
+
+    Returns:
+    - meters: Fraction of meters.
+    """
+    if not text.strip():
+        return Fraction(0)
+    meters = REGISTRY.parse(text, "m", default_unit=default_unit, exact=True)
+    if meters < 0:
+        raise ValueError("Lengths cannot be negative.")
+    return meters
+
+
+def _parse_cache_metrics():
+    # Statistics of the parse cache, read when the metrics are exported
+    info = parse_length.cache_info()
+    instrumentation.set_gauge("parse_cache_hits", info.hits)
+    instrumentation.set_gauge("parse_cache_misses", info.misses)
+
+
+instrumentation.add_collector(_parse_cache_metrics)
+
+
+def batch_format(filepath):
+    """
+    Return 'csv' or 'parquet' for a batch file, from its extension.
+    """
+    file_format = BATCH_FORMATS.get(Path(filepath).suffix.lower())
+    if file_format is None:
+        raise ValueError(f'Unsupported file type: "{Path(filepath).name}" (use .csv or .parquet).')
+    return file_format
+
+
+def _load_numpy():
+    # Import numpy the first time something is converted as arrays (the import lock makes this thread-safe)
+    global np
+    import numpy as np
+
+
+def _load_pyarrow():
+    # Import pyarrow and its CSV and Parquet modules, the first time a file is converted
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.csv
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("The batch mode needs the 'pyarrow' package (pip install pyarrow).") from None
+
+
+def _column_to_numpy(table, column_name):
+    # empty cells come through as NaN
+    column = table.column(column_name).cast(pyarrow.float64())
+    return column.to_numpy(zero_copy_only=False)
+
+
+def _iter_batches(input_path, feet_column, inches_column):
+    # Yield pyarrow record batches of the input file
+    if batch_format(input_path) == "parquet":
+        yield from pyarrow.parquet.ParquetFile(input_path).iter_batches(batch_size=PARQUET_BATCH_ROWS)
+        return
+    # the header gives the columns: feet and inches are numbers, the rest is passed through untouched
+    with open(input_path, newline='', encoding='utf-8') as csv_file:
+        column_names = next(csv.reader(csv_file), [])
+    column_types = {name: pyarrow.string() for name in column_names}
+    column_types[feet_column] = pyarrow.float64()
+    if inches_column is not None:
+        column_types[inches_column] = pyarrow.float64()
+    with pyarrow.csv.open_csv(input_path, read_options=pyarrow.csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+                              convert_options=pyarrow.csv.ConvertOptions(column_types=column_types)) as reader:
+        yield from reader
+
+
+def convert_file(input_path, output_path, feet_column="feet", inches_column="inches", output_column="meters",
+                 progress_callback=None):
+    """
+    Add a meters column to a CSV or Parquet file of feet and inches, streaming it in chunks.
+
+    Parameters:
+    - input_path: path of the .csv or .parquet file to read.
+    - output_path: path of the .csv or .parquet file to write (formats can differ).
+    - feet_column: name of the feet column.
+    - inches_column: name of the inches column, None if the file only has feet.
+    - output_column: name of the meters column added to the output.
+    - progress_callback: optional callable(rows_done) called after every chunk.
+
+    Returns:
+    - rows: number of rows converted.
+    """
+    _load_numpy()
+    _load_pyarrow()
+    output_format = batch_format(output_path)
+    writer = None
+    rows = 0
+    meters = None
+    with instrumentation.span("convert_file", input=Path(input_path).name) as span:
+        try:
+            for batch in _iter_batches(input_path, feet_column, inches_column):
+                if batch.num_rows == 0:
+                    continue
+                feet = _column_to_numpy(batch, feet_column)
+                # a blank cell counts as 0 like an empty field of the window, the row only stays
+                # empty when feet and inches are both missing
+                missing = np.isnan(feet)
+                feet = np.nan_to_num(feet)
+                inches = 0.0
+                if inches_column is not None:
+                    inches = _column_to_numpy(batch, inches_column)
+                    missing &= np.isnan(inches)
+                    inches = np.nan_to_num(inches)
+                # reuse the output buffer between chunks of the same size, each chunk is written before the next
+                if meters is None or len(meters) != batch.num_rows:
+                    meters = np.empty(batch.num_rows, dtype=np.float64)
+                feet_inches_to_meters(feet, inches, out=meters)
+                column = pyarrow.array(meters, mask=missing if missing.any() else None)
+                table = pyarrow.Table.from_batches([batch]).append_column(output_column, column)
+
+                if writer is None:
+                    if output_format == "parquet":
+                        writer = pyarrow.parquet.ParquetWriter(output_path, table.schema)
+                    else:
+                        writer = pyarrow.csv.CSVWriter(output_path, table.schema)
+                writer.write_table(table)
+                rows += batch.num_rows
+                if progress_callback is not None:
+                    progress_callback(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+        span.set(rows=rows)
+    # nothing is written for an input without rows
+    output_size = Path(output_path).stat().st_size if writer is not None else 0
+    instrumentation.record_operation("convert_file", span.seconds, rows, Path(input_path).stat().st_size, output_size)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or Parquet file with feet and inches columns")
+    parser.add_argument("output", help="CSV or Parquet file to write, with a meters column added")
+    parser.add_argument("--feet-column", default="feet", help="name of the feet column (default: feet)")
+    parser.add_argument("--inches-column", default="inches",
+                        help="name of the inches column, empty if there is none (default: inches)")
+    parser.add_argument("--output-column", default="meters", help="name of the added column (default: meters)")
+    args = parser.parse_args(argv)
+    instrumentation.export_from_environment()
+
+    start = time.perf_counter()
+    try:
+        rows = convert_file(args.input, args.output, args.feet_column, args.inches_column or None,
+                            args.output_column)
+    except (OSError, ValueError, KeyError, RuntimeError) as e:
+        # pyarrow errors derive from these too (ArrowInvalid is a ValueError, ArrowIOError an OSError)
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    seconds = time.perf_counter() - start
+    print(f"Converted {rows:,} rows in {seconds:.2f} s ({rows / max(seconds, 1e-9):,.0f} rows/s) -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Local HTTP/JSON service running the Meter Converter core without the window.
+
+Usage:
+    python conversion_service.py [--host 127.0.0.1] [--port 8765]
+
+Endpoints:
+    POST /convert   {"feet": 5, "inches": 3}                 -> {"meters": 1.6002}
+                    {"feet": [5, 6], "inches": [3, 0]}       -> {"meters": [1.6002, 1.8288]}
+                    {"quantity": "5 ft 3 in"}                -> {"meters": 1.6002}
+                    {"quantity": ["5 ft 3 in", "2 mi"]}      -> {"meters": [1.6002, 3218.688]}
+    GET  /metrics   request latency histograms of every endpoint
+    GET  /health    {"status": "ok"}
+
+Batches of feet and inches are converted as whole NumPy arrays. The server is a plain asyncio
+stream server speaking HTTP/1.1 with keep-alive, so it needs nothing beyond the standard library
+and NumPy.
+"""
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import numpy as np
+import conversion_core
+import _paths  # noqa: F401
+import instrumentation
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Largest request body accepted (64 MiB, a batch of a few million values)
+MAX_BODY_SIZE = 64 * 1024 * 1024
+# Largest request line and headers accepted
+MAX_HEADER_SIZE = 16 * 1024
+# Bodies up to this size (64 KiB) are converted on the event loop, bigger batches in a thread so
+# they don't hold up the other connections
+INLINE_BODY_SIZE = 64 * 1024
+# Latency histogram buckets grow by this factor from HISTOGRAM_MIN_SECONDS (10 us) up to 10 s
+HISTOGRAM_MIN_SECONDS = 10e-6
+HISTOGRAM_GROWTH = 1.25
+HISTOGRAM_BUCKETS = math.ceil(math.log(10 / HISTOGRAM_MIN_SECONDS, HISTOGRAM_GROWTH)) + 1
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """
+    Raised by request handlers to answer with an HTTP error status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyHistogram:
+    """
+    Histogram of request latencies with logarithmic buckets.
+
+    Recording is a logarithm and an increment, so it is cheap enough for every request;
+    percentiles are read back as the upper bound of the bucket they fall in (within 25%).
+    """
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        if seconds <= HISTOGRAM_MIN_SECONDS:
+            index = 0
+        else:
+            index = min(math.ceil(math.log(seconds / HISTOGRAM_MIN_SECONDS, HISTOGRAM_GROWTH)),
+                        HISTOGRAM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    @staticmethod
+    def upper_bound(index):
+        return HISTOGRAM_MIN_SECONDS * HISTOGRAM_GROWTH ** index
+
+    def percentile(self, fraction):
+        """
+        Return the latency (seconds) under which `fraction` of the requests completed.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(index), self.maximum)
+        return self.maximum
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p90_ms": self.percentile(0.90) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.maximum * 1000,
+            # only the buckets holding requests, as [upper bound in ms, count]
+            "buckets": [[self.upper_bound(index) * 1000, count]
+                        for index, count in enumerate(self.counts) if count],
+        }
+
+
+def convert_request(payload):
+    """
+    Answer a /convert request body (see the module docstring for the accepted shapes).
+    """
+    if not isinstance(payload, dict):
+        raise HttpError(400, "The request body must be a JSON object.")
+    try:
+        if "quantity" in payload:
+            quantity = payload["quantity"]
+            if isinstance(quantity, list):
+                return {"meters": [float(conversion_core.parse_length(text, "ft")) for text in quantity]}
+            return {"meters": float(conversion_core.parse_length(quantity, "ft"))}
+        if "feet" not in payload and "inches" not in payload:
+            raise HttpError(400, 'Expected "feet" and/or "inches", or "quantity".')
+        feet = payload.get("feet", 0)
+        inches = payload.get("inches", 0)
+        meters = conversion_core.feet_inches_to_meters(feet, inches)
+        # null (NaN once converted), NaN and Infinity would come back as invalid JSON
+        if not np.isfinite(meters).all():
+            raise HttpError(400, "Feet and inches must be finite numbers.")
+        # the same rule as parse_length() applies to the quantities
+        if np.any(np.less(meters, 0)):
+            raise HttpError(400, "Lengths cannot be negative.")
+        return {"meters": meters.tolist() if isinstance(meters, np.ndarray) else meters}
+    except (TypeError, ValueError, AttributeError, ArithmeticError) as e:
+        raise HttpError(400, str(e)) from None
+
+
+class ConversionService:
+    """
+    HTTP/1.1 keep-alive server answering conversion requests, with one latency histogram per endpoint.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.routes = {
+            ("POST", "/convert"): self.handle_convert,
+            ("GET", "/metrics"): self.handle_metrics,
+            ("GET", "/health"): self.handle_health,
+        }
+
+    def handle_convert(self, body):
+        with instrumentation.span("convert_request", bytes_in=len(body)):
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise HttpError(400, "The request body is not valid JSON.") from None
+            return convert_request(payload)
+
+    def handle_metrics(self, body):
+        return {path: histogram.summary() for path, histogram in self.histograms.items()}
+
+    def handle_health(self, body):
+        return {"status": "ok"}
+
+    def respond(self, method, path, body):
+        # Return (status, JSON document) for one request
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                return 405, {"error": f"{method} is not allowed on {path}."}
+            return 404, {"error": f"No endpoint at {path}."}
+        try:
+            return 200, handler(body)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            # a bug must not take the connection (or the server) down
+            return 500, {"error": str(e)}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    # client closed the keep-alive connection
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send(writer, 413, {"error": "Request headers too large."}, False)
+                    break
+                # the clock starts once the request has arrived, idle keep-alive time is not latency
+                start = time.perf_counter()
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ")
+                except ValueError:
+                    await self.send(writer, 400, {"error": "Malformed request line."}, False)
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                # HTTP/1.1 keeps the connection open unless asked not to, HTTP/1.0 only when asked to
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    await self.send(writer, 400, {"error": "Invalid Content-Length."}, False)
+                    break
+                if length < 0:
+                    await self.send(writer, 400, {"error": "Invalid Content-Length."}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.send(writer, 413, {"error": "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                path = target.split("?", 1)[0]
+                if len(body) > INLINE_BODY_SIZE:
+                    status, document = await asyncio.get_running_loop().run_in_executor(
+                        None, self.respond, method, path, body)
+                else:
+                    status, document = self.respond(method, path, body)
+                await self.send(writer, status, document, keep_alive)
+                if path in ("/convert", "/health"):
+                    self.histograms.setdefault(path, LatencyHistogram()).record(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, document, keep_alive):
+        body = json.dumps(document).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """
+        Serve until cancelled; `ready` is an optional callable(port) called once listening.
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_SIZE)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    args = parser.parse_args(argv)
+
+    def ready(port):
+        print(f"Conversion service listening on http://{args.host}:{port}", flush=True)
+
+    instrumentation.export_from_environment()
+
+    try:
+        asyncio.run(ConversionService().serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,48 @@
 
 import sys
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLabel, QLineEdit, QPushButton,
-                             QSizePolicy, QMessageBox)
+                             QSizePolicy, QMessageBox, QFileDialog)
+from pathlib import Path
+import conversion_core
+import _paths  # noqa: F401
+import instrumentation
+from unit_registry import to_decimal
+
+
+# Milliseconds without typing before the result is updated
+LIVE_DELAY_MS = 150
+# Style of a field holding a value that cannot be converted
+INVALID_FIELD_STYLE = "border: 2px solid #FF5733;"
+
+# File dialog filter of the files the batch mode reads and writes
+BATCH_FILE_FILTER = "CSV Files (*.csv);;Parquet Files (*.parquet);;All Files (*)"
+
+
+class BatchConvertWorker(QThread):
+    """
+    Run conversion_core.convert_file() off the GUI thread and report progress through signals.
+    """
+    # rows converted so far (object because huge files can exceed a 32-bit int)
+    progress = pyqtSignal(object)
+    # total number of rows converted
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, input_path, output_path):
+        super().__init__()
+        self.input_path = input_path
+        self.output_path = output_path
+
+    def run(self):
+        try:
+            rows = conversion_core.convert_file(self.input_path, self.output_path,
+                                                progress_callback=self.progress.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(rows)
 
 
 class MainWindow(QMainWindow):
@@ -11,7 +51,7 @@ class MainWindow(QMainWindow):
 
         self.setWindowTitle("Meter Converter")
         # Set fixed window size
-        self.setFixedSize(400, 200)
+        self.setFixedSize(400, 240)
 
         # Set theme (custom style sheet)
         self.setStyleSheet("""
@@ -25,6 +65,8 @@ class MainWindow(QMainWindow):
         self.feet_value = " 0 "
         self.inches_value = " 0 "
         self.calculation = None
+        # background thread converting a whole file (None when idle)
+        self.batch_worker = None
 
         # First layout
         feet_label = QLabel('Enter "feet" value: ')
@@ -45,6 +87,16 @@ class MainWindow(QMainWindow):
         second_layout.addWidget(inches_label)
         second_layout.addWidget(self.inches_input)
 
+        # Convert as the user types, once the typing pauses for LIVE_DELAY_MS
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(LIVE_DELAY_MS)
+        self.live_timer.timeout.connect(self.update_result)
+        for line_edit in (self.feet_input, self.inches_input):
+            # every keystroke restarts the timer
+            line_edit.textChanged.connect(lambda _: self.live_timer.start())
+            line_edit.returnPressed.connect(self.on_convert_button_clicked)
+
         # Third layout
         convert_button = QPushButton("Convert")
         convert_button.setStyleSheet(
@@ -67,11 +119,26 @@ class MainWindow(QMainWindow):
         third_layout.addWidget(clear_button)
         third_layout.addWidget(self.result_label)
 
+        # Batch layout
+        # convert the feet and inches columns of a whole CSV or Parquet file
+        self.batch_button = QPushButton("Convert file...")
+        self.batch_button.setStyleSheet(
+            "background-color: #FF5733;")
+        self.batch_button.clicked.connect(self.convert_file)
+        self.batch_label = QLabel("")
+        self.batch_label.setSizePolicy(
+            QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
+
+        batch_layout = QHBoxLayout()
+        batch_layout.addWidget(self.batch_button)
+        batch_layout.addWidget(self.batch_label)
+
         # Main layout
         main_layout = QVBoxLayout()
         main_layout.addLayout(first_layout)
         main_layout.addLayout(second_layout)
         main_layout.addLayout(third_layout)
+        main_layout.addLayout(batch_layout)
 
         # Add padding to main layout (left, top, right, bottom)
         main_layout.setContentsMargins(
@@ -83,31 +150,100 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(container_widget)
 
     def on_convert_button_clicked(self):
+        # convert right away instead of waiting for the typing pause
+        self.live_timer.stop()
+        self.update_result()
+
+    def update_result(self):
+        # fields are validated inline: a bad field gets a red border and the reason shows as the result
+        errors = []
+        values = []
+        for line_edit, unit in ((self.feet_input, "ft"), (self.inches_input, "in")):
+            try:
+                values.append(conversion_core.parse_length(line_edit.text(), unit))
+                line_edit.setStyleSheet("")
+            # ArithmeticError too: a slot raising would abort the whole app
+            except (ValueError, ArithmeticError) as e:
+                errors.append(str(e))
+                line_edit.setStyleSheet(INVALID_FIELD_STYLE)
+        if errors:
+            self.calculation = None
+            self.result_label.setText(f"  {errors[0]}")
+            instrumentation.count("window_conversions_total", status="invalid")
+            return
+        if not (self.feet_input.text().strip() or self.inches_input.text().strip()):
+            # nothing typed yet
+            self.calculation = None
+            self.result_label.clear()
+            return
+        # populate the respected properties (exact fractions of meters, so no float rounding)
+        self.feet_value, self.inches_value = values
         try:
-            # populate the respected properties
-            self.feet_value = float(self.feet_input.text().strip())
-            self.inches_value = float(self.inches_input.text().strip())
-            if self.feet_value <= 0 or self.inches_value <= 0:
-                # if any of input fields is a negative number, display a warning pop-up
-                QMessageBox.warning(
-                    self, "Warning", "Please enter positive values for feet and inches.")
-            else:
-                self.calculation = self.feet_value * 0.3048 + self.inches_value * 0.0254
-                self.calculation = round(self.calculation, 2)
-                # display the calculation result on result label
-                self.result_label.setText(f"  {str(self.calculation)} meters")
-        except ValueError:
-            # if input fields are empty or not numbers, display a warning pop-up
-            QMessageBox.warning(
-                self, "Warning", "Please enter valid values for feet and inches.")
+            self.calculation = to_decimal(self.feet_value + self.inches_value)
+        except ArithmeticError as e:
+            self.calculation = None
+            self.result_label.setText(f"  Cannot show this result: {e}")
+            instrumentation.count("window_conversions_total", status="invalid")
+            return
+        instrumentation.count("window_conversions_total", status="ok")
+        # display the calculation result on result label
+        self.result_label.setText(f"  {str(self.calculation)} meters")
 
     def clear_fields(self):
         self.feet_input.clear()
         self.inches_input.clear()
+        self.live_timer.stop()
+        for line_edit in (self.feet_input, self.inches_input):
+            line_edit.setStyleSheet("")
         self.result_label.clear()
 
+    def convert_file(self):
+        input_path, _ = QFileDialog.getOpenFileName(
+            self, "Select File To Convert", "", BATCH_FILE_FILTER)
+        if not input_path:
+            return
+        input_path = Path(input_path)
+        # suggest writing next to the input, keeping its format
+        output_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Converted File", str(input_path.with_stem(f"{input_path.stem}_meters")), BATCH_FILE_FILTER)
+        if not output_path:
+            return
+
+        # Run the conversion in a background thread so the window keeps responding
+        self.batch_worker = BatchConvertWorker(str(input_path), output_path)
+        self.batch_worker.progress.connect(self.on_batch_progress)
+        self.batch_worker.succeeded.connect(self.on_batch_succeeded)
+        self.batch_worker.failed.connect(self.on_batch_failed)
+        self.batch_worker.finished.connect(self.on_batch_finished)
+        self.batch_button.setEnabled(False)
+        self.batch_label.setText(" Converting...")
+        self.batch_worker.start()
+
+    def on_batch_progress(self, rows):
+        self.batch_label.setText(f" {rows:,} rows...")
+
+    def on_batch_succeeded(self, rows):
+        self.batch_label.setText(f" {rows:,} rows converted")
+
+    def on_batch_failed(self, error_message):
+        self.batch_label.clear()
+        QMessageBox.warning(
+            self, "Warning", f"Error converting file: {error_message}")
+
+    def on_batch_finished(self):
+        self.batch_worker = None
+        self.batch_button.setEnabled(True)
+
+    def closeEvent(self, event):
+        # Let a running file conversion finish writing before closing
+        if self.batch_worker is not None:
+            self.batch_worker.wait()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
+    # Prometheus metrics and trace of the conversions, when METRICS_PORT or METRICS_DIR is set
+    instrumentation.export_from_environment()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
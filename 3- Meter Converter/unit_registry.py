@@ -0,0 +1,275 @@
+"""
+Units of the Meter Converter (length, area, volume and mass) kept as a graph.
+
+Every unit is defined from a neighbour unit of the same dimension ('ft' is 12 'in', 'in' is
+0.0254 'm'...). When the registry is compiled, the graph is walked once from the base unit of
+each dimension and the factor between every pair of units is stored in a lookup table, both as
+an exact Fraction and as a float, so a conversion is a dictionary lookup and a multiplication.
+"""
+import re
+from decimal import Decimal, localcontext
+from fractions import Fraction
+
+
+# One "<number> <unit>" part of a quantity such as "5 ft 3 in", "2 mi 10 yd" or 5'3", the
+# registered aliases of several words are put in place of {aliases} by UnitRegistry.compile()
+_QUANTITY_PART = (
+    r"""\s*(?P<number>[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE](?P<exponent>[-+]?\d+))?)\s*"""
+    r"""(?P<unit>(?i:{aliases})(?!\w)|[^\W\d_]+[23]?|['"])?\s*""")
+# Significant digits used to turn an exact result into a Decimal
+DECIMAL_PRECISION = 28
+# Largest power of ten accepted in a number (the float range), exact arithmetic on 1e9999999
+# would take seconds
+MAX_EXPONENT = 308
+
+
+class UnitError(ValueError):
+    """
+    Raised for unknown units, units of different dimensions, or quantities that cannot be parsed.
+    """
+
+
+class UnitRegistry:
+    """
+    Graph of units with a precomputed table of the conversion factors between any two of them.
+    """
+
+    def __init__(self):
+        # canonical unit name -> dimension
+        self.dimensions = {}
+        # accepted spelling (lower case) -> canonical unit name
+        self.aliases = {}
+        # unit -> list of (neighbour unit, neighbour units in one unit)
+        self.edges = {}
+        # dimension -> base unit
+        self.base_units = {}
+        # (from unit, to unit) -> factor, filled by compile()
+        self.exact_factors = {}
+        self.float_factors = {}
+        # regular expression of one part of a quantity, built by compile()
+        self.quantity_part = None
+
+    def add_unit(self, name, dimension, factor=None, of=None, aliases=()):
+        """
+        Add a unit to the graph.
+
+        Parameters:
+        - name: canonical name of the unit ('ft').
+        - dimension: 'length', 'area', 'volume' or 'mass'; the first unit of a dimension is its base.
+        - factor: number of `of` units in one unit (exact: int, Fraction or decimal string).
+        - of: neighbour unit the new unit is defined from (None for a base unit).
+        - aliases: other accepted spellings ('feet', 'foot', "'").
+        """
+        if of is None:
+            self.base_units.setdefault(dimension, name)
+        elif self.dimensions[of] != dimension:
+            raise UnitError(f'"{name}" and "{of}" are not of the same dimension.')
+        self.dimensions[name] = dimension
+        for alias in (name, *aliases):
+            self.aliases[alias.lower()] = name
+        self.edges.setdefault(name, [])
+        if of is not None:
+            factor = Fraction(factor)
+            self.edges[name].append((of, factor))
+            self.edges[of].append((name, 1 / factor))
+
+    def compile(self):
+        """
+        Walk the graph and fill the factor tables for every pair of units of the same dimension.
+        """
+        self.exact_factors.clear()
+        self.float_factors.clear()
+        for dimension, base_unit in self.base_units.items():
+            # number of base units in one unit, found depth first from the base
+            to_base = {base_unit: Fraction(1)}
+            pending = [base_unit]
+            while pending:
+                unit = pending.pop()
+                for neighbour, neighbours_per_unit in self.edges[unit]:
+                    if neighbour not in to_base:
+                        to_base[neighbour] = to_base[unit] / neighbours_per_unit
+                        pending.append(neighbour)
+            unreachable = [unit for unit, unit_dimension in self.dimensions.items()
+                           if unit_dimension == dimension and unit not in to_base]
+            if unreachable:
+                raise UnitError(f"Units not connected to {base_unit}: {', '.join(unreachable)}")
+            for from_unit, from_factor in to_base.items():
+                for to_unit, to_factor in to_base.items():
+                    factor = from_factor / to_factor
+                    self.exact_factors[from_unit, to_unit] = factor
+                    self.float_factors[from_unit, to_unit] = float(factor)
+        # aliases of several words ("fl oz", "nautical mile") are tried first, the longest first
+        aliases = sorted((alias for alias in self.aliases if " " in alias), key=len, reverse=True)
+        self.quantity_part = re.compile(_QUANTITY_PART.format(
+            aliases="|".join(r"\s+".join(map(re.escape, alias.split())) for alias in aliases) or "(?!)"))
+        return self
+
+    def unit(self, name):
+        """
+        Return the canonical name of a unit from any of its spellings.
+        """
+        try:
+            return self.aliases[" ".join(name.split()).lower()]
+        except KeyError:
+            raise UnitError(f'Unknown unit: "{name}"') from None
+
+    def units(self, dimension):
+        """
+        Return the canonical names of the units of a dimension, in the order they were added.
+        """
+        return [unit for unit, unit_dimension in self.dimensions.items() if unit_dimension == dimension]
+
+    def factor(self, from_unit, to_unit, exact=False):
+        """
+        Return the number of `to_unit` in one `from_unit`.
+
+        Parameters:
+        - from_unit, to_unit: unit names or aliases.
+        - exact: return a Fraction instead of a float.
+        """
+        key = (self.unit(from_unit), self.unit(to_unit))
+        factors = self.exact_factors if exact else self.float_factors
+        try:
+            return factors[key]
+        except KeyError:
+            raise UnitError(f'Cannot convert "{from_unit}" ({self.dimensions[key[0]]}) to '
+                            f'"{to_unit}" ({self.dimensions[key[1]]}).') from None
+
+    def convert(self, value, from_unit, to_unit, exact=False):
+        """
+        Convert a value between two units of the same dimension.
+
+        Parameters:
+        - value: number to convert (float, int, Decimal, Fraction or numeric string).
+        - from_unit, to_unit: unit names or aliases.
+        - exact: compute with Fractions, a float value is taken as its decimal spelling (0.1 is 1/10).
+
+        Returns:
+        - converted: float, or Fraction when exact.
+        """
+        if exact:
+            return to_fraction(value) * self.factor(from_unit, to_unit, exact=True)
+        return float(value) * self.factor(from_unit, to_unit)
+
+    def parse(self, text, to_unit, default_unit=None, exact=False):
+        """
+        Parse a quantity made of one or more "<number> <unit>" parts and convert it to a unit.
+
+        The text is read in a single pass; "5 ft 3 in", "2 mi 10 yd" and 5'3" are all accepted.
+
+        Parameters:
+        - text: the quantity to parse.
+        - to_unit: unit of the result.
+        - default_unit: unit of a lone number without unit (None to require units).
+        - exact: compute with Fractions.
+
+        Returns:
+        - value: float, or Fraction when exact.
+        """
+        total = Fraction(0) if exact else 0.0
+        position = 0
+        parts = 0
+        text = text.strip()
+        while position < len(text):
+            match = self.quantity_part.match(text, position)
+            if match is None or match.end() == position:
+                raise UnitError(f'Cannot read the quantity "{text}".')
+            unit = match["unit"]
+            if unit is None:
+                # a bare number is only valid on its own
+                if default_unit is None or position or match.end() != len(text):
+                    raise UnitError(f'Missing unit in "{text}".')
+                unit = default_unit
+            exponent = match["exponent"]
+            if exponent is not None and (len(exponent.lstrip("+-0")) > 3 or abs(int(exponent)) > MAX_EXPONENT):
+                raise UnitError(f'Number out of range in "{text}".')
+            number = Fraction(match["number"]) if exact else float(match["number"])
+            total += number * self.factor(unit, to_unit, exact=exact)
+            position = match.end()
+            parts += 1
+        if not parts:
+            raise UnitError("Empty quantity.")
+        return total
+
+
+def to_fraction(value):
+    """
+    Return a number as an exact Fraction, a float is taken as its shortest decimal spelling.
+    """
+    if isinstance(value, float):
+        return Fraction(repr(value))
+    if isinstance(value, str):
+        return Fraction(value.strip())
+    return Fraction(value)
+
+
+def to_decimal(value):
+    """
+    Return an exact result as a Decimal, rounded to DECIMAL_PRECISION significant digits only
+    when it has no finite decimal expansion (thirds of an inch...).
+    """
+    value = Fraction(value)
+    with localcontext() as context:
+        context.prec = DECIMAL_PRECISION
+        decimal = Decimal(value.numerator) / Decimal(value.denominator)
+    # normalize() drops the trailing zeros, the quantize keeps it out of exponent notation
+    decimal = decimal.normalize()
+    if decimal != decimal.to_integral():
+        return decimal
+    with localcontext() as context:
+        # quantize needs a precision covering every digit of the integer
+        context.prec = max(DECIMAL_PRECISION, decimal.adjusted() + 1)
+        return decimal.quantize(Decimal(1))
+
+
+def default_registry():
+    """
+    Build the registry of the common metric and US customary units.
+    """
+    registry = UnitRegistry()
+    # Length, in meters
+    registry.add_unit("m", "length", aliases=("meter", "meters", "metre", "metres"))
+    registry.add_unit("km", "length", 1000, "m", ("kilometer", "kilometers", "kilometre", "kilometres"))
+    registry.add_unit("cm", "length", "0.01", "m", ("centimeter", "centimeters", "centimetre", "centimetres"))
+    registry.add_unit("mm", "length", "0.001", "m", ("millimeter", "millimeters", "millimetre", "millimetres"))
+    registry.add_unit("in", "length", "0.0254", "m", ("inch", "inches", '"'))
+    registry.add_unit("ft", "length", 12, "in", ("foot", "feet", "'"))
+    registry.add_unit("yd", "length", 3, "ft", ("yard", "yards"))
+    registry.add_unit("mi", "length", 1760, "yd", ("mile", "miles"))
+    registry.add_unit("nmi", "length", 1852, "m", ("nautical mile", "nautical miles"))
+    # Area, in square meters
+    registry.add_unit("m2", "area", aliases=("m²", "sqm"))
+    registry.add_unit("km2", "area", 1000 ** 2, "m2", ("km²",))
+    registry.add_unit("cm2", "area", Fraction(1, 100 ** 2), "m2", ("cm²",))
+    registry.add_unit("ha", "area", 10000, "m2", ("hectare", "hectares"))
+    registry.add_unit("in2", "area", Fraction("0.0254") ** 2, "m2", ("in²", "sqin"))
+    registry.add_unit("ft2", "area", 12 ** 2, "in2", ("ft²", "sqft"))
+    registry.add_unit("yd2", "area", 3 ** 2, "ft2", ("yd²", "sqyd"))
+    registry.add_unit("acre", "area", 43560, "ft2", ("acres", "ac"))
+    registry.add_unit("mi2", "area", 640, "acre", ("mi²", "sqmi"))
+    # Volume, in cubic meters (US customary liquid measures)
+    registry.add_unit("m3", "volume", aliases=("m³",))
+    registry.add_unit("l", "volume", "0.001", "m3", ("liter", "liters", "litre", "litres"))
+    registry.add_unit("ml", "volume", "0.001", "l", ("milliliter", "milliliters", "millilitre", "millilitres"))
+    registry.add_unit("cm3", "volume", 1, "ml", ("cm³", "cc"))
+    registry.add_unit("in3", "volume", Fraction("0.0254") ** 3, "m3", ("in³",))
+    registry.add_unit("ft3", "volume", 12 ** 3, "in3", ("ft³",))
+    registry.add_unit("yd3", "volume", 3 ** 3, "ft3", ("yd³",))
+    registry.add_unit("gal", "volume", 231, "in3", ("gallon", "gallons"))
+    registry.add_unit("qt", "volume", Fraction(1, 4), "gal", ("quart", "quarts"))
+    registry.add_unit("pt", "volume", Fraction(1, 2), "qt", ("pint", "pints"))
+    registry.add_unit("floz", "volume", Fraction(1, 16), "pt", ("fl oz", "fluid ounce", "fluid ounces"))
+    # Mass, in kilograms
+    registry.add_unit("kg", "mass", aliases=("kilogram", "kilograms"))
+    registry.add_unit("g", "mass", "0.001", "kg", ("gram", "grams"))
+    registry.add_unit("mg", "mass", "0.001", "g", ("milligram", "milligrams"))
+    registry.add_unit("t", "mass", 1000, "kg", ("tonne", "tonnes"))
+    registry.add_unit("lb", "mass", "0.45359237", "kg", ("lbs", "pound", "pounds"))
+    registry.add_unit("oz", "mass", Fraction(1, 16), "lb", ("ounce", "ounces"))
+    registry.add_unit("st", "mass", 14, "lb", ("stone", "stones"))
+    registry.add_unit("ton", "mass", 2000, "lb", ("tons", "short ton", "short tons"))
+    return registry.compile()
+
+
+# Registry shared by the whole app, compiled once at import
+REGISTRY = default_registry()
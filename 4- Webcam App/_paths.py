@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Metrics shared by the apps, kept in instrumentation.py at the repository root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
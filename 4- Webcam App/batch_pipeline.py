@@ -0,0 +1,176 @@
+import io
+import os
+import zipfile
+from pathlib import Path, PurePosixPath
+from concurrent.futures import FIRST_COMPLETED, wait
+from PIL import Image
+from image_pipeline import decode_image, to_grayscale
+from filter_chain import FilterChain
+
+
+# Extensions of the images picked up from a server folder or zip
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+# Longest side of the gallery thumbnails
+THUMBNAIL_SIDE = 256
+# Images queued per worker process, keeps memory flat however many images the batch has
+TASKS_PER_WORKER = 2
+# Name of the zip of a batch, written next to its converted images
+ZIP_NAME = "grayscale_images.zip"
+
+
+def iter_folder_images(folder):
+    """
+    Yield the paths of the images in a folder and its subfolders, sorted within each folder.
+    """
+    pending = [Path(folder)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(Path(entry.path))
+            elif Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS:
+                yield entry.path
+
+
+def iter_zip_images(zip_path):
+    """
+    Yield the member names of the images in a zip archive.
+    """
+    with zipfile.ZipFile(zip_path) as zipf:
+        for member in zipf.infolist():
+            if not member.is_dir() and Path(member.filename).suffix.lower() in IMAGE_EXTENSIONS:
+                yield member.filename
+
+
+def read_source(source):
+    # Return the bytes of an image given as bytes, a file path or a (zip path, member name) pair
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, tuple):
+        zip_path, member_name = source
+        with zipfile.ZipFile(zip_path) as zipf:
+            return zipf.read(member_name)
+    return Path(source).read_bytes()
+
+
+def convert_image(name, source, thumbnail_side=THUMBNAIL_SIDE, chain_spec=None):
+    """
+    Convert one image of a batch to grayscale, or through a filter chain (runs in a worker process).
+
+    Paths are read in the worker, so only file names cross the process boundary; the results
+    come back encoded, which keeps the transfer small.
+
+    Parameters:
+    - name: name of the image in the batch.
+    - source: bytes of the image, its path, or a (zip path, member name) pair.
+    - thumbnail_side: longest side of the gallery thumbnail.
+    - chain_spec: optional filter chain spec (see filter_chain.FilterChain) replacing the grayscale.
+
+    Returns:
+    - name: the same name, with a .png extension.
+    - png_bytes: the full resolution converted image as PNG.
+    - thumbnail_bytes: a small JPEG of it for the gallery.
+    """
+    pixels = decode_image(read_source(source), max_side=None)
+    converted = FilterChain(chain_spec).apply(pixels) if chain_spec is not None else to_grayscale(pixels)
+    image = Image.fromarray(converted)
+    png = io.BytesIO()
+    image.save(png, "PNG")
+    image.thumbnail((thumbnail_side, thumbnail_side), Image.Resampling.BILINEAR)
+    thumbnail = io.BytesIO()
+    image.save(thumbnail, "JPEG", quality=80)
+    return str(Path(name).with_suffix(".png")), png.getvalue(), thumbnail.getvalue()
+
+
+def process_batch(items, executor, workers, chain_spec=None):
+    """
+    Convert a batch of images in a process pool, yielding the results as they complete.
+
+    Only a few images per worker are in flight at once, so hundreds of images never sit in
+    memory together.
+
+    Parameters:
+    - items: iterable of (name, source) pairs, source as accepted by convert_image().
+    - executor: the concurrent.futures executor to run on.
+    - workers: number of processes of the executor.
+    - chain_spec: optional filter chain spec applied instead of the plain grayscale.
+
+    Yields:
+    - (name, png_bytes, thumbnail_bytes) for every image, or (name, None, error message) if it failed.
+    """
+    items = iter(items)
+    in_flight = {}
+    max_in_flight = workers * TASKS_PER_WORKER
+    try:
+        while True:
+            for name, source in items:
+                in_flight[executor.submit(convert_image, name, source, THUMBNAIL_SIDE, chain_spec)] = name
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = in_flight.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield name, None, str(e)
+    finally:
+        # the page was left mid-batch, don't keep converting for nobody
+        for future in in_flight:
+            future.cancel()
+
+
+def safe_name(name):
+    """
+    Return a relative name that stays inside the batch folder (no root, drive or '..' parts).
+    """
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts
+             if part not in (".", "..", "/") and not part.endswith(":")]
+    return str(Path(*parts)) if parts else "image"
+
+
+def unique_name(name, used_names):
+    """
+    Return the name, suffixed with _2, _3... if it is already in used_names (which it is added to).
+    """
+    path = Path(name)
+    candidate = name
+    counter = 2
+    while candidate in used_names:
+        candidate = str(path.with_name(f"{path.stem}_{counter}{path.suffix}"))
+        counter += 1
+    used_names.add(candidate)
+    return candidate
+
+
+def write_result(folder, name, png_bytes):
+    """
+    Write a converted image under the batch folder, keeping its subfolders.
+    """
+    target = Path(folder) / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(png_bytes)
+
+
+def build_zip(folder, names):
+    """
+    Pack the converted images of a batch into one zip file, in the batch folder.
+
+    PNG data is already deflated, so members are stored: building the zip is a plain copy,
+    streamed from file to file.
+
+    Returns:
+    - zip_path: Path of the zip.
+    """
+    zip_path = Path(folder) / ZIP_NAME
+    # only renamed once complete, an interrupted build never leaves a truncated zip to serve
+    partial_path = zip_path.with_name(ZIP_NAME + ".part")
+    with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_STORED) as zipf:
+        for name in names:
+            zipf.write(Path(folder) / name, name)
+    os.replace(partial_path, zip_path)
+    return zip_path
+
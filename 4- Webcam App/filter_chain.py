@@ -0,0 +1,222 @@
+import json
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from image_pipeline import to_grayscale
+
+
+# Filter chains saved from the sidebar, shared by every session of the app
+SAVED_CHAINS_PATH = Path(__file__).resolve().parent / "filter_chains.json"
+# Chain applied when nothing else was chosen, the app's original behaviour
+DEFAULT_CHAIN = [{"filter": "grayscale"}]
+
+
+class Filter:
+    """
+    Base of the image filters.
+
+    Pointwise filters (the output pixel only depends on the input pixel) describe themselves
+    as a 256-entry lookup table instead of touching the image: FilterChain composes the tables
+    of adjacent pointwise filters and applies them in one pass. The other filters work on the
+    whole array in apply().
+    """
+    name = ""
+    label = ""
+    pointwise = False
+    # parameter -> (minimum, maximum, default), shown as sliders in the sidebar
+    parameters = {}
+
+    def __init__(self, **params):
+        self.params = {name: int(params.get(name, default)) for name, (_, _, default) in self.parameters.items()}
+
+    def lut(self, histogram):
+        """
+        Return the uint8 lookup table of a pointwise filter.
+
+        Parameters:
+        - histogram: callable returning the 256-bin histogram of the image reaching this filter,
+          only called by the filters that need it.
+        """
+        raise NotImplementedError
+
+    def apply(self, pixels):
+        """
+        Return the filtered uint8 array (height, width) or (height, width, 3).
+        """
+        raise NotImplementedError
+
+
+class Grayscale(Filter):
+    name = "grayscale"
+    label = "Grayscale"
+
+    def apply(self, pixels):
+        return to_grayscale(pixels)
+
+
+class Resize(Filter):
+    name = "resize"
+    label = "Resize"
+    parameters = {"percent": (5, 200, 50)}
+
+    def apply(self, pixels):
+        height, width = pixels.shape[:2]
+        scale = self.params["percent"] / 100
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # a single C resampling call; reducing_gap shrinks big photos by whole factors first
+        return np.asarray(Image.fromarray(pixels).resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0))
+
+
+class Blur(Filter):
+    name = "blur"
+    label = "Blur"
+    parameters = {"radius": (1, 25, 2)}
+
+    def apply(self, pixels):
+        # separable box blur from running sums: the cost doesn't depend on the radius
+        radius = self.params["radius"]
+        size = 2 * radius + 1
+        result = pixels
+        for axis in (0, 1):
+            padding = [(0, 0)] * pixels.ndim
+            padding[axis] = (radius + 1, radius)
+            sums = np.cumsum(np.pad(result, padding, mode="edge"), axis=axis, dtype=np.uint32)
+            # window sums are differences of running sums `size` apart along the axis
+            sums = np.moveaxis(sums, axis, 0)
+            window = sums[size:] - sums[:-size]
+            window += radius
+            window //= size
+            result = np.moveaxis(window.astype(np.uint8), 0, axis)
+        return result
+
+
+class Threshold(Filter):
+    name = "threshold"
+    label = "Threshold"
+    pointwise = True
+    parameters = {"level": (0, 255, 128)}
+
+    def lut(self, histogram):
+        return np.where(np.arange(256) >= self.params["level"], 255, 0).astype(np.uint8)
+
+
+class Equalize(Filter):
+    name = "equalize"
+    label = "Histogram equalization"
+    pointwise = True
+
+    def lut(self, histogram):
+        cdf = np.cumsum(histogram())
+        first = cdf[np.flatnonzero(cdf)[0]] if cdf[-1] else 0
+        if cdf[-1] == first:
+            # a single gray level, nothing to spread
+            return np.arange(256, dtype=np.uint8)
+        return np.clip(np.round((cdf - first) * 255 / (cdf[-1] - first)), 0, 255).astype(np.uint8)
+
+
+class Edges(Filter):
+    name = "edges"
+    label = "Edge detection"
+
+    def apply(self, pixels):
+        # Sobel gradients in 16-bit integers, |gx| + |gy| scaled back to 0..255
+        gray = to_grayscale(pixels)
+        padded = np.pad(gray, 1, mode="edge").astype(np.int16)
+        # vertical [1, 2, 1] smoothing, then horizontal difference, and the other way around
+        smooth_rows = padded[:-2] + 2 * padded[1:-1] + padded[2:]
+        gradient_x = smooth_rows[:, 2:] - smooth_rows[:, :-2]
+        smooth_columns = padded[:, :-2] + 2 * padded[:, 1:-1] + padded[:, 2:]
+        gradient_y = smooth_columns[2:] - smooth_columns[:-2]
+        magnitude = np.abs(gradient_x)
+        magnitude += np.abs(gradient_y)
+        magnitude >>= 3
+        return magnitude.astype(np.uint8)
+
+
+# Available filters by name, new filters only need to be registered here
+FILTERS = {}
+
+
+def register_filter(filter_class):
+    FILTERS[filter_class.name] = filter_class
+    return filter_class
+
+
+for _filter_class in (Grayscale, Resize, Blur, Threshold, Equalize, Edges):
+    register_filter(_filter_class)
+
+
+class FilterChain:
+    """
+    Ordered list of filters, with adjacent pointwise filters fused into one lookup table pass.
+    """
+
+    def __init__(self, spec):
+        """
+        Parameters:
+        - spec: list of {"filter": name, parameter: value...} dicts, as saved in SAVED_CHAINS_PATH.
+        """
+        self.filters = []
+        for step in spec:
+            params = {name: value for name, value in step.items() if name != "filter"}
+            self.filters.append(FILTERS[step["filter"]](**params))
+        # canonical text of the chain, identifies its results in caches
+        self.key = json.dumps(self.spec(), sort_keys=True)
+
+    def spec(self):
+        return [{"filter": f.name, **f.params} for f in self.filters]
+
+    def apply(self, pixels):
+        """
+        Run the chain on a uint8 image array and return the result.
+        """
+        index = 0
+        while index < len(self.filters):
+            if not self.filters[index].pointwise:
+                pixels = self.filters[index].apply(pixels)
+                index += 1
+                continue
+            run_end = index
+            while run_end < len(self.filters) and self.filters[run_end].pointwise:
+                run_end += 1
+            pixels = self._apply_fused(pixels, self.filters[index:run_end])
+            index = run_end
+        return pixels
+
+    @staticmethod
+    def _apply_fused(pixels, filters):
+        # Compose the lookup tables of consecutive pointwise filters, then read the image once
+        lut = np.arange(256, dtype=np.uint8)
+        input_histogram = []
+
+        def histogram():
+            # histogram of the image as it would be at this step, derived from the input's
+            if not input_histogram:
+                input_histogram.append(np.bincount(pixels.ravel(), minlength=256))
+            return np.bincount(lut, weights=input_histogram[0], minlength=256)
+
+        for image_filter in filters:
+            lut = image_filter.lut(histogram)[lut]
+        return np.take(lut, pixels)
+
+
+def load_saved_chains(path=SAVED_CHAINS_PATH):
+    """
+    Return the saved filter chains as {name: spec}.
+    """
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_chain(name, spec, path=SAVED_CHAINS_PATH):
+    """
+    Save a filter chain under a name, replacing a chain of the same name.
+    """
+    chains = load_saved_chains(path)
+    chains[name] = spec
+    # written next to the file then swapped in, a crash never leaves half a file
+    temp_path = Path(path).with_suffix(".tmp")
+    temp_path.write_text(json.dumps(chains, indent=2), encoding="utf-8")
+    temp_path.replace(path)
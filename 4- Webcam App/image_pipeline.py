@@ -0,0 +1,137 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageOps
+import _paths  # noqa: F401
+import instrumentation
+
+
+# Longest side of the images shown in the page, larger pictures are downscaled before conversion
+DISPLAY_MAX_SIDE = 1024
+# Memory allowed to the cache of converted images (64 MiB, a few dozen previews)
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# ITU-R 601 luma weights (0.299, 0.587, 0.114) in 16.16 fixed point, the same rounding as PIL's convert('L')
+LUMA_WEIGHTS = (np.uint32(19595), np.uint32(38470), np.uint32(7471))
+
+
+def content_key(image_bytes):
+    """
+    Return a short digest of an encoded image, identical bytes always give the same key.
+    """
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def decode_image(image_bytes, max_side=DISPLAY_MAX_SIDE):
+    """
+    Decode an image straight into a NumPy array no larger than max_side on its longest side.
+
+    JPEG pictures are decoded at reduced size by the decoder itself (DCT scaling), so a
+    12 MP photo never gets fully decoded just to be shown at 1024 pixels.
+
+    Parameters:
+    - image_bytes: bytes of the encoded image (JPEG, PNG...).
+    - max_side: longest side of the result in pixels (None to keep the full size).
+
+    Returns:
+    - pixels: uint8 array of shape (height, width, 3) for color images, (height, width) for gray ones.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if max_side is not None:
+        image.draft('RGB', (max_side, max_side))
+    # phone pictures are often stored sideways with an EXIF orientation tag
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    if max_side is not None:
+        image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+    return np.asarray(image)
+
+
+def to_grayscale(pixels):
+    """
+    Convert an RGB array to grayscale with a vectorized luma transform.
+
+    Parameters:
+    - pixels: uint8 array of shape (height, width, 3), or an already gray (height, width) array.
+
+    Returns:
+    - grayscale: uint8 array of shape (height, width).
+    """
+    if pixels.ndim == 2:
+        return pixels
+    # weighted sum accumulated in place in 32-bit integers, rounded back to 8 bits
+    red_weight, green_weight, blue_weight = LUMA_WEIGHTS
+    luma = pixels[..., 0] * red_weight
+    luma += pixels[..., 1] * green_weight
+    luma += pixels[..., 2] * blue_weight
+    luma += 0x8000
+    luma >>= 16
+    return luma.astype(np.uint8)
+
+
+class GrayscaleCache:
+    """
+    LRU cache of converted images keyed on the hash of their encoded bytes, bounded in memory.
+
+    A Streamlit rerun caused by another widget hands over the same bytes again, so it costs a
+    hash and a dictionary lookup instead of a decode and a conversion. Images run through a
+    filter chain are cached per chain.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_side=DISPLAY_MAX_SIDE):
+        """
+        Parameters:
+        - max_bytes: memory allowed to the cached arrays.
+        - max_side: longest side of the cached images.
+        """
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Streamlit runs every browser session in its own thread
+        self._lock = threading.Lock()
+
+    def get(self, image_bytes, chain=None):
+        """
+        Return (original, converted) arrays of an encoded image, converting it only once.
+
+        Parameters:
+        - image_bytes: bytes of the encoded image.
+        - chain: optional filter_chain.FilterChain applied instead of the plain grayscale.
+        """
+        key = (content_key(image_bytes), chain.key if chain is not None else None)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                instrumentation.count("grayscale_cache_hits_total")
+                return entry
+            self.misses += 1
+        instrumentation.count("grayscale_cache_misses_total")
+
+        # convert outside the lock, other sessions don't wait for this image
+        with instrumentation.span("decode", bytes_in=len(image_bytes)) as span:
+            original = decode_image(image_bytes, self.max_side)
+            span.set(width=original.shape[1], height=original.shape[0])
+        with instrumentation.span("grayscale" if chain is None else "filter_chain"):
+            entry = (original, chain.apply(original) if chain is not None else to_grayscale(original))
+        # the arrays are shared between reruns and sessions, nobody may change them
+        for pixels in entry:
+            pixels.flags.writeable = False
+
+        entry_size = sum(pixels.nbytes for pixels in entry)
+        with self._lock:
+            if key not in self._entries and entry_size <= self.max_bytes:
+                self._entries[key] = entry
+                self.size += entry_size
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= sum(pixels.nbytes for pixels in evicted)
+                    instrumentation.count("grayscale_cache_evictions_total")
+                instrumentation.set_gauge("grayscale_cache_bytes", self.size)
+        return entry
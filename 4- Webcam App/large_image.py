@@ -0,0 +1,308 @@
+import math
+import struct
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from image_pipeline import DISPLAY_MAX_SIDE, to_grayscale
+import _paths  # noqa: F401
+import instrumentation
+
+
+# Images with more pixels than this (50 MP) are converted strip by strip instead of in one piece
+LARGE_IMAGE_PIXELS = 50_000_000
+# Largest image the tiled mode accepts (4 gigapixels), well beyond PIL's decompression bomb guard
+MAX_TILED_PIXELS = 4_000_000_000
+# Largest image of a compressed format (PNG, JPEG...), which has to be decoded whole: PIL's own
+# decompression bomb warning threshold (about 89 MP, 270 MB of RGB)
+MAX_DECODED_PIXELS = 1024 * 1024 * 1024 // 4 // 3
+# Rows decoded and converted at once, a strip of a 40000 px wide RGB scan is about 30 MB
+STRIP_ROWS = 256
+# Bytes per pixel of the raw layouts that can be decoded one strip at a time
+RAW_PIXEL_SIZES = {"L": 1, "LA": 2, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4, "CMYK": 4}
+
+
+def open_image(filepath):
+    """
+    Open an image of up to MAX_TILED_PIXELS, past the 179 MP refused by PIL's decompression bomb guard.
+
+    The format plugins are called directly, as Image.open() does: raising Image.MAX_IMAGE_PIXELS
+    instead would lift the guard for every other session of the Streamlit server meanwhile.
+    """
+    Image.init()
+    # a path, or a file object such as an upload
+    if hasattr(filepath, "read"):
+        filepath.seek(0)
+        prefix = filepath.read(16)
+    else:
+        with open(filepath, 'rb') as image_file:
+            prefix = image_file.read(16)
+    for image_format in Image.ID:
+        factory, accept = Image.OPEN[image_format]
+        accepted = accept is None or accept(prefix)
+        # accept() returns a warning text for files it recognizes but can't read
+        if not accepted or isinstance(accepted, str):
+            continue
+        try:
+            if hasattr(filepath, "read"):
+                filepath.seek(0)
+                image = factory(filepath, "")
+            else:
+                image = factory(str(filepath))
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+        width, height = image.size
+        if width * height > MAX_TILED_PIXELS:
+            image.close()
+            raise ValueError(f"Images over {MAX_TILED_PIXELS / 1e9:.0f} gigapixels are not supported.")
+        return image
+    raise Image.UnidentifiedImageError(f'Cannot identify image file "{getattr(filepath, "name", filepath)}"')
+
+
+def image_size(filepath):
+    """
+    Return (width, height) of an image from its header, without decoding it.
+    """
+    with open_image(filepath) as image:
+        return image.size
+
+
+def is_large_image(filepath):
+    width, height = image_size(filepath)
+    return width * height > LARGE_IMAGE_PIXELS
+
+
+def grayscale_output_path(image_path, folder=None):
+    """
+    Return '<stem>_grayscale.tif' (or '_grayscale_2.tif', '_3'... when taken) for an image.
+
+    Parameters:
+    - image_path: path of the image to convert.
+    - folder: folder of the result (the image's own folder by default).
+    """
+    image_path = Path(image_path)
+    folder = Path(folder) if folder is not None else image_path.parent
+    candidate = folder / f"{image_path.stem}_grayscale.tif"
+    number = 2
+    while candidate.exists():
+        candidate = folder / f"{image_path.stem}_grayscale_{number}.tif"
+        number += 1
+    return candidate
+
+
+def _tile(tile, extents, offset, args):
+    # PIL tiles are named tuples since Pillow 11, plain tuples before
+    if hasattr(tile, "_replace"):
+        return tile._replace(extents=extents, offset=offset, args=args)
+    return (tile[0], extents, offset, args)
+
+
+def _strip_plans(image, strip_rows):
+    """
+    Return [(top, rows, tiles)] decoding the image strip by strip, or None if the format can't.
+
+    Uncompressed layouts (BMP, PPM/PGM, uncompressed TIFF) are one 'raw' tile whose rows can be
+    addressed directly; tiled or striped TIFFs are split along their own tile rows. Compressed
+    streams (PNG, JPEG, compressed TIFF) have to be decoded from the start and return None.
+    """
+    width, height = image.size
+    if len(image.tile) == 1 and image.tile[0][0] == "raw":
+        tile = image.tile[0]
+        args = tile[3] if isinstance(tile[3], tuple) else (tile[3], 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if rawmode not in RAW_PIXEL_SIZES or tile[1] != (0, 0, width, height):
+            return None
+        stride = stride or width * RAW_PIXEL_SIZES[rawmode]
+        plans = []
+        for top in range(0, height, strip_rows):
+            rows = min(strip_rows, height - top)
+            # bottom-up files (BMP) store the last row first
+            first_row = top if orientation > 0 else height - top - rows
+            offset = tile[2] + first_row * stride
+            plans.append((top, rows, [_tile(tile, (0, 0, width, rows), offset, (rawmode, stride, orientation))]))
+        return plans
+
+    if len(image.tile) > 1 and all(tile[0] in ("raw", "packbits", "tiff_lzw", "zip") for tile in image.tile):
+        # group the tiles by their rows, then merge the bands up to strip_rows
+        bands = {}
+        for tile in image.tile:
+            bands.setdefault((tile[1][1], tile[1][3]), []).append(tile)
+        plans = []
+        for (band_top, band_bottom), tiles in sorted(bands.items()):
+            if plans and plans[-1][1] + band_bottom - band_top <= strip_rows \
+                    and plans[-1][0] + plans[-1][1] == band_top:
+                top, rows, merged = plans[-1]
+                plans[-1] = (top, rows + band_bottom - band_top, merged + tiles)
+            else:
+                plans.append((band_top, band_bottom - band_top, tiles))
+        return [(top, rows, [_tile(tile, (tile[1][0], tile[1][1] - top, tile[1][2], tile[1][3] - top), tile[2],
+                                   tile[3]) for tile in tiles])
+                for top, rows, tiles in plans]
+    return None
+
+
+def _as_array(image):
+    # uint8 array of an image or strip, converting the unusual modes (palette, 16-bit, CMYK...)
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+
+def iter_strips(filepath, strip_rows=STRIP_ROWS):
+    """
+    Yield (top, pixels) strips covering an image from top to bottom.
+
+    Formats addressable by rows (BMP, PPM/PGM, uncompressed or striped TIFF) are decoded one
+    strip at a time, so memory stays at a few strips whatever the image size. Compressed
+    streams (PNG, JPEG...) are decoded once, then cut into strips, which only avoids the full
+    size temporaries of the conversion; past MAX_DECODED_PIXELS they are refused.
+    """
+    with open_image(filepath) as image:
+        plans = _strip_plans(image, strip_rows)
+        width, height = image.size
+        image_format = image.format
+
+    if plans is None and width * height > MAX_DECODED_PIXELS:
+        raise ValueError(f"{image_format or 'This'} images over {MAX_DECODED_PIXELS / 1e6:.0f} MP have to be "
+                         f"decoded whole; save the scan as an uncompressed TIFF or BMP to convert it.")
+
+    if plans is None:
+        with open_image(filepath) as image:
+            image.load()
+        for top in range(0, height, strip_rows):
+            yield top, _as_array(image.crop((0, top, width, min(height, top + strip_rows))))
+        return
+
+    for top, rows, tiles in plans:
+        with open_image(filepath) as image:
+            # decode only this strip's tiles into an image the size of the strip
+            image.tile = tiles
+            image._size = (width, rows)
+            image.load()
+            yield top, _as_array(image)
+
+
+class GrayscaleTiffWriter:
+    """
+    Write an 8-bit grayscale baseline TIFF row by row, without ever holding the whole image.
+
+    Rows are appended to the file as they come; the directory describing them is written at
+    the end, so the file only needs seeking once to point at it.
+    """
+
+    def __init__(self, filepath, width, height, rows_per_strip=STRIP_ROWS):
+        if width * height >= 2 ** 32 - 2 ** 20:
+            raise ValueError("Image is too large for a baseline TIFF (4 GB).")
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.rows_written = 0
+        self.file = open(filepath, "wb")
+        # little endian header, the directory offset is filled in by close()
+        self.file.write(b"II*\x00\x00\x00\x00\x00")
+
+    def write(self, rows):
+        """
+        Append a uint8 array of shape (rows, width).
+        """
+        self.file.write(np.ascontiguousarray(rows, dtype=np.uint8).tobytes())
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.file.close()
+            raise ValueError(f"{self.rows_written} rows written out of {self.height}.")
+        strips = math.ceil(self.height / self.rows_per_strip)
+        strip_size = self.rows_per_strip * self.width
+        offsets = [8 + index * strip_size for index in range(strips)]
+        counts = [strip_size] * (strips - 1) + [(self.height - (strips - 1) * self.rows_per_strip) * self.width]
+
+        # the strip arrays go after the directory when they don't fit in its 4-byte fields
+        directory_offset = self.file.tell() + self.file.tell() % 2
+        entries = 9
+        arrays_offset = directory_offset + 2 + entries * 12 + 4
+
+        def array_field(values):
+            nonlocal arrays_offset
+            if len(values) == 1:
+                return values[0], b""
+            offset, arrays_offset = arrays_offset, arrays_offset + 4 * len(values)
+            return offset, struct.pack(f"<{len(values)}I", *values)
+
+        offsets_value, offsets_data = array_field(offsets)
+        counts_value, counts_data = array_field(counts)
+        # tag, type (3 short, 4 long), count, value
+        tags = [(256, 4, 1, self.width), (257, 4, 1, self.height), (258, 3, 1, 8), (259, 3, 1, 1),
+                (262, 3, 1, 1), (273, 4, strips, offsets_value), (277, 3, 1, 1),
+                (278, 4, 1, self.rows_per_strip), (279, 4, strips, counts_value)]
+        directory = struct.pack("<H", entries) + b"".join(
+            struct.pack("<HHII", *tag) if tag[1] == 4 else struct.pack("<HHIHH", *tag, 0) for tag in tags)
+        self.file.write(b"\x00" * (directory_offset - self.file.tell()))
+        self.file.write(directory + b"\x00\x00\x00\x00" + offsets_data + counts_data)
+        self.file.seek(4)
+        self.file.write(struct.pack("<I", directory_offset))
+        self.file.close()
+
+
+class PreviewBuilder:
+    """
+    Build a downsampled preview from strips, averaging blocks of `factor` x `factor` pixels.
+    """
+
+    def __init__(self, width, height, max_side=DISPLAY_MAX_SIDE):
+        self.factor = max(1, math.ceil(max(width, height) / max_side))
+        self.width = width // self.factor * self.factor
+        self._carry = None
+        self._rows = []
+
+    def add(self, pixels):
+        # rows left over from the previous strip are completed by this one
+        if self._carry is not None:
+            pixels = np.concatenate([self._carry, pixels])
+        usable = len(pixels) // self.factor * self.factor
+        self._carry = pixels[usable:]
+        if usable:
+            # PIL's box reduction in C, a NumPy mean over the blocks is several times slower
+            blocks = Image.fromarray(np.ascontiguousarray(pixels[:usable, :self.width]))
+            self._rows.append(np.asarray(blocks.reduce(self.factor)))
+
+    def result(self):
+        return np.concatenate(self._rows) if self._rows else np.zeros((0, 0), dtype=np.uint8)
+
+
+def convert_large_image(filepath, output_path, progress_callback=None, strip_rows=STRIP_ROWS,
+                        preview_side=DISPLAY_MAX_SIDE):
+    """
+    Convert a very large image to grayscale strip by strip, writing the result straight to disk.
+
+    Parameters:
+    - filepath: path of the image to convert.
+    - output_path: path of the full resolution grayscale TIFF to write.
+    - progress_callback: optional callable(rows_done, rows_total).
+    - strip_rows: rows converted at once.
+    - preview_side: longest side of the returned previews.
+
+    Returns:
+    - original_preview: small uint8 array of the original image.
+    - grayscale_preview: small uint8 array of the grayscale image.
+    """
+    width, height = image_size(filepath)
+    original_preview = PreviewBuilder(width, height, preview_side)
+    grayscale_preview = PreviewBuilder(width, height, preview_side)
+    writer = GrayscaleTiffWriter(output_path, width, height, strip_rows)
+    with instrumentation.span("large_image", width=width, height=height) as span:
+        try:
+            for top, pixels in iter_strips(filepath, strip_rows):
+                grayscale = to_grayscale(pixels)
+                writer.write(grayscale)
+                original_preview.add(pixels)
+                grayscale_preview.add(grayscale)
+                if progress_callback is not None:
+                    progress_callback(top + len(pixels), height)
+            writer.close()
+        except BaseException:
+            writer.file.close()
+            Path(output_path).unlink(missing_ok=True)
+            raise
+    instrumentation.record_operation("large_image", span.seconds, 1, Path(filepath).stat().st_size,
+                                     Path(output_path).stat().st_size)
+    return original_preview.result(), grayscale_preview.result()
@@ -0,0 +1,265 @@
+"""
+Continuous-frame grayscale pipeline of the Webcam App.
+
+Usage (headless check of the sustained frame rate):
+    python video_pipeline.py [--width 1920] [--height 1080] [--fps 30] [--seconds 5] [--video clip.mp4]
+
+Frames are decoded by a producer thread, converted by a processing thread and picked up by the
+page, with a small bounded queue between each stage. When a stage falls behind, the oldest
+queued frame is dropped instead of letting the delay grow, so what is shown stays live.
+"""
+import sys
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+import numpy as np
+from PIL import Image, ImageSequence
+from image_pipeline import to_grayscale
+import _paths  # noqa: F401
+import instrumentation
+
+# Optional, reads common video files (mp4, avi, mov...) when installed
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+# Frames waiting between two stages, a short queue keeps the latency at a few frames
+QUEUE_SIZE = 2
+# Seconds of displayed frames the FPS and latency are averaged over
+STATS_WINDOW = 2.0
+# Video files the page accepts, the formats beyond the animated images need OpenCV
+VIDEO_FILE_TYPES = ["gif", "webp", "png"] + (["mp4", "avi", "mov", "mkv"] if cv2 is not None else [])
+
+
+class SyntheticSource:
+    """
+    Moving color bands generated with NumPy, a camera stand-in for local testing.
+    """
+
+    def __init__(self, width=1920, height=1080, fps=30):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        # one pattern twice as wide as the frame, every frame is a shifted window of it
+        x = np.arange(width * 2, dtype=np.float32)
+        y = np.arange(height, dtype=np.float32)[:, None]
+        self._pattern = np.empty((height, width * 2, 3), dtype=np.uint8)
+        self._pattern[..., 0] = (np.sin(x / 97) * 127 + 128).astype(np.uint8)
+        self._pattern[..., 1] = (np.sin((x + y) / 61) * 127 + 128).astype(np.uint8)
+        self._pattern[..., 2] = (np.cos(y / 43) * 127 + 128).astype(np.uint8)
+
+    def frames(self):
+        index = 0
+        while True:
+            offset = index * 8 % self.width
+            yield np.ascontiguousarray(self._pattern[:, offset:offset + self.width])
+            index += 1
+
+
+class VideoFileSource:
+    """
+    Frames of a video file, read with OpenCV when installed, or with PIL for animated images.
+    """
+
+    def __init__(self, filepath, loop=True):
+        """
+        Parameters:
+        - filepath: path of the video (any OpenCV format, or an animated GIF/WebP/PNG).
+        - loop: start over at the end of the file.
+        """
+        self.filepath = str(filepath)
+        self.loop = loop
+        self.fps = 30
+        if cv2 is not None:
+            capture = cv2.VideoCapture(self.filepath)
+            if capture.isOpened():
+                self.fps = capture.get(cv2.CAP_PROP_FPS) or self.fps
+                capture.release()
+                self._read = self._read_opencv
+                return
+        with Image.open(self.filepath) as image:
+            # frame duration in milliseconds, GIFs often leave it out
+            self.fps = 1000 / (image.info.get("duration") or 1000 / self.fps)
+        self._read = self._read_pil
+
+    def _read_opencv(self):
+        capture = cv2.VideoCapture(self.filepath)
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                # OpenCV decodes to BGR
+                yield frame[..., ::-1]
+        finally:
+            capture.release()
+
+    def _read_pil(self):
+        with Image.open(self.filepath) as image:
+            for frame in ImageSequence.Iterator(image):
+                yield np.asarray(frame.convert("RGB"))
+
+    def frames(self):
+        while True:
+            yield from self._read()
+            if not self.loop:
+                return
+
+
+def put_latest(frames_queue, item):
+    """
+    Put an item in a bounded queue, dropping the oldest queued items if it is full.
+
+    Returns:
+    - dropped: number of items dropped to make room.
+    """
+    dropped = 0
+    while True:
+        try:
+            frames_queue.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                frames_queue.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+class VideoPipeline:
+    """
+    Producer/consumer pipeline: decode -> transform -> display, each stage in its own thread.
+
+    Frames go through as (capture time, pixels) so the latency from capture to display can be
+    measured. The source is paced at its own frame rate like a camera.
+    """
+
+    def __init__(self, source, transform=to_grayscale, queue_size=QUEUE_SIZE):
+        """
+        Parameters:
+        - source: SyntheticSource, VideoFileSource or any object with fps and frames().
+        - transform: callable(pixels) -> pixels applied to every frame.
+        - queue_size: frames waiting between two stages.
+        """
+        self.source = source
+        self.transform = transform
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.processed = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.frames_read = 0
+        # both stages drop frames, their counts are added under this lock
+        self._dropped_lock = threading.Lock()
+        self._shown = deque()
+        self._stop_event = threading.Event()
+        self._threads = [threading.Thread(target=self._produce, daemon=True),
+                         threading.Thread(target=self._process, daemon=True)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _count_dropped(self, dropped):
+        with self._dropped_lock:
+            self.dropped += dropped
+        instrumentation.count("video_frames_dropped_total", dropped)
+
+    def _produce(self):
+        frame_interval = 1 / self.source.fps
+        next_frame_at = time.perf_counter()
+        frames = self.source.frames()
+        try:
+            for pixels in frames:
+                if self._stop_event.is_set():
+                    return
+                self.frames_read += 1
+                self._count_dropped(put_latest(self.decoded, (time.perf_counter(), pixels)))
+                # real-time pacing; when behind schedule, carry on at once without trying to catch up
+                next_frame_at = max(next_frame_at + frame_interval, time.perf_counter() - frame_interval)
+                delay = next_frame_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            # closes the video file now rather than whenever the generator is collected
+            frames.close()
+        # end of a file that doesn't loop
+        self._count_dropped(put_latest(self.decoded, None))
+
+    def _process(self):
+        while not self._stop_event.is_set():
+            try:
+                item = self.decoded.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is not None:
+                captured_at, pixels = item
+                with instrumentation.span("video_frame"):
+                    item = (captured_at, self.transform(pixels))
+            self._count_dropped(put_latest(self.processed, item))
+            instrumentation.count("video_frames_total")
+            if item is None:
+                return
+
+    def get(self, timeout=1.0):
+        """
+        Return the next processed (capture time, pixels), None at the end of the source.
+
+        Raises queue.Empty if no frame arrived within the timeout.
+        """
+        return self.processed.get(timeout=timeout)
+
+    def frame_shown(self, captured_at):
+        # record a displayed frame for the FPS and latency overlay
+        now = time.perf_counter()
+        self._shown.append((now, now - captured_at))
+        while self._shown and self._shown[0][0] < now - STATS_WINDOW:
+            self._shown.popleft()
+
+    def stats(self):
+        """
+        Return (frames per second shown, mean capture-to-display latency in ms, frames dropped).
+        """
+        if len(self._shown) < 2:
+            return 0.0, 0.0, self.dropped
+        elapsed = self._shown[-1][0] - self._shown[0][0]
+        latency = sum(latency for _, latency in self._shown) / len(self._shown)
+        return (len(self._shown) - 1) / elapsed if elapsed else 0.0, latency * 1000, self.dropped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1920, help="width of the synthetic frames")
+    parser.add_argument("--height", type=int, default=1080, help="height of the synthetic frames")
+    parser.add_argument("--fps", type=float, default=30, help="frame rate of the synthetic source")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of the run")
+    parser.add_argument("--video", help="video file to read instead of the synthetic source")
+    args = parser.parse_args(argv)
+
+    source = VideoFileSource(args.video) if args.video else SyntheticSource(args.width, args.height, args.fps)
+    pipeline = VideoPipeline(source).start()
+    deadline = time.perf_counter() + args.seconds
+    try:
+        while time.perf_counter() < deadline:
+            item = pipeline.get()
+            if item is None:
+                break
+            pipeline.frame_shown(item[0])
+    finally:
+        pipeline.stop()
+    fps, latency_ms, dropped = pipeline.stats()
+    print(f"{fps:.1f} fps shown, {latency_ms:.1f} ms capture-to-display latency, "
+          f"{dropped} of {pipeline.frames_read} frames dropped (source at {source.fps:g} fps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,116 @@
 # Note: This script runs only on a local IDE with "streamlit run webcam_app.py"
 
+import os
+import queue
+import shutil
+import tempfile
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import streamlit as st
-from PIL import Image
+import batch_pipeline
+import filter_chain
+import large_image
+import _paths  # noqa: F401
+import instrumentation
+from filter_chain import DEFAULT_CHAIN, FILTERS, FilterChain
+from image_pipeline import DISPLAY_MAX_SIDE, GrayscaleCache
+from video_pipeline import VIDEO_FILE_TYPES, SyntheticSource, VideoFileSource, VideoPipeline
+
+
+# Thumbnails per gallery page, and per gallery row
+GALLERY_PAGE_SIZE = 24
+GALLERY_COLUMNS = 6
+# Converted images between two refreshes of the gallery while a batch runs
+GALLERY_REFRESH_EVERY = 12
+# Largest converted scan offered as a download, the browser download goes through memory
+LARGE_DOWNLOAD_MAX_BYTES = 512 * 1024 * 1024
+
+
+@st.cache_resource
+def get_process_pool():
+    """
+    Return the process pool converting image batches, started once and shared by every session.
+    """
+    # 'spawn' avoids forking the Streamlit server and its threads
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+
+
+@st.cache_resource
+def get_grayscale_cache():
+    """
+    Return the cache of converted images, created once and shared by every rerun and session.
+    """
+    return GrayscaleCache()
 
 
 def convert_to_grayscale(image):
     """
     Convert the provided image to grayscale.
 
+    The conversion is cached on the hash of the image bytes, so reruns triggered by other
+    widgets reuse the previous result instead of decoding the image again.
+
     Parameters:
     - image: An image object returned either from camera capturing or file uploading.
 
     Returns:
-    - grayscale_image: PIL.Image.Image object
+    - original_image: numpy.ndarray of the image, downscaled for display
+    - grayscale_image: numpy.ndarray of the grayscale image
+    """
+    return get_grayscale_cache().get(image.getvalue(), current_chain())
+
+
+def current_chain():
+    """
+    Return the FilterChain defined in the sidebar (plain grayscale by default).
+    """
+    return FilterChain(st.session_state.get("filter_chain", DEFAULT_CHAIN))
+
+
+def filter_sidebar():
     """
-    # Open the image and render it with Image.open() from PIL
-    this_image = Image.open(image)
-    # Convert the image to grayscale
-    grayscale_image = this_image.convert('L')
-    # Return the resulting grayscale image
-    return grayscale_image
+    Let the user build the filter chain in the sidebar, and save or load named chains.
+    """
+    if "filter_chain" not in st.session_state:
+        st.session_state["filter_chain"] = [dict(step) for step in DEFAULT_CHAIN]
+        # bumped whenever steps are added, removed or loaded, so the sliders start over
+        st.session_state["filter_chain_version"] = 0
+    spec = st.session_state["filter_chain"]
+    version = st.session_state["filter_chain_version"]
+
+    def replace_chain(new_spec):
+        st.session_state["filter_chain"] = new_spec
+        st.session_state["filter_chain_version"] += 1
+        st.rerun()
+
+    with st.sidebar:
+        st.header("Filters")
+        for index, step in enumerate(spec):
+            filter_class = FILTERS[step["filter"]]
+            label_column, remove_column = st.columns([4, 1])
+            label_column.markdown(f"{index + 1}. {filter_class.label}")
+            if remove_column.button("✕", key=f"remove_{version}_{index}"):
+                replace_chain(spec[:index] + spec[index + 1:])
+            for name, (minimum, maximum, default) in filter_class.parameters.items():
+                step[name] = st.slider(name.capitalize(), minimum, maximum, int(step.get(name, default)),
+                                       key=f"param_{version}_{index}_{name}")
+
+        filter_name = st.selectbox("Add filter", list(FILTERS), format_func=lambda name: FILTERS[name].label)
+        if st.button("Add"):
+            replace_chain(spec + [{"filter": filter_name}])
+
+        # chains are saved in a file next to the app, so they are there in every session
+        st.subheader("Saved chains")
+        chain_name = st.text_input("Name").strip()
+        if st.button("Save") and chain_name:
+            filter_chain.save_chain(chain_name, FilterChain(spec).spec())
+            st.success(f'Saved "{chain_name}".')
+        saved_chains = filter_chain.load_saved_chains()
+        if saved_chains:
+            saved_name = st.selectbox("Saved chain", sorted(saved_chains))
+            if st.button("Load"):
+                replace_chain([dict(step) for step in saved_chains[saved_name]])
 
 
 def display_images(original_img, grayscale_img):
@@ -27,8 +118,8 @@ def display_images(original_img, grayscale_img):
     Display the original and grayscale images side by side.
 
     Parameters:
-    - original_img: PIL.Image.Image object
-    - grayscale_img: PIL.Image.Image object
+    - original_img: numpy.ndarray image
+    - grayscale_img: numpy.ndarray image
     """
     col1, col2 = st.columns(2)
 
@@ -37,7 +128,8 @@ def display_images(original_img, grayscale_img):
         st.image(original_img, use_column_width=True)
 
     with col2:
-        st.subheader("Grayscale:")
+        st.subheader("Grayscale:" if st.session_state.get("filter_chain", DEFAULT_CHAIN) == DEFAULT_CHAIN
+                     else "Filtered:")
         st.image(grayscale_img, use_column_width=True)
 
 
@@ -51,9 +143,9 @@ def capture_image():
         # Prompt the user to provide camera input
         original_image = st.camera_input("Camera")
         if original_image is not None:
-            grayscale_image = convert_to_grayscale(original_image)
+            original_pixels, grayscale_image = convert_to_grayscale(original_image)
             # Display the original and grayscale images
-            display_images(original_image, grayscale_image)
+            display_images(original_pixels, grayscale_image)
 
 
 def upload_image():
@@ -61,25 +153,296 @@ def upload_image():
     Logic for browsing image, converting it to grayscale, and displaying.
     """
     st.header("Browse a picture")
-    # Prompt the user to upload an image file
-    original_image = st.file_uploader("", type=["jpg", "png", "jpeg"])
-    if original_image is not None:
-        grayscale_image = convert_to_grayscale(original_image)
-        # Display the original and grayscale images
-        display_images(original_image, grayscale_image)
+    input_mode = st.radio("Input", ["Upload", "Server folder or zip"], horizontal=True)
+    if input_mode == "Upload":
+        # Prompt the user to upload one image file, or many to convert them as a batch
+        uploaded_images = st.file_uploader("", type=["jpg", "png", "jpeg", "tif", "tiff", "bmp"],
+                                           accept_multiple_files=True)
+        if len(uploaded_images) == 1 and large_image.is_large_image(uploaded_images[0]):
+            image = uploaded_images[0]
+            large_key = ("upload", image.file_id)
+            large = st.session_state.get("large_image")
+            if large is None or large["key"] != large_key:
+                # the tiled mode reads from a file: the upload and its result get a folder of their own
+                folder = Path(tempfile.mkdtemp(prefix="webcam_app_large_"))
+                image_path = folder / Path(image.name).name
+                image_path.write_bytes(image.getvalue())
+                large = convert_large(large_key, image_path, large_image.grayscale_output_path(image_path), folder)
+                # only the result is kept, for the download
+                image_path.unlink(missing_ok=True)
+            show_large(large)
+            return
+        # a large upload shown before isn't needed anymore
+        discard_large()
+        if len(uploaded_images) == 1:
+            original_pixels, grayscale_image = convert_to_grayscale(uploaded_images[0])
+            # Display the original and grayscale images
+            display_images(original_pixels, grayscale_image)
+        elif uploaded_images:
+            batch_key = tuple(image.file_id for image in uploaded_images)
+            convert_batch(batch_key, [(image.name, image.getvalue()) for image in uploaded_images])
+        return
+
+    # Images already on the server: only their paths go to the worker processes
+    server_path = st.text_input("Folder, .zip or image path on the server").strip()
+    if not server_path:
+        return
+    server_path = Path(server_path).expanduser()
+    if server_path.is_file() and server_path.suffix.lower() in batch_pipeline.IMAGE_EXTENSIONS:
+        try:
+            is_large = large_image.is_large_image(server_path)
+            if not is_large:
+                display_images(*get_grayscale_cache().get(server_path.read_bytes(), current_chain()))
+        except (OSError, ValueError) as e:
+            st.error(f"Could not convert the image: {e}")
+            return
+        if not is_large:
+            return
+        # a scan too big for the browser: converted next to itself, without overwriting anything
+        large_key = ("server", str(server_path), server_path.stat().st_mtime_ns)
+        large = st.session_state.get("large_image")
+        if large is None or large["key"] != large_key or not Path(large["output_path"]).exists():
+            large = convert_large(large_key, server_path, large_image.grayscale_output_path(server_path))
+        show_large(large)
+        return
+    if server_path.is_dir():
+        items = [(str(Path(path).relative_to(server_path)), path)
+                 for path in batch_pipeline.iter_folder_images(server_path)]
+    elif server_path.is_file() and server_path.suffix.lower() == ".zip":
+        items = [(name, (str(server_path), name)) for name in batch_pipeline.iter_zip_images(server_path)]
+    else:
+        st.warning("Please enter an existing folder, .zip or image file.")
+        return
+    if not items:
+        st.warning("No images found there.")
+        return
+    convert_batch(("server", str(server_path), server_path.stat().st_mtime_ns), items)
+
+
+def discard_large():
+    # Forget the large image of this session, removing its temporary folder (uploads) if it has one
+    large = st.session_state.pop("large_image", None)
+    if large is not None and large["folder"] is not None:
+        shutil.rmtree(large["folder"], ignore_errors=True)
+
+
+def convert_large(large_key, image_path, output_path, folder=None):
+    """
+    Convert a very large image strip by strip, writing the full resolution result to disk.
+
+    Only downsampled previews reach the browser. Filters need the whole image, the tiled mode
+    applies the plain grayscale. The result replaces the previous large image of the session.
+
+    Parameters:
+    - large_key: hashable identifying the image (same image, same key).
+    - image_path: path of the image to convert.
+    - output_path: path of the grayscale TIFF to write.
+    - folder: optional temporary folder holding the files, removed with the result.
+
+    Returns:
+    - large: the dict kept in the session state for show_large(), None if the conversion failed.
+    """
+    discard_large()
+    progress_bar = st.progress(0.0, text="Converting...")
+
+    def show_progress(rows_done, rows_total):
+        progress_bar.progress(rows_done / rows_total, text=f"Converting... {rows_done}/{rows_total} rows")
+
+    try:
+        width, height = large_image.image_size(image_path)
+        previews = large_image.convert_large_image(image_path, output_path, show_progress)
+    except (OSError, ValueError) as e:
+        progress_bar.empty()
+        st.error(f"Could not convert the image: {e}")
+        if folder is not None:
+            shutil.rmtree(folder, ignore_errors=True)
+        return None
+    except BaseException:
+        # a rerun interrupted the conversion
+        if folder is not None:
+            shutil.rmtree(folder, ignore_errors=True)
+        raise
+    progress_bar.empty()
+    large = {"key": large_key, "previews": previews, "size": (width, height), "output_path": str(output_path),
+             "folder": folder}
+    st.session_state["large_image"] = large
+    return large
+
+
+def show_large(large):
+    """
+    Show the previews of a converted large image, and offer its full resolution TIFF for download.
+    """
+    if large is None:
+        return
+    if current_chain().key != FilterChain(DEFAULT_CHAIN).key:
+        st.info("Large images are converted to grayscale only, the filter chain isn't applied.")
+    width, height = large["size"]
+    output_path = Path(large["output_path"])
+    # an upload's result lives in a temporary folder, only the download makes sense for it
+    st.success(f"{width} x {height} image converted" + ("." if large["folder"] else f", saved to {output_path}"))
+    if output_path.stat().st_size <= LARGE_DOWNLOAD_MAX_BYTES:
+        with open(output_path, "rb") as output_file:
+            st.download_button("Download grayscale TIFF", data=output_file, file_name=output_path.name,
+                               mime="image/tiff")
+    else:
+        st.caption("The full resolution TIFF is too large to download through the browser.")
+    display_images(*large["previews"])
+
+
+def convert_batch(batch_key, items):
+    """
+    Convert a batch of images in the process pool, then show them in a paginated gallery.
+
+    Results are kept in the session state, so browsing the gallery pages doesn't convert the
+    batch again; the converted images and their zip wait in a temporary folder for the download.
+
+    Parameters:
+    - batch_key: hashable identifying the batch (same images, same key).
+    - items: list of (name, source) pairs as accepted by batch_pipeline.convert_image().
+    """
+    chain = current_chain()
+    # the same images through another chain are another batch
+    batch_key = (batch_key, chain.key)
+    batch = st.session_state.get("batch")
+    if batch is None or batch["key"] != batch_key:
+        if batch is not None:
+            # the previous batch of this session is replaced, its converted images can go
+            shutil.rmtree(batch["folder"], ignore_errors=True)
+        batch = run_batch(batch_key, items, chain)
+        st.session_state["batch"] = batch
+
+    failed = batch["failed"]
+    st.success(f"{len(batch['names'])} image(s) converted" + (f", {len(failed)} failed." if failed else "."))
+    for name, error_message in failed:
+        st.caption(f"{name}: {error_message}")
+    if batch["zip"] is None:
+        # built once, from the converted images on disk, and served from its file
+        batch["zip"] = batch_pipeline.build_zip(batch["folder"], batch["names"])
+    with open(batch["zip"], "rb") as zip_file:
+        st.download_button("Download all (zip)", data=zip_file, file_name=batch_pipeline.ZIP_NAME,
+                           mime="application/zip")
+
+    pages = max(1, -(-len(batch["thumbnails"]) // GALLERY_PAGE_SIZE))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+    show_gallery(batch["thumbnails"], page)
+
+
+def run_batch(batch_key, items, chain):
+    # Convert the images, refreshing a progress bar and the first gallery page as results arrive
+    folder = tempfile.mkdtemp(prefix="webcam_app_batch_")
+    batch = {"key": batch_key, "folder": folder, "names": [], "thumbnails": [], "failed": [], "zip": None}
+    used_names = set()
+    progress_bar = st.progress(0.0, text="Converting...")
+    gallery = st.empty()
+    results = batch_pipeline.process_batch(items, get_process_pool(), os.cpu_count() or 1, chain.spec())
+    with instrumentation.span("batch", images=len(items)) as span:
+        try:
+            for done, (name, png_bytes, thumbnail_or_error) in enumerate(results, start=1):
+                if png_bytes is None:
+                    batch["failed"].append((name, thumbnail_or_error))
+                    instrumentation.count("batch_images_total", status="failed")
+                else:
+                    name = batch_pipeline.unique_name(batch_pipeline.safe_name(name), used_names)
+                    batch_pipeline.write_result(folder, name, png_bytes)
+                    batch["names"].append(name)
+                    batch["thumbnails"].append((name, thumbnail_or_error))
+                    instrumentation.count("batch_images_total", status="ok")
+                progress_bar.progress(done / len(items), text=f"Converting... {done}/{len(items)}")
+                if done % GALLERY_REFRESH_EVERY == 0:
+                    with gallery.container():
+                        show_gallery(batch["thumbnails"], 1)
+        except BaseException:
+            # a rerun interrupted the batch, it never reaches the session state to be cleaned up later
+            results.close()
+            shutil.rmtree(folder, ignore_errors=True)
+            raise
+        span.set(failed=len(batch["failed"]))
+    if span.seconds > 0:
+        instrumentation.set_gauge("batch_images_per_second", len(items) / span.seconds)
+    progress_bar.empty()
+    gallery.empty()
+    return batch
+
+
+def show_gallery(thumbnails, page):
+    """
+    Show one page of (name, JPEG bytes) thumbnails in a grid.
+    """
+    start = (page - 1) * GALLERY_PAGE_SIZE
+    columns = st.columns(GALLERY_COLUMNS)
+    for index, (name, thumbnail) in enumerate(thumbnails[start:start + GALLERY_PAGE_SIZE]):
+        columns[index % GALLERY_COLUMNS].image(thumbnail, caption=name, use_column_width=True)
+
+
+def video_stream():
+    """
+    Logic for converting a video stream to grayscale frame by frame, with an FPS/latency overlay.
+    """
+    st.header("Grayscale video")
+    source_name = st.radio("Source", ["Synthetic", "Video file"], horizontal=True)
+    if source_name == "Synthetic":
+        resolution = st.selectbox("Resolution", ["1920x1080", "1280x720", "640x480"])
+        width, height = (int(side) for side in resolution.split("x"))
+        source = SyntheticSource(width, height)
+    else:
+        video = st.file_uploader("Video", type=VIDEO_FILE_TYPES)
+        if video is None:
+            return
+
+    if not st.toggle("Run"):
+        return
+    overlay = st.empty()
+    frame_placeholder = st.empty()
+    video_path = None
+    pipeline = None
+    try:
+        if source_name == "Video file":
+            # the readers need a real file, it only lives while the stream runs
+            with tempfile.NamedTemporaryFile(prefix="webcam_app_", suffix=Path(video.name).suffix,
+                                             delete=False) as video_file:
+                video_file.write(video.getvalue())
+            video_path = Path(video_file.name)
+            source = VideoFileSource(video_path)
+        pipeline = VideoPipeline(source, transform=current_chain().apply).start()
+        # runs until the toggle (or any widget) triggers a rerun, which interrupts this loop
+        while True:
+            try:
+                item = pipeline.get()
+            except queue.Empty:
+                continue
+            if item is None:
+                overlay.caption("End of video")
+                break
+            captured_at, pixels = item
+            # sending full 1080p frames to the browser would be the bottleneck, skip pixels instead
+            step = -(-max(pixels.shape[:2]) // DISPLAY_MAX_SIDE)
+            frame_placeholder.image(pixels[::step, ::step], output_format="JPEG", use_column_width=True)
+            pipeline.frame_shown(captured_at)
+            fps, latency_ms, dropped = pipeline.stats()
+            overlay.caption(f"{fps:.1f} fps | {latency_ms:.0f} ms latency | {dropped} frames dropped")
+    finally:
+        if pipeline is not None:
+            pipeline.stop()
+        if video_path is not None:
+            video_path.unlink(missing_ok=True)
 
 
 def main():
     # Set the title of the app and format it to be in the center
     st.markdown("<h1 style='text-align: center;'>Grayscale Image Converter</h1>",
                 unsafe_allow_html=True)
+    # filters applied to every captured, browsed and streamed image
+    filter_sidebar()
 
-    # Create buttons for capturing and browsing images
-    _, col1, col2, _ = st.columns(4)
+    # Create buttons for capturing and browsing images, and for the video stream
+    _, col1, col2, col3, _ = st.columns(5)
     with col1:
         browse_button = st.button("Browse Image")
     with col2:
         capture_button = st.button("Capture Image")
+    with col3:
+        video_button = st.button("Video Stream")
 
     if "upload_btn_state" not in st.session_state:
         # If not present in the session state, initialize 'upload_btn_state' to False
@@ -89,24 +452,34 @@ def main():
         # If not present in the session state, initialize 'capture_btn_state' to False
         st.session_state['capture_btn_state'] = False
 
+    if "video_btn_state" not in st.session_state:
+        # If not present in the session state, initialize 'video_btn_state' to False
+        st.session_state['video_btn_state'] = False
+
+    # A clicked button turns its own state on and the others off, before anything is shown
+    if capture_button or browse_button or video_button:
+        st.session_state.capture_btn_state = capture_button
+        st.session_state.upload_btn_state = browse_button
+        st.session_state.video_btn_state = video_button
+
     # Check if the "Capture Image" button is clicked or its session state is True
-    if capture_button or st.session_state.capture_btn_state:
-        # Set the session state variable capture_btn_state to True
-        st.session_state.capture_btn_state = True
-        # Set the session state variable upload_btn_state to False
-        st.session_state.upload_btn_state = False
+    if st.session_state.capture_btn_state:
         # Call the capture_image function to handle capturing an image
         capture_image()
 
     # Check if the "Browse Image" button is clicked or its session state is True
-    if browse_button or st.session_state.upload_btn_state:
-        # Set the session state variable upload_btn_state to True
-        st.session_state.upload_btn_state = True
-        # Set the session state variable capture_btn_state to False
-        st.session_state.capture_btn_state = False
+    if st.session_state.upload_btn_state:
         # Call the upload_image function to handle browsing and uploading an image
         upload_image()
 
+    # Check if the "Video Stream" button is clicked or its session state is True
+    if st.session_state.video_btn_state:
+        # Call the video_stream function to handle the continuous grayscale frames
+        video_stream()
 
 if __name__ == '__main__':
+    # needed by the batch worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    # Prometheus metrics and trace of the conversions, when METRICS_PORT or METRICS_DIR is set (started once)
+    instrumentation.export_from_environment()
     main()
@@ -0,0 +1,86 @@
+"""
+Compare the serial and the parallel (process pool) deflate paths of the File Compressor.
+
+Usage:
+    python benchmarks/compression_throughput.py [--size-mb 512] [--workers 4 8 16]
+
+A fixture made of many small text files, a few large text files and one large incompressible
+file is generated in a temporary folder, then archived once with the serial path (workers=1)
+and once per requested worker count. Throughput is reported in MB/s of input data.
+"""
+import os
+import sys
+import time
+import zipfile
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "1- File Compressor"))
+import compression_engine  # noqa: E402
+
+
+def make_fixture(folder, size_mb):
+    """
+    Generate the files to archive and return their paths.
+
+    Parameters:
+    - folder: Path of the folder to write the fixture in.
+    - size_mb: approximate total size of the fixture in MB.
+
+    Returns:
+    - files: list of str file paths.
+    """
+    files = []
+    line = b"2024-01-01 12:00:00 INFO worker-%03d processed request id=%08d status=ok\n"
+    # a quarter of the data as many small compressible files
+    small_count = max(1, size_mb * 4)
+    for i in range(small_count):
+        path = folder / f"small_{i:05d}.log"
+        path.write_bytes(b"".join(line % (i % 100, j) for j in range(800)))
+        files.append(str(path))
+    # half as a few large compressible files
+    for i in range(4):
+        path = folder / f"large_{i}.log"
+        with open(path, "wb") as f:
+            for block in range(size_mb // 8):
+                f.write(b"".join(line % (block % 100, j) for j in range(16000)))
+        files.append(str(path))
+    # a quarter as one incompressible file
+    path = folder / "random.bin"
+    with open(path, "wb") as f:
+        for _ in range(size_mb // 4):
+            f.write(os.urandom(1024 * 1024))
+    files.append(str(path))
+    return files
+
+
+def run_once(files, archive_path, workers):
+    start = time.perf_counter()
+    compression_engine.archive_files(files, archive_path, compression=zipfile.ZIP_DEFLATED, workers=workers)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512, help="approximate fixture size in MB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16],
+                        help="worker counts to compare against the serial path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        files = make_fixture(folder, args.size_mb)
+        input_mb = sum(Path(f).stat().st_size for f in files) / 1e6
+        print(f"Fixture: {len(files)} files, {input_mb:.1f} MB, {os.cpu_count()} CPU(s) available")
+
+        serial_seconds = run_once(files, folder / "serial.zip", 1)
+        print(f"{'workers':>8} {'seconds':>9} {'MB/s':>9} {'speedup':>8}")
+        print(f"{1:>8} {serial_seconds:>9.2f} {input_mb / serial_seconds:>9.1f} {1.0:>8.2f}")
+        for workers in args.workers:
+            seconds = run_once(files, folder / f"parallel_{workers}.zip", workers)
+            print(f"{workers:>8} {seconds:>9.2f} {input_mb / seconds:>9.1f} {serial_seconds / seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Load test the Meter Converter HTTP service on localhost.
+
+Usage:
+    python benchmarks/conversion_service_load.py [--connections 8] [--duration 5] [--batch-size 0]
+    python benchmarks/conversion_service_load.py --port 8765 --no-server   (against a running service)
+
+The service is started in its own process (unless --no-server), then every connection sends
+/convert requests back to back over keep-alive for the given duration. Client-side latencies are
+reported next to the server-side histogram read back from /metrics.
+"""
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+
+SERVICE_PATH = Path(__file__).resolve().parent.parent / "3- Meter Converter" / "conversion_service.py"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request_bytes(method, path, document=None):
+    body = json.dumps(document).encode("utf-8") if document is not None else b""
+    return (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+
+
+async def read_response(reader):
+    # Return (status, body) of one keep-alive response
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    length = 0
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return int(status_line.split(" ")[1]), await reader.readexactly(length)
+
+
+async def fetch(port, method, path, document=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request_bytes(method, path, document))
+    status, body = await read_response(reader)
+    writer.close()
+    return status, json.loads(body)
+
+
+async def wait_until_ready(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await fetch(port, "GET", "/health")
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run_connection(port, payload, deadline, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = request_bytes("POST", "/convert", payload)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        writer.write(request)
+        status, _ = await read_response(reader)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"Unexpected status {status}")
+    writer.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def load_test(port, connections, duration, batch_size):
+    await wait_until_ready(port)
+    if batch_size:
+        payload = {"feet": [i % 100 for i in range(batch_size)], "inches": [i % 12 for i in range(batch_size)]}
+    else:
+        payload = {"feet": 5, "inches": 3}
+    latencies = []
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(run_connection(port, payload, deadline, latencies) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    kind = f"batches of {batch_size}" if batch_size else "single conversions"
+    print(f"{len(latencies):,} requests ({kind}) over {connections} connection(s) in {elapsed:.1f} s: "
+          f"{len(latencies) / elapsed:,.0f} requests/s")
+    print(f"client  p50 {percentile(latencies, 0.5) * 1000:.3f} ms  p90 {percentile(latencies, 0.9) * 1000:.3f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.3f} ms  max {latencies[-1] * 1000:.3f} ms")
+    _, metrics = await fetch(port, "GET", "/metrics")
+    server = metrics["/convert"]
+    print(f"server  p50 {server['p50_ms']:.3f} ms  p90 {server['p90_ms']:.3f} ms  "
+          f"p99 {server['p99_ms']:.3f} ms  max {server['max_ms']:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=8, help="number of concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load")
+    parser.add_argument("--batch-size", type=int, default=0, help="values per request (0 for single conversions)")
+    parser.add_argument("--port", type=int, default=None, help="port of the service (a free one by default)")
+    parser.add_argument("--no-server", action="store_true", help="use an already running service on --port")
+    args = parser.parse_args()
+
+    port = args.port or free_port()
+    server = None
+    if not args.no_server:
+        server = subprocess.Popen([sys.executable, str(SERVICE_PATH), "--port", str(port)],
+                                  cwd=SERVICE_PATH.parent, stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(load_test(port, args.connections, args.duration, args.batch_size))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Run the benchmarks of the four apps' hot paths and compare them against a saved baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--cases archive extract conversion grayscale large_image]
+                                        [--size-mb 64] [--baseline benchmarks/baseline.json]
+                                        [--save-baseline] [--tolerance 0.2]
+
+Cases, all on generated fixtures and without the Qt or Streamlit UIs:
+- archive: the File Compressor's archive_files() on many small files, a few large ones and
+  an incompressible one (the fixture of compression_throughput.py), deflated.
+- extract: the Archive Extractor's extract() of that archive.
+- conversion: the Meter Converter's vectorized feet/inches conversion, and the latency of
+  single unit conversions and quantity parsing.
+- grayscale: the Webcam App's cached conversion (a 12 MP JPEG and PNG shown in the page) and
+  a full resolution conversion.
+- large_image: the Webcam App's tiled conversion of a 51 MP uncompressed scan.
+
+Every case runs in its own process, so its peak memory (RSS) is measured alone. The results
+are written as JSON (benchmarks/results/latest.json by default). With a baseline, every
+throughput, median latency and peak memory is compared against it and the run fails (exit code
+1) if one got worse by more than the tolerance; the p95/p99 latencies are recorded but too noisy
+to gate on. Results of another fixture size or CPU count are not compared. --save-baseline makes
+the current results the new baseline.
+"""
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+from pathlib import Path
+import numpy as np
+
+# Peak memory of the case processes, not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCHMARKS_FOLDER = Path(__file__).resolve().parent
+ROOT_FOLDER = BENCHMARKS_FOLDER.parent
+for app_folder in ("1- File Compressor", "2- Archive Extractor", "3- Meter Converter", "4- Webcam App"):
+    sys.path.insert(0, str(ROOT_FOLDER / app_folder))
+
+# Where results and the baseline are kept by default
+RESULTS_PATH = BENCHMARKS_FOLDER / "results" / "latest.json"
+BASELINE_PATH = BENCHMARKS_FOLDER / "baseline.json"
+# Relative slowdown tolerated before a metric counts as a regression
+TOLERANCE = 0.2
+# Single calls timed for the latency percentiles
+LATENCY_SAMPLES = 20000
+# Run settings that have to match the baseline's for the metrics to be comparable
+COMPARED_META = ("size_mb", "cpus")
+
+
+def metric(value, unit, higher_is_better, gated=True):
+    # Metrics that are not gated are only recorded, never counted as regressions
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better, "gated": gated}
+
+
+def latency_metrics(name, durations_ns):
+    # p50/p95/p99 of single call durations, in microseconds
+    durations = np.asarray(durations_ns, dtype=np.float64) / 1000
+    return {f"{name}_p{p}_us": metric(float(np.percentile(durations, p)), "us", False, gated=p == 50)
+            for p in (50, 95, 99)}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def make_test_image(width, height, seed=0):
+    """
+    Return an RGB array with smooth gradients and noise, neither trivial nor impossible to compress.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 8 * np.pi, width, dtype=np.float32)
+    y = np.linspace(0, 6 * np.pi, height, dtype=np.float32)[:, None]
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = np.sin(x + y) * 100 + 128
+    pixels[..., 1] = np.cos(x * 0.5) * 100 + 128
+    pixels[..., 2] = np.sin(y * 1.5) * 100 + 128
+    pixels += rng.integers(0, 24, pixels.shape, dtype=np.uint8)
+    return pixels
+
+
+def make_archive(folder, size_mb):
+    # the File Compressor fixture, archived; returns (files, their total size, archive path, seconds)
+    import compression_engine
+    from compression_throughput import make_fixture
+
+    files = make_fixture(folder, size_mb)
+    input_bytes = sum(Path(f).stat().st_size for f in files)
+    archive_path = folder / "fixture.zip"
+    seconds = timed(compression_engine.archive_files, files, archive_path, compression=zipfile.ZIP_DEFLATED)
+    return files, input_bytes, archive_path, seconds
+
+
+def case_archive(folder, args):
+    files, input_bytes, _, seconds = make_archive(folder, args.size_mb)
+    return {"throughput_mb_s": metric(input_bytes / 1e6 / seconds, "MB/s", True),
+            "files_per_s": metric(len(files) / seconds, "files/s", True)}
+
+
+def case_extract(folder, args):
+    import archive_backends
+
+    files, input_bytes, archive_path, _ = make_archive(folder, args.size_mb)
+    # the fixture itself isn't needed anymore, only the archive
+    for filepath in files:
+        os.remove(filepath)
+    seconds = timed(archive_backends.extract, archive_path, folder / "extracted")
+    return {"throughput_mb_s": metric(input_bytes / 1e6 / seconds, "MB/s", True),
+            "files_per_s": metric(len(files) / seconds, "files/s", True)}
+
+
+def case_conversion(folder, args):
+    import conversion_core
+    from unit_registry import REGISTRY
+
+    rng = np.random.default_rng(0)
+    feet = rng.uniform(0, 1000, 10_000_000)
+    inches = rng.uniform(0, 12, feet.size)
+    out = np.empty_like(feet)
+    seconds = timed(conversion_core.feet_inches_to_meters, feet, inches, out=out)
+    results = {"array_conversions_per_s": metric(feet.size / seconds, "values/s", True)}
+
+    convert = REGISTRY.convert
+    durations = []
+    for i in range(LATENCY_SAMPLES):
+        start = time.perf_counter_ns()
+        convert(i, "ft", "m")
+        durations.append(time.perf_counter_ns() - start)
+    results.update(latency_metrics("convert", durations))
+
+    # distinct texts, far more than the parse cache holds
+    texts = [f"{i} ft {i % 12} in" for i in range(LATENCY_SAMPLES)]
+    durations = []
+    for text in texts:
+        start = time.perf_counter_ns()
+        conversion_core.parse_length(text)
+        durations.append(time.perf_counter_ns() - start)
+    results.update(latency_metrics("parse", durations))
+    return results
+
+
+def case_grayscale(folder, args):
+    from PIL import Image
+    from image_pipeline import GrayscaleCache, decode_image, to_grayscale
+
+    image = Image.fromarray(make_test_image(4000, 3000))
+    results = {}
+    for image_format in ("JPEG", "PNG"):
+        encoded = io.BytesIO()
+        image.save(encoded, image_format)
+        encoded = encoded.getvalue()
+        # nothing is kept in the cache, every call is a miss: decode, downscale and convert
+        cache = GrayscaleCache(max_bytes=0)
+        durations = []
+        for _ in range(args.repeat):
+            start = time.perf_counter_ns()
+            cache.get(encoded)
+            durations.append(time.perf_counter_ns() - start)
+        results.update(latency_metrics(f"preview_{image_format.lower()}", durations))
+
+    pixels = decode_image(encoded, max_side=None)
+    seconds = min(timed(to_grayscale, pixels) for _ in range(args.repeat))
+    results["full_resolution_mpixels_s"] = metric(pixels.shape[0] * pixels.shape[1] / 1e6 / seconds, "MP/s", True)
+    return results
+
+
+def case_large_image(folder, args):
+    from large_image import convert_large_image
+
+    width, height = 8000, 6400
+    image_path = folder / "scan.ppm"
+    # written in bands, the fixture itself must not take the memory being measured
+    band = make_test_image(width, 640)
+    with open(image_path, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % (width, height))
+        for _ in range(height // len(band)):
+            f.write(band.tobytes())
+    seconds = timed(convert_large_image, image_path, folder / "scan_grayscale.tif")
+    return {"mpixels_s": metric(width * height / 1e6 / seconds, "MP/s", True)}
+
+
+CASES = {"archive": case_archive, "extract": case_extract, "conversion": case_conversion,
+         "grayscale": case_grayscale, "large_image": case_large_image}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(name, args):
+    # Run one case in this process and print its metrics as JSON (the child side of run_in_process)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = CASES[name](Path(tmp), args)
+    rss = peak_rss_mb()
+    if rss is not None:
+        results["peak_rss_mb"] = metric(rss, "MB", False)
+    print(json.dumps(results))
+
+
+def run_in_process(name, args):
+    """
+    Run one case in a fresh Python process and return its metrics.
+    """
+    command = [sys.executable, __file__, "--run-case", name, "--size-mb", str(args.size_mb),
+               "--repeat", str(args.repeat)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Case {name} failed:\n{completed.stderr}")
+    # the metrics are the last line, anything printed before is the case's own output
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def mismatched_meta(results, baseline):
+    """
+    Return the run settings that differ from the baseline's, as printable lines.
+    """
+    return [f"{key}: {baseline.get('meta', {}).get(key)} in the baseline, {results['meta'].get(key)} now"
+            for key in COMPARED_META if baseline.get("meta", {}).get(key) != results["meta"].get(key)]
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of results against a baseline, as printable lines.
+    """
+    regressions = []
+    for case, metrics in results["cases"].items():
+        for name, current in metrics.items():
+            if not current.get("gated", True):
+                continue
+            previous = baseline.get("cases", {}).get(case, {}).get(name)
+            if previous is None or not previous["value"]:
+                continue
+            change = current["value"] / previous["value"] - 1
+            worse = -change if current["higher_is_better"] else change
+            if worse > tolerance:
+                regressions.append(f"{case}.{name}: {previous['value']:.4g} -> {current['value']:.4g} "
+                                   f"{current['unit']} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES), help="cases to run")
+    parser.add_argument("--size-mb", type=int, default=64, help="approximate size of the archive fixture in MB")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of the image conversions")
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH, help="JSON file to write the results to")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative change counted as a regression (0.2 = 20%%)")
+    parser.add_argument("--run-case", choices=list(CASES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args.run_case, args)
+        return 0
+
+    results = {"meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "size_mb": args.size_mb},
+               "cases": {}}
+    for name in args.cases:
+        print(f"{name}...", flush=True)
+        results["cases"][name] = run_in_process(name, args)
+        for metric_name, value in results["cases"][name].items():
+            print(f"  {metric_name:<28} {value['value']:>12.4g} {value['unit']}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print("No baseline to compare against, save one with --save-baseline.")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    mismatches = mismatched_meta(results, baseline)
+    if mismatches:
+        print(f"Not comparable with {args.baseline}:")
+        for line in mismatches:
+            print(f"  {line}")
+        return 1
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regression beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Measure the throughput of the Meter Converter unit registry.
+
+Usage:
+    python benchmarks/unit_conversion_throughput.py [--count 1000000] [--array-size 10000000]
+
+Repeated single conversions (float and exact), composite quantity parsing and the vectorized
+array conversion are timed separately. Throughput is reported in conversions per second.
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "3- Meter Converter"))
+import conversion_core  # noqa: E402
+from unit_registry import REGISTRY  # noqa: E402
+
+
+def run_once(function, count):
+    start = time.perf_counter()
+    function(count)
+    return time.perf_counter() - start
+
+
+def float_conversions(count):
+    convert = REGISTRY.convert
+    for i in range(count):
+        convert(i, "ft", "m")
+
+
+def exact_conversions(count):
+    convert = REGISTRY.convert
+    for i in range(count):
+        convert(i, "ft", "m", exact=True)
+
+
+def composite_parsing(count):
+    parse = REGISTRY.parse
+    for i in range(count):
+        parse("5 ft 3 in", "m")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000, help="number of single conversions per case")
+    parser.add_argument("--array-size", type=int, default=10_000_000, help="number of rows of the array case")
+    args = parser.parse_args()
+
+    print(f"{'case':>22} {'count':>12} {'seconds':>9} {'per second':>14}")
+    cases = [("float convert()", float_conversions, args.count),
+             ("exact convert()", exact_conversions, args.count // 10),
+             ("parse('5 ft 3 in')", composite_parsing, args.count // 10)]
+    for name, function, count in cases:
+        seconds = run_once(function, count)
+        print(f"{name:>22} {count:>12,} {seconds:>9.2f} {count / seconds:>14,.0f}")
+
+    rng = np.random.default_rng(0)
+    feet = rng.random(args.array_size) * 1000
+    inches = rng.random(args.array_size) * 12
+    meters = np.empty_like(feet)
+    start = time.perf_counter()
+    conversion_core.feet_inches_to_meters(feet, inches, out=meters)
+    seconds = time.perf_counter() - start
+    print(f"{'numpy arrays':>22} {args.array_size:>12,} {seconds:>9.2f} {args.array_size / seconds:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Metrics shared by the apps: spans and counters around the archive, extract, convert and
+grayscale operations, exported in the Prometheus text format and as a Chrome trace.
+
+Usage (any app, the launcher or the Streamlit app):
+    METRICS_PORT=9464 python launcher.py      # http://127.0.0.1:9464/metrics and /trace
+    METRICS_DIR=metrics python launcher.py    # metrics/metrics.prom and metrics/trace.json
+
+Files in METRICS_DIR are rewritten every few seconds and at exit (the Prometheus node
+exporter's textfile collector can read metrics.prom); trace.json opens in chrome://tracing
+or https://ui.perfetto.dev.
+
+Recording happens once per operation (per archive, per image...), never per chunk or pixel,
+and costs a clock read, a lock and a few dictionary updates: it stays on in production.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+from collections import deque
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "assorted_apps_"
+# Upper bounds (seconds) of the span duration histograms, from sub-millisecond requests to long archives
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1, 2.5, 5, 10, 30, 60, 300)
+# Spans kept for the trace, the oldest are dropped first (a few MB, minutes of video frames)
+TRACE_MAX_EVENTS = 10_000
+# Seconds between two rewrites of the files in METRICS_DIR
+EXPORT_INTERVAL = 15
+
+
+class Histogram:
+    """
+    Cumulative-ready histogram over fixed bucket bounds, as Prometheus expects them.
+    """
+
+    def __init__(self, bounds=DURATION_BUCKETS):
+        self.bounds = bounds
+        # one more bucket for the values above the last bound (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+class Span:
+    """
+    Timed section of an operation, recorded when the `with` block ends.
+
+    Arguments given to span() or set() while it runs are shown with it in the trace viewer;
+    `seconds` holds its duration once it ended.
+    """
+    __slots__ = ("metrics", "name", "args", "start", "seconds")
+
+    def __init__(self, metrics, name, args):
+        self.metrics = metrics
+        self.name = name
+        self.args = args
+        self.start = 0
+        self.seconds = 0.0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        self.seconds = (end - self.start) / 1e9
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.metrics.end_span(self, end)
+        return False
+
+
+def _label_text(labels):
+    # {name="value",...} of a labels tuple, escaped as the text format wants
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """
+    Registry of the counters, gauges, span histograms and trace events of this process.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.events = deque(maxlen=TRACE_MAX_EVENTS)
+        self.thread_names = {}
+        # callables refreshing gauges from state kept elsewhere (cache statistics...), run on export
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        """
+        Add `value` to a counter (a name ending with _total by convention).
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Add a value (seconds, by the default bounds) to a histogram.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._observe(key, value)
+
+    def _observe(self, key, value):
+        # called with the lock held
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def span(self, name, **args):
+        """
+        Return a Span to use as `with metrics.span("archive", files=3) as span:`.
+
+        Its duration goes to the <name>_duration_seconds histogram, and the span to the trace.
+        """
+        return Span(self, name, args)
+
+    def end_span(self, span, end):
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        key = (f"{span.name}_duration_seconds", (("status", "error" if "error" in span.args else "ok"),))
+        with self._lock:
+            self._observe(key, span.seconds)
+            self.thread_names[thread.ident] = thread.name
+            # kept as a tuple, turned into a Chrome trace event only when the trace is exported
+            self.events.append((span.name, span.start, end, thread.ident, span.args))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.events.clear()
+
+    def prometheus_text(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        for collector in self.collectors:
+            collector()
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+                    lines.extend(f"{METRIC_PREFIX}{name}{_label_text(labels)} {value}"
+                                 for (key_name, labels), value in values.items() if key_name == name)
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                for (key_name, labels), histogram in self.histograms.items():
+                    if key_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{METRIC_PREFIX}{name}_bucket{_label_text(labels + (('le', bound),))} "
+                                     f"{cumulative}")
+                    lines.append(f"{METRIC_PREFIX}{name}_sum{_label_text(labels)} {histogram.total}")
+                    lines.append(f"{METRIC_PREFIX}{name}_count{_label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self):
+        """
+        Return the recorded spans as a Chrome trace document (JSON object format).
+        """
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+        pid = os.getpid()
+        metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}}
+                    for ident, name in thread_names.items()]
+        # complete events, times in microseconds
+        spans = [{"name": name, "ph": "X", "ts": start / 1000, "dur": (end - start) / 1000, "pid": pid,
+                  "tid": ident, "args": args}
+                 for name, start, end, ident, args in events]
+        return {"traceEvents": metadata + spans, "displayTimeUnit": "ms"}
+
+    def write_files(self, folder):
+        """
+        Write metrics.prom and trace.json into a folder, each replaced in one step.
+        """
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        for name, text in (("metrics.prom", self.prometheus_text()),
+                           ("trace.json", json.dumps(self.chrome_trace(), default=str))):
+            # written next to the file then swapped in, a reader never sees half a file
+            temp_path = folder / f"{name}.{os.getpid()}.tmp"
+            temp_path.write_text(text, encoding="utf-8")
+            temp_path.replace(folder / name)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serve /metrics (Prometheus text) and /trace (Chrome trace) from a background thread.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = metrics.prometheus_text().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/trace":
+                    body = json.dumps(metrics.chrome_trace(), default=str).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # scraped every few seconds, not worth a line each time
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Metrics of this process, recorded by every app
+METRICS = Metrics()
+count = METRICS.count
+set_gauge = METRICS.set_gauge
+observe = METRICS.observe
+span = METRICS.span
+add_collector = METRICS.add_collector
+
+_exporting = False
+
+
+def record_operation(operation, seconds, files, bytes_in, bytes_out, compressed=None):
+    """
+    Count the files and bytes of a finished operation and set its rate gauges.
+
+    Parameters:
+    - operation: name of the operation ("archive", "extract"...), prefix of the metric names.
+    - seconds: duration of the operation.
+    - files: files (or members, rows...) processed.
+    - bytes_in, bytes_out: bytes read and written.
+    - compressed: "in" or "out", the compressed side, to set <operation>_compression_ratio
+      (uncompressed size over compressed size).
+    """
+    count(f"{operation}_operations_total")
+    count(f"{operation}_files_total", files)
+    count(f"{operation}_bytes_in_total", bytes_in)
+    count(f"{operation}_bytes_out_total", bytes_out)
+    if seconds > 0:
+        set_gauge(f"{operation}_files_per_second", files / seconds)
+        set_gauge(f"{operation}_bytes_per_second", bytes_in / seconds)
+    if compressed == "out" and bytes_out:
+        set_gauge(f"{operation}_compression_ratio", bytes_in / bytes_out)
+    elif compressed == "in" and bytes_in:
+        set_gauge(f"{operation}_compression_ratio", bytes_out / bytes_in)
+
+
+def export_from_environment():
+    """
+    Start the exports asked for by the METRICS_PORT and METRICS_DIR environment variables, once.
+    """
+    global _exporting
+    if _exporting:
+        return
+    _exporting = True
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        try:
+            METRICS.serve(int(port), os.environ.get("METRICS_HOST", "127.0.0.1"))
+        except (OSError, ValueError) as e:
+            print(f"Metrics endpoint not started on port {port}: {e}", file=sys.stderr)
+    folder = os.environ.get("METRICS_DIR")
+    if folder:
+        def export_periodically():
+            while True:
+                time.sleep(EXPORT_INTERVAL)
+                METRICS.write_files(folder)
+
+        threading.Thread(target=export_periodically, daemon=True).start()
+        atexit.register(METRICS.write_files, folder)
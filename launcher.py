@@ -0,0 +1,228 @@
+"""
+Launcher hosting the PyQt tools (File Compressor, Archive Extractor, Meter Converter) in one process.
+
+Usage:
+    python launcher.py [--open compressor|extractor|converter]
+    python launcher.py --measure
+
+The QApplication is created once and stays warm, optionally resident in the system tray.
+A tool's script is only imported the first time its window is opened, so its heavy modules
+(archive backends, NumPy...) are not loaded for the tools that are never used; later opens
+only build a new window. Every open is timed, cold (first open, with the imports) and warm.
+
+--measure prints the startup time of each tool as a separate script (a new Python process,
+as when running it directly) next to its cold and warm open times in the launcher.
+"""
+import sys
+import time
+
+# the launcher's own startup is measured from here
+PROCESS_STARTED = time.perf_counter()
+
+import argparse
+import subprocess
+import importlib.util
+import multiprocessing
+from pathlib import Path
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QAction
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
+                             QLabel, QPushButton, QMenu, QStyle, QSystemTrayIcon)
+import instrumentation
+
+
+ROOT_FOLDER = Path(__file__).resolve().parent
+# Tools hosted by the launcher: key -> (window title, script defining its MainWindow)
+TOOLS = {
+    "compressor": ("File Compressor", ROOT_FOLDER / "1- File Compressor" / "file_compressor.py"),
+    "extractor": ("Archive Extractor", ROOT_FOLDER / "2- Archive Extractor" / "archive_extractor.py"),
+    "converter": ("Meter Converter", ROOT_FOLDER / "3- Meter Converter" / "meter_converter.py"),
+}
+# Warm opens averaged by --measure
+MEASURE_RUNS = 5
+# Runs a tool's script as `python <script>` would, except that the event loop returns once the
+# window is shown, so --measure times the tool's own startup
+STANDALONE_RUNNER = (
+    "import sys, runpy\n"
+    "from PyQt6.QtWidgets import QApplication\n"
+    "QApplication.exec = lambda self: QApplication.processEvents() or 0\n"
+    "sys.argv = [sys.argv[1]]\n"
+    "sys.path.insert(0, sys.argv[0].rpartition('/')[0])\n"
+    "runpy.run_path(sys.argv[0], run_name='__main__')\n"
+)
+
+
+def load_tool_module(script_path):
+    """
+    Import a tool's script from its path, once (the app folders have spaces, they aren't packages).
+    """
+    module_name = script_path.stem
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    # the tools import their sibling modules by plain name
+    sys.path.insert(0, str(script_path.parent))
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+class LauncherWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+
+        self.setWindowTitle("Assorted Tools")
+        # Set fixed window size
+        self.setFixedSize(320, 260)
+
+        # Set theme (custom style sheet), the same as the tools
+        self.setStyleSheet("""
+            background-color: #344955;
+            color: #fff;
+            font-size: 16px;
+            font-weight: bold;
+        """)
+
+        # open tool windows by key, a closed window is deleted and built again on the next open
+        self.windows = {}
+        # seconds taken by every open of a tool, the first one is the cold open
+        self.open_times = {key: [] for key in TOOLS}
+
+        layout = QVBoxLayout()
+        for key, (title, _) in TOOLS.items():
+            button = QPushButton(title)
+            button.setStyleSheet(
+                "background-color: #FF5733;")
+            button.clicked.connect(lambda _, key=key: self.open_tool(key))
+            layout.addWidget(button)
+        self.status_label = QLabel("")
+        self.status_label.setStyleSheet("font-size: 12px; font-weight: normal;")
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+        # Stay resident in the tray when there is one: closing the launcher only hides it
+        self.tray_icon = None
+        if QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray_icon = QSystemTrayIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon), self)
+            self.tray_icon.setToolTip("Assorted Tools")
+            tray_menu = QMenu(self)
+            for key, (title, _) in TOOLS.items():
+                action = QAction(title, tray_menu)
+                action.triggered.connect(lambda _, key=key: self.open_tool(key))
+                tray_menu.addAction(action)
+            tray_menu.addSeparator()
+            show_action = QAction("Show launcher", tray_menu)
+            show_action.triggered.connect(self.show_launcher)
+            tray_menu.addAction(show_action)
+            quit_action = QAction("Quit", tray_menu)
+            quit_action.triggered.connect(QApplication.quit)
+            tray_menu.addAction(quit_action)
+            self.tray_icon.setContextMenu(tray_menu)
+            self.tray_icon.activated.connect(self.on_tray_activated)
+            self.tray_icon.show()
+            QApplication.instance().setQuitOnLastWindowClosed(False)
+
+    def open_tool(self, key):
+        """
+        Show a tool's window, importing the tool on its first use, and return the window.
+        """
+        window = self.windows.get(key)
+        if window is not None:
+            # already open, bring it to the front
+            window.showNormal()
+            window.raise_()
+            window.activateWindow()
+            return window
+
+        start = time.perf_counter()
+        module = load_tool_module(TOOLS[key][1])
+        window = module.MainWindow()
+        window.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        window.destroyed.connect(lambda _=None, key=key: self.windows.pop(key, None))
+        window.show()
+        elapsed = time.perf_counter() - start
+
+        self.windows[key] = window
+        self.open_times[key].append(elapsed)
+        kind = "cold" if len(self.open_times[key]) == 1 else "warm"
+        instrumentation.observe("tool_open_seconds", elapsed, tool=key, start=kind)
+        self.status_label.setText(f"{TOOLS[key][0]} opened in {elapsed * 1000:.0f} ms ({kind})")
+        return window
+
+    def show_launcher(self):
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def on_tray_activated(self, reason):
+        if reason == QSystemTrayIcon.ActivationReason.Trigger:
+            self.show_launcher()
+
+    def closeEvent(self, event):
+        # With a tray icon the launcher stays resident, "Quit" in the tray menu ends it
+        if self.tray_icon is not None:
+            event.ignore()
+            self.hide()
+            return
+        super().closeEvent(event)
+
+
+def standalone_startup(key):
+    """
+    Return the seconds taken by a new Python process running a tool's script to show its window.
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", STANDALONE_RUNNER, TOOLS[key][1].as_posix()], check=True)
+    return time.perf_counter() - start
+
+
+def measure(launcher):
+    # Print the standalone, cold and warm startup times of every tool
+    print(f"Launcher ready in {(time.perf_counter() - PROCESS_STARTED) * 1000:.0f} ms "
+          f"(after the interpreter started)")
+    print(f"{'tool':<18} {'standalone':>11} {'cold open':>10} {'warm open':>10}")
+    for key, (title, _) in TOOLS.items():
+        standalone = standalone_startup(key)
+        for _ in range(MEASURE_RUNS + 1):
+            launcher.open_tool(key).close()
+            QApplication.processEvents()
+        cold, *warm = launcher.open_times[key]
+        print(f"{title:<18} {standalone * 1000:>8.0f} ms {cold * 1000:>7.0f} ms "
+              f"{sum(warm) / len(warm) * 1000:>7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--open", choices=list(TOOLS), help="tool to open at startup")
+    parser.add_argument("--measure", action="store_true", help="print the startup times of the tools and exit")
+    args = parser.parse_args()
+
+    # Prometheus metrics and trace of every tool opened, when METRICS_PORT or METRICS_DIR is set
+    instrumentation.export_from_environment()
+    app = QApplication(sys.argv)
+    launcher = LauncherWindow()
+    if args.measure:
+        measure(launcher)
+        return 0
+    if args.open:
+        launcher.open_tool(args.open)
+    else:
+        launcher.show()
+    print(f"Launcher ready in {(time.perf_counter() - PROCESS_STARTED) * 1000:.0f} ms")
+    # using sys.exit(app.exec()) ensures the PyQt application closes cleanly
+    return app.exec()
+
+
+if __name__ == "__main__":
+    # needed by the compression and extraction worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    sys.exit(main())
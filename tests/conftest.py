@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The app folders have spaces in their names and aren't packages, their modules import each
+# other by plain name as when the apps run
+ROOT_FOLDER = Path(__file__).resolve().parent.parent
+for app_folder in ("1- File Compressor", "2- Archive Extractor", "3- Meter Converter", "4- Webcam App"):
+    sys.path.insert(0, str(ROOT_FOLDER / app_folder))
+sys.path.insert(0, str(ROOT_FOLDER))
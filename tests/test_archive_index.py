@@ -0,0 +1,71 @@
+import json
+import zipfile
+import pytest
+import compression_engine
+from archive_index import INDEX_FILE_NAME, MANIFEST_NAME
+from compression_engine import NothingChanged
+
+
+def incremental_archive(sources, destination, name):
+    archive_path = destination / name
+    compression_engine.archive_files(sources, archive_path, index_path=destination / INDEX_FILE_NAME)
+    with zipfile.ZipFile(archive_path) as zipf:
+        manifest = [json.loads(line) for line in zipf.read(MANIFEST_NAME).splitlines()]
+        return set(zipf.namelist()) - {MANIFEST_NAME}, {entry["path"]: entry["archive"] for entry in manifest}
+
+
+def test_only_changed_files_are_written(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    (folder / "a.txt").write_text("a")
+    (folder / "b.txt").write_text("b")
+
+    members, manifest = incremental_archive([folder], tmp_path, "first.zip")
+    assert members == {"docs/a.txt", "docs/b.txt"} and manifest == {}
+
+    (folder / "b.txt").write_text("changed")
+    members, manifest = incremental_archive([folder], tmp_path, "second.zip")
+    assert members == {"docs/b.txt"}
+    assert manifest == {"docs/a.txt": "first.zip"}
+
+
+def test_nothing_changed_writes_no_archive(tmp_path):
+    source = tmp_path / "a.txt"
+    source.write_text("a")
+    incremental_archive([source], tmp_path, "first.zip")
+    with pytest.raises(NothingChanged):
+        incremental_archive([source], tmp_path, "second.zip")
+    assert not (tmp_path / "second.zip").exists()
+    assert not (tmp_path / "second.zip.part").exists()
+
+
+def test_sources_sharing_a_name_are_tracked_separately(tmp_path):
+    first, second = tmp_path / "x" / "notes.txt", tmp_path / "y" / "notes.txt"
+    for path in (first, second):
+        path.parent.mkdir()
+        path.write_text(str(path))
+    incremental_archive([first, second], tmp_path, "first.zip")
+
+    second.write_text("changed")
+    members, manifest = incremental_archive([first, second], tmp_path, "second.zip")
+    assert members == {"notes_2.txt"}
+    assert manifest == {"notes.txt": "first.zip"}
+
+
+def test_manifest_names_the_member_holding_the_content(tmp_path):
+    first, second, other = tmp_path / "x" / "notes.txt", tmp_path / "y" / "notes.txt", tmp_path / "c.txt"
+    for path in (first, second, other):
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(str(path))
+    incremental_archive([first, second, other], tmp_path, "first.zip")
+
+    # the reversed selection swaps the names of the two notes
+    other.write_text("changed")
+    incremental_archive([second, first, other], tmp_path, "second.zip")
+    with zipfile.ZipFile(tmp_path / "second.zip") as zipf:
+        manifest = {entry["path"]: entry for entry in map(json.loads, zipf.read(MANIFEST_NAME).splitlines())}
+    with zipfile.ZipFile(tmp_path / "first.zip") as zipf:
+        for name, source in (("notes.txt", second), ("notes_2.txt", first)):
+            entry = manifest[name]
+            assert entry["archive"] == "first.zip"
+            assert zipf.read(entry["member"]) == source.read_bytes()
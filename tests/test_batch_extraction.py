@@ -0,0 +1,49 @@
+import time
+import zipfile
+import extraction_engine
+from batch_extraction import BatchScheduler, ExtractionJob
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as zipf:
+        for name, data in members.items():
+            zipf.writestr(name, data)
+
+
+def test_worker_handle_is_reopened_when_the_archive_is_replaced(tmp_path):
+    archive_path = tmp_path / "data.zip"
+    make_zip(archive_path, {"a.txt": "old"})
+    extraction_engine.extract_batch(str(archive_path), ["a.txt"], tmp_path / "first")
+
+    make_zip(archive_path, {"a.txt": "new content", "b.txt": "b"})
+    extraction_engine.extract_batch(str(archive_path), ["a.txt", "b.txt"], tmp_path / "second")
+    assert (tmp_path / "second" / "a.txt").read_text() == "new content"
+
+
+def test_worker_keeps_a_bounded_number_of_handles(tmp_path):
+    for index in range(extraction_engine.WORKER_ARCHIVES_MAX + 3):
+        archive_path = tmp_path / f"{index}.zip"
+        make_zip(archive_path, {"a.txt": str(index)})
+        extraction_engine.extract_batch(str(archive_path), ["a.txt"], tmp_path / str(index))
+    assert len(extraction_engine._worker_archives) == extraction_engine.WORKER_ARCHIVES_MAX
+
+
+def test_scheduler_extracts_jobs_and_shuts_down_without_blocking(tmp_path):
+    scheduler = BatchScheduler(workers=1)
+    jobs = []
+    for index in range(3):
+        archive_path = tmp_path / f"{index}.zip"
+        make_zip(archive_path, {"a.txt": str(index)})
+        jobs.append(ExtractionJob(archive_path, tmp_path / "out" / str(index)))
+        scheduler.add(jobs[-1])
+    deadline = time.monotonic() + 30
+    while scheduler.is_busy() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [job.status for job in jobs] == ["Done"] * 3
+    assert (tmp_path / "out" / "2" / "a.txt").read_text() == "2"
+
+    started = time.monotonic()
+    thread = scheduler.shutdown()
+    assert time.monotonic() - started < 0.5
+    thread.join(30)
+    assert not thread.is_alive()
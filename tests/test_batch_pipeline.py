@@ -0,0 +1,43 @@
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+import batch_pipeline
+
+
+def png_bytes(width, height, value):
+    encoded = io.BytesIO()
+    Image.fromarray(np.full((height, width, 3), value, dtype=np.uint8)).save(encoded, "PNG")
+    return encoded.getvalue()
+
+
+def test_batch_converts_writes_and_zips(tmp_path):
+    items = [(f"photos/{index}.jpg", png_bytes(40, 30, index * 20)) for index in range(5)]
+    items.append(("broken.jpg", b"not an image"))
+    with ThreadPoolExecutor(2) as executor:
+        results = list(batch_pipeline.process_batch(items, executor, 2))
+
+    failed = [name for name, png, _ in results if png is None]
+    assert failed == ["broken.jpg"]
+    names = []
+    for name, png, thumbnail in results:
+        if png is not None:
+            batch_pipeline.write_result(tmp_path, name, png)
+            names.append(name)
+            assert Image.open(io.BytesIO(png)).mode == "L"
+            assert Image.open(io.BytesIO(thumbnail)).format == "JPEG"
+
+    zip_path = batch_pipeline.build_zip(tmp_path, names)
+    assert zip_path == tmp_path / batch_pipeline.ZIP_NAME
+    assert not (tmp_path / (batch_pipeline.ZIP_NAME + ".part")).exists()
+    with zipfile.ZipFile(zip_path) as zipf:
+        assert sorted(zipf.namelist()) == sorted(names)
+        assert zipf.testzip() is None
+
+
+def test_names_stay_inside_the_batch_folder():
+    assert batch_pipeline.safe_name("../../etc/passwd") == "etc/passwd"
+    assert batch_pipeline.safe_name("C:\\photos\\a.png") == "photos/a.png"
+    used = set()
+    assert [batch_pipeline.unique_name("a.png", used) for _ in range(3)] == ["a.png", "a_2.png", "a_3.png"]
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import run_benchmarks
+from run_benchmarks import metric, compare, mismatched_meta
+
+
+def make_results(p50, p99, throughput, size_mb=64, cpus=8):
+    return {"meta": {"size_mb": size_mb, "cpus": cpus},
+            "cases": {"conversion": {"parse_p50_us": metric(p50, "us", False),
+                                     "parse_p99_us": metric(p99, "us", False, gated=False),
+                                     "array_conversions_per_s": metric(throughput, "values/s", True)}}}
+
+
+def test_tail_latencies_are_not_gated():
+    baseline = make_results(10.0, 20.0, 1e6)
+    assert compare(make_results(10.5, 80.0, 1e6), baseline, 0.2) == []
+
+
+def test_median_and_throughput_regressions_are_reported():
+    baseline = make_results(10.0, 20.0, 1e6)
+    regressions = compare(make_results(13.0, 20.0, 7e5), baseline, 0.2)
+    assert [line.split(":")[0] for line in regressions] == ["conversion.parse_p50_us",
+                                                           "conversion.array_conversions_per_s"]
+
+
+def test_latency_percentiles_gate_only_the_median():
+    metrics = run_benchmarks.latency_metrics("parse", [1000, 2000, 3000])
+    assert {name: value["gated"] for name, value in metrics.items()} == {
+        "parse_p50_us": True, "parse_p95_us": False, "parse_p99_us": False}
+
+
+def test_other_fixture_size_or_cpu_count_is_not_comparable():
+    baseline = make_results(10.0, 20.0, 1e6)
+    assert mismatched_meta(make_results(10.0, 20.0, 1e6), baseline) == []
+    assert len(mismatched_meta(make_results(10.0, 20.0, 1e6, size_mb=16, cpus=4), baseline)) == 2
@@ -0,0 +1,74 @@
+import os
+import zipfile
+import pytest
+import compression_engine
+
+
+@pytest.fixture
+def sources(tmp_path):
+    # a file split into several parallel blocks, a small one, an empty one and random bytes
+    folder = tmp_path / "sources"
+    folder.mkdir()
+    (folder / "big.txt").write_bytes(b"line of text that compresses well\n" * 400_000)
+    (folder / "small.txt").write_text("hello")
+    (folder / "empty.txt").write_bytes(b"")
+    (folder / "random.bin").write_bytes(os.urandom(300_000))
+    return folder
+
+
+def read_members(archive_path):
+    with zipfile.ZipFile(archive_path) as zipf:
+        assert zipf.testzip() is None
+        return {name: zipf.read(name) for name in zipf.namelist()}
+
+
+def expected_members(folder):
+    return {f"{folder.name}/{path.name}": path.read_bytes() for path in folder.iterdir()}
+
+
+@pytest.mark.parametrize("auto", [False, True])
+def test_parallel_archive_round_trips(sources, tmp_path, auto):
+    archive_path = tmp_path / "parallel.zip"
+    compression_engine.archive_files([sources], archive_path, compression=zipfile.ZIP_DEFLATED,
+                                     auto=auto, workers=2)
+    assert read_members(archive_path) == expected_members(sources)
+
+
+def test_serial_archive_round_trips(sources, tmp_path):
+    archive_path = tmp_path / "serial.zip"
+    compression_engine.archive_files([sources], archive_path, compression=zipfile.ZIP_DEFLATED, compresslevel=9)
+    assert read_members(archive_path) == expected_members(sources)
+
+
+def test_parallel_falls_back_to_serial_without_zipfile_internals(sources, tmp_path, monkeypatch):
+    monkeypatch.setattr(compression_engine, "supports_raw_members", lambda zipf: False)
+    monkeypatch.setattr(compression_engine, "_write_parallel", None)
+    archive_path = tmp_path / "fallback.zip"
+    compression_engine.archive_files([sources], archive_path, compression=zipfile.ZIP_DEFLATED, workers=2)
+    assert read_members(archive_path) == expected_members(sources)
+
+
+def test_crc32_combine_matches_crc32():
+    first, second = b"abc" * 1000, b"xyz" * 777
+    assert compression_engine.crc32_combine(zipfile.crc32(first), zipfile.crc32(second), len(second)) \
+        == zipfile.crc32(first + second)
+
+
+def test_selections_sharing_a_name_get_distinct_members(tmp_path):
+    first, second = tmp_path / "a" / "notes.txt", tmp_path / "b" / "notes.txt"
+    for index, path in enumerate((first, second)):
+        path.parent.mkdir()
+        path.write_text(f"notes {index}")
+    archive_path = tmp_path / "notes.zip"
+    compression_engine.archive_files([first, second, tmp_path / "a", tmp_path / "b"], archive_path)
+    assert read_members(archive_path) == {"notes.txt": b"notes 0", "notes_2.txt": b"notes 1",
+                                          "a/notes.txt": b"notes 0", "b/notes.txt": b"notes 1"}
+
+
+def test_folders_sharing_a_name_get_distinct_members(tmp_path):
+    for parent in ("a", "b"):
+        (tmp_path / parent / "data").mkdir(parents=True)
+        (tmp_path / parent / "data" / "file.txt").write_text(parent)
+    archive_path = tmp_path / "data.zip"
+    compression_engine.archive_files([tmp_path / "a" / "data", tmp_path / "b" / "data"], archive_path)
+    assert read_members(archive_path) == {"data/file.txt": b"a", "data_2/file.txt": b"b"}
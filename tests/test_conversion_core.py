@@ -0,0 +1,46 @@
+import pytest
+from conversion_core import convert_file, main
+
+pyarrow = pytest.importorskip("pyarrow")
+import pyarrow.csv  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+CSV_ROWS = "id,feet,inches,note\n1,5,6,a\n2,,6,b\n3,10,,c\n4,,,d\n"
+# meters of the rows above, a blank cell counts as 0 and the row is empty when both are
+EXPECTED_METERS = [1.6764, 0.1524, 3.048, None]
+
+
+def test_csv_round_trip_with_blank_cells(tmp_path):
+    input_path = tmp_path / "survey.csv"
+    input_path.write_text(CSV_ROWS)
+    output_path = tmp_path / "survey_meters.csv"
+    assert convert_file(input_path, output_path) == 4
+
+    table = pyarrow.csv.read_csv(output_path)
+    assert table.column_names == ["id", "feet", "inches", "note", "meters"]
+    meters = table.column("meters").to_pylist()
+    assert meters[3] is None
+    assert meters[:3] == pytest.approx(EXPECTED_METERS[:3])
+    assert table.column("note").to_pylist() == ["a", "b", "c", "d"]
+
+
+def test_parquet_round_trip(tmp_path):
+    input_path = tmp_path / "survey.parquet"
+    pyarrow.parquet.write_table(pyarrow.table({"feet": [5.0, None, 10.0, None],
+                                               "inches": [6.0, 6.0, None, None]}), input_path)
+    output_path = tmp_path / "survey_meters.parquet"
+    assert convert_file(input_path, output_path) == 4
+
+    meters = pyarrow.parquet.read_table(output_path).column("meters").to_pylist()
+    assert meters[3] is None
+    assert meters[:3] == pytest.approx(EXPECTED_METERS[:3])
+
+
+def test_command_line_converts_feet_only_files(tmp_path, capsys):
+    input_path = tmp_path / "feet.csv"
+    input_path.write_text("length\n1\n\n2.5\n")
+    output_path = tmp_path / "feet.parquet"
+    assert main([str(input_path), str(output_path), "--feet-column", "length", "--inches-column", ""]) == 0
+    meters = pyarrow.parquet.read_table(output_path).column("meters").to_pylist()
+    assert meters == pytest.approx([0.3048, 0.762])
+    assert "Converted 2 rows" in capsys.readouterr().out
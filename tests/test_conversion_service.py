@@ -0,0 +1,75 @@
+import json
+import asyncio
+import pytest
+from conversion_service import ConversionService, HttpError, convert_request
+
+
+@pytest.mark.parametrize("payload, meters", [
+    ({"feet": 5, "inches": 3}, 1.6002),
+    ({"feet": [5, 6], "inches": [3, 0]}, [1.6002, 1.8288]),
+    ({"quantity": "5 ft 3 in"}, 1.6002),
+    ({"quantity": ["5 ft 3 in", "2 mi"]}, [1.6002, 3218.688]),
+])
+def test_convert_request(payload, meters):
+    assert convert_request(payload)["meters"] == pytest.approx(meters)
+
+
+@pytest.mark.parametrize("payload", [
+    [5],
+    {"meters": 5},
+    {"feet": None},
+    {"feet": [1, None]},
+    {"feet": float("nan")},
+    {"inches": float("inf")},
+    {"feet": "five"},
+    {"quantity": "1e9999999 ft"},
+    {"quantity": "1e308 mi"},
+    {"feet": -5},
+    {"feet": [1, -1]},
+    {"quantity": "-5 ft"},
+])
+def test_bad_requests_are_refused_with_400(payload):
+    with pytest.raises(HttpError) as error:
+        convert_request(payload)
+    assert error.value.status == 400
+
+
+async def post(port, body, length=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    length = len(body) if length is None else length
+    writer.write(f"POST /convert HTTP/1.1\r\nContent-Length: {length}\r\nConnection: close\r\n\r\n".encode()
+                 + body)
+    response = await reader.read()
+    writer.close()
+    head, _, document = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(document)
+
+
+def test_service_answers_small_and_large_requests():
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(ConversionService().serve("127.0.0.1", 0, ready.set_result))
+        port = await ready
+        try:
+            small = await post(port, b'{"feet": 5, "inches": 3}')
+            # past INLINE_BODY_SIZE, converted in a thread
+            large = await post(port, json.dumps({"feet": [1] * 50_000}).encode())
+            invalid = await post(port, b'{"feet": NaN}')
+            negative_length = await post(port, b"", length=-5)
+        finally:
+            server.cancel()
+        return small, large, invalid, negative_length
+
+    small, large, invalid, negative_length = asyncio.run(scenario())
+    assert small == (200, {"meters": pytest.approx(1.6002)})
+    assert large[0] == 200 and len(large[1]["meters"]) == 50_000
+    assert invalid[0] == 400
+    assert negative_length == (400, {"error": "Invalid Content-Length."})
+
+
+def test_numpy_is_imported_on_the_first_array_conversion(monkeypatch):
+    import conversion_core
+
+    monkeypatch.setattr(conversion_core, "np", None)
+    assert conversion_core.feet_inches_to_meters(1, 0) == pytest.approx(0.3048)
+    assert conversion_core.np is not None
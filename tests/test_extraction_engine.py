@@ -0,0 +1,127 @@
+import os
+import json
+import tarfile
+import zipfile
+import pytest
+import archive_backends
+import compression_engine
+from extraction_engine import DEDUP_MANIFEST_NAME, ExtractionLimits, UnsafeArchive
+
+
+def test_zero_filled_member_made_by_the_file_compressor_extracts(tmp_path):
+    image = tmp_path / "disk.img"
+    with open(image, "wb") as f:
+        f.truncate(64 * 1024 * 1024)
+    archive_path = tmp_path / "disk.zip"
+    compression_engine.archive_files([image], archive_path, compression=zipfile.ZIP_DEFLATED, compresslevel=9)
+    image.unlink()
+
+    assert archive_backends.extract(archive_path, tmp_path / "out") == (1, 64 * 1024 * 1024)
+    with open(tmp_path / "out" / "disk.img", "rb") as f:
+        assert f.read(1024 * 1024).count(0) == 1024 * 1024
+
+
+def test_archive_expanding_past_the_ratio_is_refused(tmp_path):
+    archive_path = tmp_path / "bomb.zip"
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_BZIP2) as zipf:
+        zipf.writestr("zeros.bin", bytes(8 * 1024 * 1024))
+    with pytest.raises(UnsafeArchive):
+        archive_backends.extract(archive_path, tmp_path / "out", limits=ExtractionLimits(ratio_min_size=1024 * 1024))
+    assert not (tmp_path / "out" / "zeros.bin").exists()
+
+
+def test_deduplicated_copies_count_against_the_limits(tmp_path):
+    archive_path = tmp_path / "copies.zip"
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("data.bin", bytes(8 * 1024 * 1024))
+        zipf.writestr(DEDUP_MANIFEST_NAME, "".join(
+            json.dumps({"path": f"copy_{index}.bin", "source": "data.bin"}) + "\n" for index in range(50)))
+    limits = ExtractionLimits(max_total_size=16 * 1024 * 1024, max_files=10)
+    with pytest.raises(UnsafeArchive):
+        archive_backends.extract(archive_path, tmp_path / "out", limits=limits)
+    assert not (tmp_path / "out").exists() or not any((tmp_path / "out").iterdir())
+
+    # within the limits, the copies are part of what was extracted
+    assert archive_backends.extract(archive_path, tmp_path / "out") == (51, 51 * 8 * 1024 * 1024)
+
+
+@pytest.mark.parametrize("extension, mode", [("tar", "w"), ("tar.gz", "w:gz")])
+def test_incompressible_tar_passes_the_ratio_check(tmp_path, extension, mode):
+    source = tmp_path / "random.bin"
+    source.write_bytes(os.urandom(2 * 1024 * 1024))
+    archive_path = tmp_path / f"random.{extension}"
+    with tarfile.open(archive_path, mode) as tar:
+        tar.add(source, "random.bin")
+    # random data doesn't shrink, even a tight ratio must let it through
+    limits = ExtractionLimits(max_ratio=10, ratio_min_size=1024 * 1024)
+    assert archive_backends.extract(archive_path, tmp_path / "out", limits=limits) == (1, source.stat().st_size)
+
+    bomb_path = tmp_path / "zeros.tar.xz"
+    zeros = tmp_path / "zeros.bin"
+    zeros.write_bytes(bytes(8 * 1024 * 1024))
+    with tarfile.open(bomb_path, "w:xz") as tar:
+        tar.add(zeros, "zeros.bin")
+    with pytest.raises(UnsafeArchive):
+        archive_backends.extract(bomb_path, tmp_path / "bomb", limits=limits)
+
+
+def test_member_escaping_the_destination_is_refused(tmp_path):
+    archive_path = tmp_path / "escape.zip"
+    with zipfile.ZipFile(archive_path, "w") as zipf:
+        zipf.writestr("../outside.txt", "x")
+    with pytest.raises(UnsafeArchive):
+        archive_backends.extract(archive_path, tmp_path / "out")
+    assert not (tmp_path / "outside.txt").exists()
+
+
+def test_corrupt_member_fails_and_leaves_no_file(tmp_path):
+    archive_path = tmp_path / "corrupt.zip"
+    data = os.urandom(100_000)
+    with zipfile.ZipFile(archive_path, "w") as zipf:
+        zipf.writestr("data.bin", data)
+    raw = bytearray(archive_path.read_bytes())
+    position = raw.index(data[:64]) + 50_000
+    raw[position] ^= 0xFF
+    archive_path.write_bytes(bytes(raw))
+    with pytest.raises(zipfile.BadZipFile):
+        archive_backends.extract(archive_path, tmp_path / "out")
+    assert not (tmp_path / "out" / "data.bin").exists()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_compressed_archive_round_trips_with_duplicates(tmp_path, workers):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for index in range(150):
+        (folder / f"{index}.txt").write_text(f"file {index % 50}\n" * 100)
+    archive_path = tmp_path / "docs.zip"
+    compression_engine.archive_files([folder], archive_path, compression=zipfile.ZIP_DEFLATED, deduplicate=True)
+
+    archive_backends.extract(archive_path, tmp_path / "out", workers=workers)
+    for path in folder.iterdir():
+        assert (tmp_path / "out" / "docs" / path.name).read_bytes() == path.read_bytes()
+
+
+@pytest.mark.parametrize("extension, mode", [("tar.gz", "w:gz"), ("tar.bz2", "w:bz2"), ("tar.xz", "w:xz")])
+def test_tar_archives_extract(tmp_path, extension, mode):
+    source = tmp_path / "notes.txt"
+    source.write_text("notes\n" * 1000)
+    archive_path = tmp_path / f"notes.{extension}"
+    with tarfile.open(archive_path, mode) as tar:
+        tar.add(source, "notes.txt")
+    assert archive_backends.detect_backend(archive_path).name == extension
+    assert archive_backends.extract(archive_path, tmp_path / "out") == (1, source.stat().st_size)
+    assert (tmp_path / "out" / "notes.txt").read_text() == source.read_text()
+
+
+def test_optional_backends_load_once_from_concurrent_threads(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    archive_path = tmp_path / "empty.zip"
+    zipfile.ZipFile(archive_path, "w").close()
+    monkeypatch.setattr(archive_backends, "_optional_backends_loaded", False)
+    with ThreadPoolExecutor(8) as executor:
+        names = set(executor.map(lambda _: archive_backends.detect_backend(archive_path).name, range(32)))
+    assert names == {"zip"}
+    assert archive_backends._optional_backends_loaded
+    assert (archive_backends.py7zr is not None) == archive_backends.SEVEN_ZIP_INSTALLED
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from PIL import Image
+from filter_chain import FilterChain, FILTERS, load_saved_chains, save_chain
+from image_pipeline import to_grayscale
+
+
+def make_gray(width=64, height=48):
+    rng = np.random.default_rng(1)
+    # a narrow range, so equalization actually spreads it
+    return rng.integers(60, 140, (height, width), dtype=np.uint8)
+
+
+def step_by_step(pixels, spec):
+    # Every filter on its own, without fusing the lookup tables
+    for step in spec:
+        pixels = FilterChain([step]).apply(pixels)
+    return pixels
+
+
+@pytest.mark.parametrize("spec", [
+    [{"filter": "equalize"}, {"filter": "threshold", "level": 100}],
+    [{"filter": "threshold", "level": 90}, {"filter": "equalize"}],
+    [{"filter": "equalize"}, {"filter": "equalize"}, {"filter": "threshold", "level": 200}],
+    [{"filter": "blur", "radius": 3}, {"filter": "equalize"}, {"filter": "threshold"}, {"filter": "edges"}],
+])
+def test_fused_lookup_tables_match_the_filters_one_by_one(spec):
+    pixels = make_gray()
+    assert np.array_equal(FilterChain(spec).apply(pixels), step_by_step(pixels, spec))
+
+
+def test_grayscale_matches_pil():
+    rng = np.random.default_rng(2)
+    pixels = rng.integers(0, 256, (37, 53, 3), dtype=np.uint8)
+    expected = np.asarray(Image.fromarray(pixels).convert("L"))
+    assert np.array_equal(FilterChain([{"filter": "grayscale"}]).apply(pixels), expected)
+    assert np.array_equal(to_grayscale(pixels), expected)
+
+
+def naive_box_blur(pixels, radius):
+    # Rounded mean of every (2r+1) window, along the rows then along the columns
+    size = 2 * radius + 1
+    result = pixels
+    for axis in (0, 1):
+        padded = np.pad(result.astype(np.uint32), [(radius, radius) if a == axis else (0, 0) for a in (0, 1)],
+                        mode="edge")
+        windows = [np.take(padded, range(i, i + result.shape[axis]), axis=axis) for i in range(size)]
+        result = ((sum(windows) + radius) // size).astype(np.uint8)
+    return result
+
+
+@pytest.mark.parametrize("radius", [1, 2, 5])
+def test_blur_matches_a_naive_box_blur(radius):
+    pixels = make_gray(20, 15)
+    assert np.array_equal(FILTERS["blur"](radius=radius).apply(pixels), naive_box_blur(pixels, radius))
+
+
+def test_saved_chains_round_trip(tmp_path):
+    path = tmp_path / "chains.json"
+    assert load_saved_chains(path) == {}
+    spec = FilterChain([{"filter": "resize", "percent": 25}, {"filter": "threshold"}]).spec()
+    save_chain("sketch", spec, path)
+    save_chain("plain", [{"filter": "grayscale"}], path)
+    assert load_saved_chains(path) == {"sketch": spec, "plain": [{"filter": "grayscale"}]}
+    assert FilterChain(load_saved_chains(path)["sketch"]).key == FilterChain(spec).key
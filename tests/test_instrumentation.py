@@ -0,0 +1,26 @@
+import json
+import instrumentation
+
+
+def test_spans_export_as_chrome_trace_events():
+    metrics = instrumentation.Metrics()
+    with metrics.span("grayscale", image="scan.png") as span:
+        span.set(pixels=12)
+    events = metrics.chrome_trace()["traceEvents"]
+    (event,) = [event for event in events if event["ph"] == "X"]
+    assert event["name"] == "grayscale"
+    assert event["args"] == {"image": "scan.png", "pixels": 12}
+    assert event["dur"] >= 0
+    assert any(other["ph"] == "M" and other["tid"] == event["tid"] for other in events)
+    json.dumps(metrics.chrome_trace(), default=str)
+    assert "assorted_apps_grayscale_duration_seconds_count" in metrics.prometheus_text()
+
+
+def test_trace_keeps_the_latest_spans():
+    metrics = instrumentation.Metrics()
+    for frame in range(instrumentation.TRACE_MAX_EVENTS + 5):
+        with metrics.span("video_frame", frame=frame):
+            pass
+    spans = [event for event in metrics.chrome_trace()["traceEvents"] if event["ph"] == "X"]
+    assert len(spans) == instrumentation.TRACE_MAX_EVENTS
+    assert spans[0]["args"]["frame"] == 5
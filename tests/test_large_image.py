@@ -0,0 +1,71 @@
+import struct
+import numpy as np
+import pytest
+from PIL import Image
+import large_image
+from image_pipeline import to_grayscale
+
+
+def make_image(width, height):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("file_name, options", [
+    ("scan.bmp", {}),
+    ("scan.ppm", {}),
+    ("scan.tif", {}),
+    ("striped.tif", {"tiffinfo": {278: 37}}),
+    ("scan.png", {}),
+])
+def test_tiled_conversion_matches_the_whole_image_conversion(tmp_path, file_name, options):
+    pixels = make_image(301, 257)
+    image_path = tmp_path / file_name
+    Image.fromarray(pixels).save(image_path, **options)
+
+    output_path = tmp_path / "gray.tif"
+    original_preview, grayscale_preview = large_image.convert_large_image(
+        image_path, output_path, strip_rows=64, preview_side=100)
+    with Image.open(output_path) as converted:
+        assert np.array_equal(np.asarray(converted), to_grayscale(pixels))
+    assert max(original_preview.shape[:2]) <= 100
+    assert grayscale_preview.shape == original_preview.shape[:2]
+
+
+def test_compressed_image_past_the_decoded_limit_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(large_image, "MAX_DECODED_PIXELS", 1000)
+    image_path = tmp_path / "scan.png"
+    Image.fromarray(make_image(50, 40)).save(image_path)
+    with pytest.raises(ValueError, match="TIFF or BMP"):
+        large_image.convert_large_image(image_path, tmp_path / "gray.tif")
+    assert not (tmp_path / "gray.tif").exists()
+
+
+def test_output_path_never_overwrites(tmp_path):
+    image_path = tmp_path / "scan.bmp"
+    assert large_image.grayscale_output_path(image_path) == tmp_path / "scan_grayscale.tif"
+    (tmp_path / "scan_grayscale.tif").touch()
+    assert large_image.grayscale_output_path(image_path) == tmp_path / "scan_grayscale_2.tif"
+
+
+def bmp_header(width, height):
+    # header of a 24-bit BMP, enough for the size to be read without any pixel data
+    return (b"BM" + struct.pack("<IHHI", 54 + width * height * 3, 0, 0, 54)
+            + struct.pack("<IiiHHIIiiII", 40, width, height, 1, 24, 0, width * height * 3, 2835, 2835, 0, 0))
+
+
+def test_huge_image_opens_without_lifting_the_global_guard(tmp_path, monkeypatch):
+    image_path = tmp_path / "scan.bmp"
+    image_path.write_bytes(bmp_header(20000, 10000))
+    limit = Image.MAX_IMAGE_PIXELS
+
+    assert large_image.image_size(image_path) == (20000, 10000)
+    with open(image_path, "rb") as image_file:
+        assert large_image.is_large_image(image_file)
+    assert Image.MAX_IMAGE_PIXELS == limit
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(image_path)
+
+    monkeypatch.setattr(large_image, "MAX_TILED_PIXELS", 100_000_000)
+    with pytest.raises(ValueError):
+        large_image.image_size(image_path)
@@ -0,0 +1,38 @@
+import os
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+
+
+@pytest.fixture(scope="module")
+def window():
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    import meter_converter
+
+    window = meter_converter.MainWindow()
+    yield window
+    window.close()
+    app.processEvents()
+
+
+@pytest.mark.parametrize("feet, inches, result", [
+    ("5", "3", "1.6002 meters"),
+    ("1e30", "", "304800000000000000000000000000 meters"),
+    ("", "", ""),
+])
+def test_valid_input_shows_the_result(window, feet, inches, result):
+    window.feet_input.setText(feet)
+    window.inches_input.setText(inches)
+    window.update_result()
+    assert window.result_label.text().strip() == result
+
+
+@pytest.mark.parametrize("feet", ["1e9999999", "abc", "-5", "1" * 5000])
+def test_invalid_input_is_shown_inline(window, feet):
+    window.feet_input.setText(feet)
+    window.inches_input.setText("")
+    window.update_result()
+    assert window.calculation is None
+    assert window.result_label.text().strip()
+    assert window.feet_input.styleSheet()
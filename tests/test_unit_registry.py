@@ -0,0 +1,66 @@
+import time
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from unit_registry import REGISTRY, UnitError, to_decimal
+
+
+@pytest.mark.parametrize("text, meters", [
+    ("5 ft 3 in", Fraction("1.6002")),
+    ("5'3\"", Fraction("1.6002")),
+    ("2 mi 10 yd", Fraction("3227.832")),
+    ("1.5e3 mm", Fraction("1.5")),
+    ("  12 inches ", Fraction("0.3048")),
+])
+def test_parse_is_exact(text, meters):
+    assert REGISTRY.parse(text, "m", exact=True) == meters
+
+
+@pytest.mark.parametrize("alias", [alias for alias in REGISTRY.aliases if " " in alias])
+def test_multi_word_aliases_parse(alias):
+    unit = REGISTRY.unit(alias)
+    assert REGISTRY.parse(f"2 {alias}", unit, exact=True) == 2
+    assert REGISTRY.parse(f"1 {alias.upper().replace(' ', '  ')} 1 {unit}", unit, exact=True) == 2
+
+
+@pytest.mark.parametrize("text", ["5 parsecs", "5 ft kg", "ft", "5 kg", "5 ft 3"])
+def test_parse_rejects_bad_quantities(text):
+    with pytest.raises(UnitError):
+        REGISTRY.parse(text, "m", exact=True)
+
+
+def test_bare_number_takes_the_default_unit():
+    assert REGISTRY.parse("3", "m", default_unit="ft", exact=True) == Fraction("0.9144")
+
+
+def test_huge_exponent_is_refused_quickly():
+    started = time.perf_counter()
+    for text in ("1e9999999", "1e309 ft", "1e-400 in"):
+        with pytest.raises(UnitError):
+            REGISTRY.parse(text, "m", exact=True)
+    assert time.perf_counter() - started < 0.1
+
+
+def test_every_pair_of_factors_is_consistent():
+    for unit in REGISTRY.units("length"):
+        for other in REGISTRY.units("length"):
+            assert REGISTRY.factor(unit, other, exact=True) * REGISTRY.factor(other, unit, exact=True) == 1
+
+
+def test_units_of_different_dimensions_cannot_be_converted():
+    with pytest.raises(UnitError):
+        REGISTRY.convert(1, "m", "kg")
+
+
+@pytest.mark.parametrize("value, text", [
+    (Fraction("1.6002"), "1.6002"),
+    (Fraction(3048, 10), "304.8"),
+    (Fraction(100), "100"),
+    (Fraction(1, 3), "0.3333333333333333333333333333"),
+    # more digits than the decimal precision
+    (Fraction(10) ** 30 * Fraction("0.3048"), "304800000000000000000000000000"),
+    (Fraction(10) ** 300, "1" + "0" * 300),
+])
+def test_to_decimal(value, text):
+    assert str(to_decimal(value)) == text
+    assert isinstance(to_decimal(value), Decimal)
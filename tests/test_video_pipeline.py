@@ -0,0 +1,33 @@
+import time
+import numpy as np
+from PIL import Image
+from video_pipeline import VideoFileSource, VideoPipeline
+
+
+def test_every_frame_is_either_shown_or_counted_as_dropped(tmp_path):
+    video_path = tmp_path / "clip.gif"
+    frames = [Image.fromarray(np.full((32, 48, 3), index * 4, dtype=np.uint8)) for index in range(60)]
+    frames[0].save(video_path, save_all=True, append_images=frames[1:], duration=1, loop=0)
+    source = VideoFileSource(video_path, loop=False)
+
+    def slow_grayscale(pixels):
+        # slower than the source, the stages have to drop frames
+        time.sleep(0.003)
+        return pixels.mean(axis=2).astype(np.uint8)
+
+    pipeline = VideoPipeline(source, transform=slow_grayscale).start()
+    shown = 0
+    try:
+        while True:
+            item = pipeline.get(timeout=10)
+            if item is None:
+                break
+            assert item[1].shape == (32, 48)
+            shown += 1
+            time.sleep(0.005)
+    finally:
+        pipeline.stop()
+    assert pipeline.frames_read == 60
+    assert shown + pipeline.dropped == pipeline.frames_read
+    # the file was closed with the stream
+    video_path.unlink()